@@ -0,0 +1,272 @@
+"""
+API HTTP du système RAG (FastAPI), à lancer avec uvicorn :
+
+    uvicorn api:app --host 0.0.0.0 --port 8000
+
+- `GET /search?q=...&n_results=3` : recherche directe (rag_core.query) ;
+- `POST /chat` : conversation `{"messages": [{"role": "user", "content": "..."}]}`, dont les
+  événements de inference.achat sont envoyés en Server-Sent Events :
+  `query` (requête de recherche lancée), `documents` (sources), `token` (morceau de la
+  réponse), puis `done`, ou `error` en cas d'échec ou de dépassement de délai ;
+- `GET /health` : prêt quand la base est chargée et non vide (sonde Kubernetes) ;
+- `GET /metrics` : métriques de metrics.py.
+
+Le LLM, le modèle d'embedding et la base sont créés une seule fois par processus au
+démarrage (registry) : leurs clients et connexions sont réutilisés par toutes les requêtes.
+Les recherches (bloquantes) tournent dans un pool de threads dimensionné pour le serveur.
+Le nombre de recherches et de conversations simultanées est borné, ainsi que la file
+d'attente : au-delà, la requête est refusée tout de suite (503 + Retry-After) plutôt que
+d'allonger la latence de toutes les autres.
+"""
+
+from typing import AsyncIterator, Callable, List, Literal, TypeVar
+import asyncio
+import concurrent.futures
+import contextlib
+import json
+import os
+
+import fastapi
+import pydantic
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+
+import inference
+import metrics
+import rag_core
+import tracing
+from registry import registry
+
+# --- CONFIGURATION ---
+API_THREADS = int(os.getenv("API_THREADS", "32"))  # Pool des appels bloquants
+SEARCH_CONCURRENCY = int(os.getenv("API_SEARCH_CONCURRENCY", "16"))
+CHAT_CONCURRENCY = int(os.getenv("API_CHAT_CONCURRENCY", "8"))
+MAX_WAITING = int(os.getenv("API_MAX_WAITING", "32"))  # Requêtes en file, par route
+QUEUE_TIMEOUT = 2.0  # Attente maximale d'une place avant le refus (s)
+SEARCH_TIMEOUT = 10.0
+CHAT_TIMEOUT = 120.0  # Durée maximale d'une conversation (s)
+CHAT_IDLE_TIMEOUT = 30.0  # Délai maximal entre deux événements (s)
+MAX_RESULTS = 20
+MAX_MESSAGES = 50
+MAX_MESSAGE_LENGTH = 4000
+
+T = TypeVar("T")
+
+
+class Admission:
+    """
+    Au plus `concurrency` requêtes en cours et `max_waiting` en attente d'une place ;
+    au-delà, ou après QUEUE_TIMEOUT d'attente, la requête est refusée (503).
+    """
+
+    def __init__(self, name: str, concurrency: int, max_waiting: int = MAX_WAITING):
+        self.name = name
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.max_waiting = max_waiting
+        self.waiting = 0
+
+    def _reject(self) -> fastapi.HTTPException:
+        metrics.increment(f"api.{self.name}.rejected")
+        return fastapi.HTTPException(
+            status_code=503,
+            detail="Serveur saturé, réessayez dans un instant.",
+            headers={"Retry-After": "1"},
+        )
+
+    async def acquire(self):
+        if self.semaphore.locked() and self.waiting >= self.max_waiting:
+            raise self._reject()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), QUEUE_TIMEOUT)
+        except TimeoutError:
+            raise self._reject()
+        finally:
+            self.waiting -= 1
+
+    def release(self):
+        self.semaphore.release()
+
+
+search_admission = Admission("search", SEARCH_CONCURRENCY)
+chat_admission = Admission("chat", CHAT_CONCURRENCY)
+
+
+async def run_blocking(
+    admission: Admission, timeout: float, fn: Callable[..., T], *args, **kwargs
+) -> T:
+    """
+    Exécute `fn` dans le pool de threads, dans une place de `admission`. Après `timeout`,
+    la requête échoue (504), mais la place n'est rendue qu'à la fin réelle de l'appel :
+    les appels abandonnés comptent toujours dans la limite.
+    """
+    await admission.acquire()
+    future = asyncio.ensure_future(asyncio.to_thread(fn, *args, **kwargs))
+    future.add_done_callback(lambda _: admission.release())
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+    except TimeoutError:
+        metrics.increment(f"api.{admission.name}.timeouts")
+        raise fastapi.HTTPException(
+            status_code=504, detail="La recherche a dépassé le délai."
+        )
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: fastapi.FastAPI):
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(
+        concurrent.futures.ThreadPoolExecutor(
+            max_workers=API_THREADS, thread_name_prefix="api"
+        )
+    )
+    await asyncio.to_thread(rag_core.warm_up)
+    yield
+
+
+app = fastapi.FastAPI(title="Chroniqueur de Runeterra", lifespan=lifespan)
+
+
+# --- Recherche ---
+
+
+class SearchResponse(pydantic.BaseModel):
+    documents: List[rag_core.Document]
+
+
+@app.get("/search", response_model=SearchResponse)
+async def search(
+    q: str = fastapi.Query(..., min_length=1, max_length=MAX_MESSAGE_LENGTH),
+    n_results: int = fastapi.Query(3, ge=1, le=MAX_RESULTS),
+    mode: Literal["chunks", "parents"] = "parents",
+    hybrid: bool = True,
+    rerank: bool = False,
+):
+    with tracing.span("api.search", n_results=n_results, mode=mode):
+        with metrics.timer("api.search"):
+            documents = await run_blocking(
+                search_admission,
+                SEARCH_TIMEOUT,
+                rag_core.query,
+                q,
+                n_results,
+                mode=mode,
+                hybrid=hybrid,
+                rerank=rerank,
+            )
+    return SearchResponse(documents=documents)
+
+
+# --- Chat ---
+
+
+class ChatMessage(pydantic.BaseModel):
+    role: Literal["user", "assistant"]
+    content: str = pydantic.Field(..., max_length=MAX_MESSAGE_LENGTH)
+
+
+class ChatRequest(pydantic.BaseModel):
+    messages: List[ChatMessage] = pydantic.Field(
+        ..., min_length=1, max_length=MAX_MESSAGES
+    )
+
+    def conversation(self) -> List[BaseMessage]:
+        return [
+            (
+                HumanMessage(content=m.content)
+                if m.role == "user"
+                else AIMessage(content=m.content)
+            )
+            for m in self.messages
+        ]
+
+
+def sse(event: str, data: dict) -> str:
+    """Un événement Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def chat_events(
+    conversation: List[BaseMessage], release: Callable[[], None]
+) -> AsyncIterator[str]:
+    """
+    Événements de inference.achat au format SSE, bornés par CHAT_TIMEOUT et
+    CHAT_IDLE_TIMEOUT. `release` rend la place de la conversation à la fin du flux.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + CHAT_TIMEOUT
+    try:
+        async with contextlib.aclosing(inference.achat(conversation)) as events:
+            while True:
+                timeout = min(CHAT_IDLE_TIMEOUT, deadline - loop.time())
+                try:
+                    # Sans nouvelle tâche : le span courant de achat reste visible (tracing.py)
+                    async with asyncio.timeout(timeout):
+                        event = await anext(events)
+                except StopAsyncIteration:
+                    break
+                if isinstance(event, str):
+                    yield sse("query", {"query": event})
+                elif isinstance(event, list):
+                    yield sse(
+                        "documents",
+                        {"documents": [d.model_dump() for d in event]},
+                    )
+                elif isinstance(event, AIMessageChunk):
+                    yield sse("token", {"content": str(event.content)})
+        yield sse("done", {})
+    except TimeoutError:
+        metrics.increment("api.chat.timeouts")
+        yield sse("error", {"message": "La réponse a dépassé le délai."})
+    except Exception as e:
+        print(f"[ERREUR] Conversation interrompue : {e}")
+        yield sse("error", {"message": "La réponse n'a pas pu être générée."})
+    finally:
+        release()
+
+
+@app.post("/chat")
+async def chat(request: ChatRequest):
+    await chat_admission.acquire()
+    released = False
+
+    def release():
+        # Appelée à la fin du flux, et après la réponse si le client s'est déconnecté
+        # avant le premier événement : la place n'est rendue qu'une fois
+        nonlocal released
+        if not released:
+            released = True
+            chat_admission.release()
+
+    return StreamingResponse(
+        chat_events(request.conversation(), release),
+        media_type="text/event-stream",
+        background=BackgroundTask(release),
+        # Pas de mise en mémoire tampon par nginx : chaque événement part tout de suite
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# --- Supervision ---
+
+
+@app.get("/health")
+async def health():
+    if not registry.is_ready("vector_store"):
+        raise fastapi.HTTPException(
+            status_code=503, detail="Base en cours de chargement."
+        )
+    chunks = await asyncio.to_thread(registry.get("vector_store").count)
+    if not chunks:
+        raise fastapi.HTTPException(status_code=503, detail="La base est vide.")
+    return {"status": "ok", "chunks": chunks}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        **metrics.snapshot(),
+        "api.search.waiting": {"value": search_admission.waiting},
+        "api.chat.waiting": {"value": chat_admission.waiting},
+    }
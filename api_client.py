@@ -0,0 +1,88 @@
+"""
+Client de l'API HTTP (api.py), avec le même protocole que rag_core.query et
+inference.chat : streamlit_app.py l'utilise à la place du pipeline local quand la
+variable d'environnement API_URL est définie (ex : http://lo17-rag-api:8000).
+
+Un seul client httpx est partagé par le processus : les connexions vers l'API sont
+gardées ouvertes et réutilisées d'une requête à l'autre.
+"""
+
+from typing import Dict, Iterable, Iterator, List, Tuple
+import json
+import os
+
+import httpx
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+
+from rag_core import Document
+from registry import registry
+
+# --- CONFIGURATION ---
+API_URL = os.getenv("API_URL", "")
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 60.0  # Attente maximale entre deux événements du chat
+
+
+def get_http_client() -> httpx.Client:
+    return httpx.Client(
+        base_url=API_URL,
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+    )
+
+
+registry.register("api_http_client", get_http_client)
+
+
+def search(
+    q: str, n_results: int, mode: str = "parents", hybrid: bool = True
+) -> List[Document]:
+    response = registry.get("api_http_client").get(
+        "/search",
+        params={"q": q, "n_results": n_results, "mode": mode, "hybrid": hybrid},
+    )
+    response.raise_for_status()
+    return [Document(**d) for d in response.json()["documents"]]
+
+
+def iter_events(lines: Iterable[str]) -> Iterator[Tuple[str, Dict]]:
+    """Découpe un flux Server-Sent Events en couples (événement, données)."""
+    event, data = "message", []
+    for line in lines:
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:") :].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:") :].strip())
+
+
+def chat(
+    conversation: List[BaseMessage],
+) -> Iterator[str | List[Document] | AIMessageChunk]:
+    """Événements de la conversation, comme inference.chat, lus depuis `POST /chat`."""
+    messages = [
+        {
+            "role": "assistant" if isinstance(m, AIMessage) else "user",
+            "content": str(m.content),
+        }
+        for m in conversation
+    ]
+    with registry.get("api_http_client").stream(
+        "POST", "/chat", json={"messages": messages}
+    ) as response:
+        response.raise_for_status()
+        for event, data in iter_events(response.iter_lines()):
+            match event:
+                case "query":
+                    yield data["query"]
+                case "documents":
+                    yield [Document(**d) for d in data["documents"]]
+                case "token":
+                    yield AIMessageChunk(content=data["content"])
+                case "error":
+                    raise RuntimeError(data["message"])
+                case "done":
+                    return
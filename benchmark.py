@@ -0,0 +1,1185 @@
+"""
+Benchmarks hors ligne du système RAG.
+
+Les bases sont construites dans un dossier temporaire avec l'embedding local
+déterministe (local_embeddings.HashEmbeddings) : aucune clé d'API n'est nécessaire.
+Le corpus est celui de dataset_rag_lol_definitive/knowledge_base s'il existe,
+complété si besoin par des documents synthétiques.
+
+Usage :
+    python benchmark.py titles [--documents 500] [--queries 200]
+    python benchmark.py suite [--documents 10000] [--queries 200] [--output benchmark_results]
+    python benchmark.py hnsw [--documents 20000] [--m 8 16 32] [--search-ef 10 20 50 100 200]
+    python benchmark.py quantization [--documents 20000] [--rescore 1 2 5 10 20]
+    python benchmark.py scraper [--documents 300] [--latency 0.05] [--error-rate 0.02]
+    python benchmark.py pipeline [--documents 300] [--latency 0.05] [--fake-latency 0.2]
+
+Le scénario `suite` exécute le vrai code du projet (create_database.build_database,
+rag_core.query, inference.query_from_conversation) sur une base temporaire et enregistre
+ses résultats en JSON (un fichier par exécution, nommé d'après le commit courant) pour
+comparer les performances d'un commit à l'autre.
+
+Le scénario `hnsw` balaie les paramètres de l'index HNSW de Chroma (M, construction_ef,
+search_ef) et mesure pour chaque combinaison le temps de construction, la latence des
+requêtes et le rappel@k par rapport à une recherche exacte, pour choisir les valeurs de
+HNSW_M, HNSW_CONSTRUCTION_EF et HNSW_SEARCH_EF (voir rag_core.py). Le scénario
+`quantization` compare de même le magasin NumPy sans quantification, en "int8" et en "pq"
+(quantization.py) : octets par vecteur, latence et perte de rappel@k selon
+QUANTIZATION_RESCORE.
+
+Le scénario `scraper` exécute data_scrapper.py contre un site local (`LoreSite`) qui sert
+des pages construites à partir du corpus, avec ETag/Last-Modified, latence et erreurs
+simulées : un premier passage télécharge toutes les pages, le second ne doit recevoir que
+des réponses 304. Le scénario `pipeline` compare, sur ce même site, le scraping suivi de
+create_database.py au pipeline en flux (pipeline.py) : durée totale et délai avant le
+premier lot indexé.
+"""
+
+from typing import Callable, Dict, Iterator, List, Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import asyncio
+import collections
+import hashlib
+import html
+import os
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import chromadb
+import numpy as np
+
+import metrics
+import tracing
+from eval_utils import RESULTS_DIR, latency_summary, save_results
+from http_fetcher import HOST_CONCURRENCY, HOST_RATE_LIMIT
+from ingestion import EMBEDDING_WORKERS
+from local_embeddings import HashEmbeddings
+
+# --- CONFIGURATION ---
+DOCUMENTS_SOURCE_DIR = os.path.join(
+    os.getcwd(), "dataset_rag_lol_definitive", "knowledge_base"
+)
+
+SYNTHETIC_VOCABULARY = (
+    "demacia noxus piltover zaun ionia freljord shurima targon bilgewater ixtal "
+    "néant iles obscures champion guerrier mage assassin épée magie runes hextech "
+    "empire guerre rébellion famille sœur frère mère trahison honneur glace soleil "
+    "lune étoiles océan désert montagne cité forge vengeance exil prophétie dragon "
+    "esprit démon ancien gardien chasseur pirate inventeur alchimiste chimie reine roi"
+).split()
+
+
+# --- CORPUS ---
+
+
+def iter_synthetic_corpus(
+    n_documents: int, seed: int = 0, start: int = 0
+) -> Iterator[Tuple[str, str]]:
+    """Génère des documents pseudo-lore (id, contenu) reproductibles, un par un."""
+    rng = random.Random(seed)
+    for i in range(start, start + n_documents):
+        sentences = [
+            " ".join(rng.choices(SYNTHETIC_VOCABULARY, k=rng.randint(8, 20))) + "."
+            for _ in range(rng.randint(5, 30))
+        ]
+        yield f"synthetic-{i}", " ".join(sentences)
+
+
+def synthetic_corpus(n_documents: int, seed: int = 0) -> List[Tuple[str, str]]:
+    return list(iter_synthetic_corpus(n_documents, seed))
+
+
+def load_corpus(n_documents: int | None = None) -> List[Tuple[str, str]]:
+    """
+    Charge la base de connaissances locale, complétée par des documents synthétiques
+    jusqu'à `n_documents` (ou tronquée à cette taille).
+    """
+    corpus = []
+    if os.path.exists(DOCUMENTS_SOURCE_DIR):
+        for filename in sorted(os.listdir(DOCUMENTS_SOURCE_DIR)):
+            if filename.endswith(".txt"):
+                with open(
+                    os.path.join(DOCUMENTS_SOURCE_DIR, filename), "r", encoding="utf-8"
+                ) as f:
+                    corpus.append((os.path.splitext(filename)[0], f.read()))
+    if n_documents is None:
+        return corpus or synthetic_corpus(500)
+    if len(corpus) < n_documents:
+        corpus += synthetic_corpus(n_documents - len(corpus))
+    return corpus[:n_documents]
+
+
+def sample_queries(corpus: List[Tuple[str, str]], n_queries: int, seed: int = 1):
+    """Tire des requêtes courtes (quelques mots d'un document du corpus)."""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n_queries):
+        words = rng.choice(corpus)[1].split()
+        start = rng.randrange(max(1, len(words) - 6))
+        queries.append(" ".join(words[start : start + 6]))
+    return queries
+
+
+# --- MESURES ---
+
+
+def time_calls(fn: Callable[[int], object], n: int, warmup: int = 5) -> List[float]:
+    """Exécute fn(i) n fois (après un échauffement) et retourne les durées."""
+    for i in range(min(warmup, n)):
+        fn(i)
+    samples = []
+    for i in range(n):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def retained_kib(fn: Callable[[int], object], n: int) -> float:
+    """Mémoire moyenne occupée par les résultats de fn(i), tous gardés (tracemalloc), en Kio."""
+    results = []
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        for i in range(n):
+            results.append(fn(i))
+        retained = tracemalloc.get_traced_memory()[0] - base
+    finally:
+        tracemalloc.stop()
+    return retained / n / 1024
+
+
+def allocated_kib(fn: Callable[[int], object], n: int) -> float:
+    """Pic moyen de mémoire allouée pendant un appel fn(i) (tracemalloc), en Kio."""
+    tracemalloc.start()
+    try:
+        peaks = []
+        for i in range(n):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            fn(i)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+    return statistics.fmean(peaks) / 1024
+
+
+def peak_rss_mb() -> float:
+    """Pic de mémoire résidente du processus, en Mo."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sous macOS, en kilo-octets sous Linux
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def directory_size_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / 1024**2
+
+
+def print_summary(label: str, summary: Dict[str, float]):
+    print(
+        f"   {label:<32} moyenne {summary['mean_ms']:7.2f} ms | p50 {summary['p50_ms']:7.2f} ms"
+        f" | p95 {summary['p95_ms']:7.2f} ms | p99 {summary['p99_ms']:7.2f} ms"
+    )
+
+
+# --- SCÉNARIOS ---
+
+
+def bench_titles(args: argparse.Namespace):
+    """
+    Compare l'ancienne récupération des titres (requête + `titles.get`) à la requête
+    unique qui renvoie les titres en métadonnées.
+    """
+    corpus = load_corpus(args.documents)
+    embedder = HashEmbeddings()
+    queries = sample_queries(corpus, args.queries)
+    query_embeddings = embedder.embed_documents(queries)
+    print(f"Corpus : {len(corpus)} documents, {len(queries)} requêtes, k={args.k}.")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        client = chromadb.PersistentClient(path=tmp_dir)
+        documents = client.create_collection("documents", embedding_function=None)
+        titles = client.create_collection("titles", embedding_function=None)
+        ids = [doc_id for doc_id, _ in corpus]
+        contents = [content for _, content in corpus]
+        for start in range(0, len(ids), 100):
+            batch_ids = ids[start : start + 100]
+            documents.add(
+                ids=batch_ids,
+                documents=contents[start : start + 100],
+                embeddings=embedder.embed_documents(contents[start : start + 100]),  # type: ignore[arg-type]
+                metadatas=[{"title": i, "display_title": i} for i in batch_ids],
+            )
+            titles.add(
+                ids=batch_ids,
+                documents=batch_ids,
+                embeddings=embedder.embed_documents(batch_ids),  # type: ignore[arg-type]
+            )
+
+        def legacy(i: int):
+            results = documents.query(
+                query_embeddings=[query_embeddings[i]], n_results=args.k
+            )
+            titles.get(ids=results["ids"][0])
+
+        def single(i: int):
+            documents.query(
+                query_embeddings=[query_embeddings[i]],
+                n_results=args.k,
+                include=["documents", "distances", "metadatas"],
+            )
+
+        legacy_summary = latency_summary(time_calls(legacy, len(queries)))
+        single_summary = latency_summary(time_calls(single, len(queries)))
+
+    print_summary("requête + titles.get", legacy_summary)
+    print_summary("requête unique (métadonnées)", single_summary)
+    print(
+        f"   -> Gain moyen par requête : "
+        f"{legacy_summary['mean_ms'] - single_summary['mean_ms']:.2f} ms"
+    )
+
+
+class PlannedQueriesLLM:
+    """
+    Remplace le LLM de planification : retourne des requêtes tirées du corpus, pour mesurer
+    le coût de inference.query_from_conversation hors appel au LLM.
+    """
+
+    def __init__(self, queries: List[str], per_call: int = 3):
+        self.queries = queries
+        self.per_call = per_call
+        self.calls = 0
+
+    def with_structured_output(self, schema):
+        return self
+
+    def invoke(self, messages):
+        import inference
+
+        start = self.calls * self.per_call
+        self.calls += 1
+        return inference.SearchQueryResponse(
+            queries=[
+                inference.SearchQuery(
+                    query=self.queries[(start + i) % len(self.queries)],
+                    result_expectation="few matches",
+                )
+                for i in range(self.per_call)
+            ]
+        )
+
+
+def write_corpus(
+    target_dir: str, n_documents: int | None, pool_size: int = 1000, seed: int = 0
+) -> Tuple[int, List[Tuple[str, str]]]:
+    """
+    Écrit le corpus du benchmark (base locale puis documents synthétiques) dans `target_dir`,
+    document par document. Retourne le nombre de documents et un échantillon pour les requêtes.
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    local = load_corpus() if os.path.exists(DOCUMENTS_SOURCE_DIR) else []
+    if n_documents is None:
+        n_documents = len(local) or 500
+    local = local[:n_documents]
+    documents = iter(local)
+    if len(local) < n_documents:
+        documents = (
+            doc
+            for part in (
+                local,
+                iter_synthetic_corpus(n_documents - len(local), seed, start=len(local)),
+            )
+            for doc in part
+        )
+
+    rng = random.Random(seed)
+    pool: List[Tuple[str, str]] = []
+    for count, (doc_id, content) in enumerate(documents):
+        with open(
+            os.path.join(target_dir, f"{doc_id}.txt"), "w", encoding="utf-8"
+        ) as f:
+            f.write(content)
+        # Échantillon uniforme (reservoir sampling) sans garder tout le corpus en mémoire
+        if len(pool) < pool_size:
+            pool.append((doc_id, content))
+        elif (slot := rng.randrange(count + 1)) < pool_size:
+            pool[slot] = (doc_id, content)
+    return n_documents, pool
+
+
+def bench_suite(args: argparse.Namespace):
+    """
+    Construit une base temporaire avec create_database.py (embedding local), puis mesure
+    les recherches de rag_core et de inference, la mémoire et la taille sur disque.
+    """
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as work_dir:
+        print(f"Écriture du corpus dans {work_dir}...")
+        n_documents, pool = write_corpus(
+            os.path.join(work_dir, "dataset_rag_lol_definitive", "knowledge_base"),
+            args.documents,
+        )
+        queries = sample_queries(pool, args.queries)
+        titles = [doc_id.replace("-", " ") for doc_id, _ in pool[: args.queries]]
+
+        # Les chemins de create_database, rag_core et lexical_index sont relatifs au dossier
+        # courant au moment de leur import : ils doivent être importés après le chdir.
+        os.chdir(work_dir)
+        try:
+            import create_database
+            import inference
+            import rag_core
+            from registry import registry
+
+            with (
+                registry.override(
+                    "embedding_model", HashEmbeddings(latency=args.fake_latency)
+                ),
+                registry.override("llm", PlannedQueriesLLM(queries)),
+            ):
+                results = run_suite(
+                    args,
+                    n_documents,
+                    create_database,
+                    inference,
+                    rag_core,
+                    queries,
+                    titles,
+                )
+            results["disk"] = {
+                "database_mb": directory_size_mb(os.path.join(work_dir, "database")),
+                "chroma_mb": directory_size_mb(
+                    os.path.join(work_dir, "database", "chroma_db")
+                ),
+                "bm25_mb": os.path.getsize(rag_core.LEXICAL_INDEX_PATH) / 1024**2,
+            }
+        finally:
+            os.chdir(original_dir)
+
+    print(
+        f"   Disque : base {results['disk']['database_mb']:.1f} Mo "
+        f"(Chroma {results['disk']['chroma_mb']:.1f} Mo, BM25 {results['disk']['bm25_mb']:.1f} Mo)"
+        f" | pic mémoire {results['memory']['peak_rss_mb']:.0f} Mo"
+    )
+    path = save_results("suite", results, args.output)
+    print(f"Résultats enregistrés dans {path}")
+
+
+def run_suite(
+    args, n_documents, create_database, inference, rag_core, queries, titles
+) -> dict:
+    """Mesures de la suite ; les modules sont ceux importés dans le dossier temporaire."""
+    start = time.perf_counter()
+    create_database.build_database(full=True, workers=args.workers)
+    ingestion_seconds = time.perf_counter() - start
+    ingestion_rss = peak_rss_mb()
+
+    start = time.perf_counter()
+    create_database.build_database()
+    noop_seconds = time.perf_counter() - start
+
+    n_chunks = rag_core.vector_store.count()
+    print(
+        f"Corpus : {n_documents} documents, {n_chunks} passages indexés en {ingestion_seconds:.2f}s "
+        f"(reconstruction sans changement : {noop_seconds:.2f}s), "
+        f"{len(queries)} requêtes, k={args.k}."
+    )
+
+    def consume_conversation(i: int):
+        for _ in inference.query_from_conversation([], max_results=args.k):
+            pass
+
+    scenarios: Dict[str, Callable[[int], object]] = {
+        "query vectorielle": lambda i: rag_core.query(queries[i], args.k),
+        "query hybride": lambda i: rag_core.query(queries[i], args.k, hybrid=True),
+        "query hybride (parents)": lambda i: rag_core.query(
+            queries[i], args.k, mode="parents", hybrid=True
+        ),
+        "query hybride + rerank": lambda i: rag_core.query(
+            queries[i], args.k, hybrid=True, rerank=True
+        ),
+        "query titre exact": lambda i: rag_core.query(
+            titles[i % len(titles)], args.k, hybrid=True
+        ),
+        "query_from_conversation (3 req.)": consume_conversation,
+        "query hybride (parents, sans contenu)": lambda i: rag_core.query(
+            queries[i], args.k, mode="parents", hybrid=True, content=False
+        ),
+    }
+    latencies = {}
+    rerank_costs = {}
+    for label, fn in scenarios.items():
+        metrics.reset()
+        latencies[label] = latency_summary(time_calls(fn, len(queries)))
+        print_summary(label, latencies[label])
+        # Part du reclassement dans la latence du scénario
+        if rerank_cost := metrics.snapshot().get("query.rerank"):
+            rerank_costs[label] = rerank_cost
+            print_summary(f"  dont rerank ({rerank_cost['count']} appels)", rerank_cost)
+
+    # Mémoire par requête : le pic vient du calcul des scores (distances, BM25), la
+    # mémoire retenue par les résultats des textes décodés
+    allocations = {}
+    retained = {}
+    for label in (
+        "query vectorielle",
+        "query hybride (parents)",
+        "query hybride (parents, sans contenu)",
+    ):
+        allocations[label] = allocated_kib(scenarios[label], min(len(queries), 50))
+        retained[label] = retained_kib(scenarios[label], min(len(queries), 50))
+        print(
+            f"   {label:<38} {allocations[label]:8.1f} Kio au pic, "
+            f"{retained[label]:6.1f} Kio dans les résultats"
+        )
+
+    # Débit des recherches groupées (rag_core.query_many) par rapport à une boucle
+    throughput = {}
+    for batch_size in (8, 64):
+        batches = [
+            queries[start : start + batch_size]
+            for start in range(0, len(queries), batch_size)
+        ]
+        for label, run in (
+            (
+                "boucle query",
+                lambda batch: [rag_core.query(q, args.k, hybrid=True) for q in batch],
+            ),
+            (
+                "query_many",
+                lambda batch: rag_core.query_many(batch, args.k, hybrid=True),
+            ),
+        ):
+            start = time.perf_counter()
+            for batch in batches:
+                run(batch)
+            qps = len(queries) / (time.perf_counter() - start)
+            throughput[f"{label} (lots de {batch_size})"] = qps
+            print(f"   {label + f' (lots de {batch_size})':<32} {qps:8.0f} requêtes/s")
+
+    # Coût des traces : le même scénario, spans exportés en JSONL (voir tracing.py)
+    traced_label = "query hybride + rerank"
+    exporter = tracing.JsonlExporter(os.path.join("traces", "spans.jsonl"))
+    tracing.configure(exporter)
+    try:
+        traced = latency_summary(time_calls(scenarios[traced_label], len(queries)))
+    finally:
+        tracing.configure()
+        exporter.close()
+    print_summary(f"{traced_label} (traces JSONL)", traced)
+    tracing_overhead_ms = traced["mean_ms"] - latencies[traced_label]["mean_ms"]
+    print(f"   -> Coût des traces : {tracing_overhead_ms:+.3f} ms par requête")
+
+    # Snapshot en lecture seule (snapshots.py) : publication, puis démarrage d'un serveur
+    start = time.perf_counter()
+    create_database.publish_snapshot()
+    publish_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    snapshot_store = create_database.snapshots.SnapshotVectorStore()
+    snapshot_store.count()
+    open_ms = (time.perf_counter() - start) * 1000
+    embedding = rag_core.embedding_model.embed_query(queries[0])
+    start = time.perf_counter()
+    snapshot_store.query([embedding], args.k)
+    first_query_ms = (time.perf_counter() - start) * 1000
+    print(
+        f"   Snapshot : publié en {publish_seconds:.2f}s, ouvert en {open_ms:.1f} ms, "
+        f"première recherche en {first_query_ms:.1f} ms"
+    )
+
+    return {
+        "parameters": {
+            "queries": len(queries),
+            "k": args.k,
+            "workers": args.workers,
+            "fake_latency": args.fake_latency,
+            "vector_store": rag_core.VECTOR_STORE,
+        },
+        "corpus": {"documents": n_documents, "chunks": n_chunks},
+        "ingestion": {
+            "seconds": ingestion_seconds,
+            "documents_per_second": n_documents / ingestion_seconds,
+            "noop_rebuild_seconds": noop_seconds,
+        },
+        "latency": latencies,
+        "rerank": rerank_costs,
+        "throughput_qps": throughput,
+        "allocated_kib": allocations,
+        "retained_kib": retained,
+        "tracing": {"latency": traced, "overhead_ms": tracing_overhead_ms},
+        "snapshot": {
+            "publish_seconds": publish_seconds,
+            "open_ms": open_ms,
+            "first_query_ms": first_query_ms,
+        },
+        "memory": {
+            "peak_rss_mb": peak_rss_mb(),
+            "ingestion_peak_rss_mb": ingestion_rss,
+        },
+    }
+
+
+def exact_top_k(
+    corpus_vectors: np.ndarray, query_vectors: np.ndarray, k: int
+) -> List[set]:
+    """Vérité terrain : indices des k plus proches voisins (distance L2) de chaque requête."""
+    corpus_norms = (corpus_vectors**2).sum(axis=1)
+    neighbours = []
+    for vector in query_vectors:
+        distances = corpus_norms - 2 * corpus_vectors @ vector
+        neighbours.append(set(np.argpartition(distances, k - 1)[:k].tolist()))
+    return neighbours
+
+
+def print_pareto_chart(points: List[dict], width: int = 40):
+    """
+    Graphique texte rappel / latence, du réglage le plus rapide au plus lent. Les réglages
+    de la frontière de Pareto (aucun autre n'est à la fois plus rapide et plus précis) sont
+    marqués d'une étoile.
+    """
+    best_recall = -1.0
+    print(f"\n   {'M':>3} {'c_ef':>5} {'s_ef':>5} | {'p50 (ms)':>8} | rappel@k")
+    for point in sorted(points, key=lambda p: p["latency"]["p50_ms"]):
+        pareto = point["recall"] > best_recall
+        best_recall = max(best_recall, point["recall"])
+        bar = "#" * round(point["recall"] * width)
+        print(
+            f" {'*' if pareto else ' '} {point['m']:>3} {point['construction_ef']:>5} "
+            f"{point['search_ef']:>5} | {point['latency']['p50_ms']:8.2f} | "
+            f"{bar:<{width}} {point['recall']:.3f}"
+        )
+
+
+def bench_hnsw(args: argparse.Namespace):
+    """
+    Construit une collection Chroma par couple (M, construction_ef), puis mesure pour chaque
+    search_ef la latence des requêtes et le rappel@k par rapport à la recherche exacte.
+    """
+    from rag_core import hnsw_metadata
+
+    corpus = load_corpus(args.documents)
+    embedder = HashEmbeddings()
+    queries = sample_queries(corpus, args.queries)
+    ids = [doc_id for doc_id, _ in corpus]
+    corpus_vectors = np.asarray(
+        embedder.embed_documents([content for _, content in corpus]), dtype=np.float32
+    )
+    query_vectors = np.asarray(embedder.embed_documents(queries), dtype=np.float32)
+    truth = exact_top_k(corpus_vectors, query_vectors, args.k)
+    positions = {doc_id: i for i, doc_id in enumerate(ids)}
+    print(f"Corpus : {len(corpus)} documents, {len(queries)} requêtes, k={args.k}.")
+
+    points = []
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmp_dir:
+        client = chromadb.PersistentClient(path=tmp_dir)
+        for m in args.m:
+            for construction_ef in args.construction_ef:
+                name = f"hnsw-m{m}-ef{construction_ef}"
+                collection = client.create_collection(
+                    name,
+                    embedding_function=None,
+                    metadata=hnsw_metadata(
+                        space="l2",
+                        construction_ef=construction_ef,
+                        search_ef=max(args.search_ef),
+                        m=m,
+                    ),
+                )
+                start = time.perf_counter()
+                for batch in range(0, len(ids), 1000):
+                    collection.add(
+                        ids=ids[batch : batch + 1000],
+                        embeddings=corpus_vectors[batch : batch + 1000],
+                    )
+                build_seconds = time.perf_counter() - start
+                print(
+                    f"   M={m}, construction_ef={construction_ef} : "
+                    f"index construit en {build_seconds:.2f}s"
+                )
+
+                for search_ef in args.search_ef:
+                    collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+                    # Chroma n'applique search_ef qu'au chargement de l'index : on le recharge
+                    client.clear_system_cache()
+                    client = chromadb.PersistentClient(path=tmp_dir)
+                    collection = client.get_collection(name)
+                    found: List[set] = [set()] * len(queries)
+
+                    def search(i: int):
+                        result = collection.query(
+                            query_embeddings=query_vectors[i : i + 1],
+                            n_results=args.k,
+                            include=[],
+                        )
+                        found[i] = {positions[doc_id] for doc_id in result["ids"][0]}
+
+                    latency = latency_summary(time_calls(search, len(queries)))
+                    recall = statistics.fmean(
+                        len(f & t) / len(t) for f, t in zip(found, truth)
+                    )
+                    points.append(
+                        {
+                            "m": m,
+                            "construction_ef": construction_ef,
+                            "search_ef": search_ef,
+                            "build_seconds": build_seconds,
+                            "recall": recall,
+                            "latency": latency,
+                        }
+                    )
+                client.delete_collection(name)
+
+    print_pareto_chart(points)
+    path = save_results(
+        "hnsw",
+        {
+            "parameters": {
+                "documents": len(corpus),
+                "queries": len(queries),
+                "k": args.k,
+            },
+            "results": points,
+        },
+        args.output,
+    )
+    print(f"\nRésultats enregistrés dans {path}")
+
+
+def bench_quantization(args: argparse.Namespace):
+    """
+    Écrit le corpus dans un magasin NumPy par type de quantification, puis mesure pour chaque
+    valeur de `rescore` la latence des requêtes et le rappel@k par rapport à la recherche exacte.
+    """
+    from vector_store import NumpyVectorStore
+
+    corpus = load_corpus(args.documents)
+    embedder = HashEmbeddings()
+    queries = sample_queries(corpus, args.queries)
+    ids = [doc_id for doc_id, _ in corpus]
+    corpus_vectors = np.asarray(
+        embedder.embed_documents([content for _, content in corpus]), dtype=np.float32
+    )
+    query_vectors = np.asarray(embedder.embed_documents(queries), dtype=np.float32)
+    truth = exact_top_k(corpus_vectors, query_vectors, args.k)
+    positions = {doc_id: i for i, doc_id in enumerate(ids)}
+    # Matrice float32 et normes : ce que parcourt la recherche exacte
+    float_bytes = corpus_vectors.shape[1] * 4 + 4
+    print(
+        f"Corpus : {len(corpus)} documents ({corpus_vectors.shape[1]} dimensions), "
+        f"{len(queries)} requêtes, k={args.k}."
+    )
+
+    points = []
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmp_dir:
+        for kind in ("none", "int8", "pq"):
+            store = NumpyVectorStore(
+                os.path.join(tmp_dir, kind), space="l2", quantization=kind
+            )
+            start = time.perf_counter()
+            store.add(
+                ids=ids,
+                embeddings=corpus_vectors,
+                documents=[""] * len(ids),
+                metadatas=[{} for _ in ids],
+            )
+            build_seconds = time.perf_counter() - start
+            quantized = store._current().quantized
+            bytes_per_vector = (
+                quantized.bytes_per_vector if quantized is not None else float_bytes
+            )
+            print(
+                f"   {kind:<5} : {bytes_per_vector:.0f} octets par vecteur "
+                f"(÷{float_bytes / bytes_per_vector:.1f}), écrit en {build_seconds:.2f}s"
+            )
+
+            for rescore in args.rescore if kind != "none" else [0]:
+                store.rescore = max(1, rescore)
+                found: List[set] = [set()] * len(queries)
+
+                def search(i: int):
+                    result = store.query(
+                        query_embeddings=query_vectors[i : i + 1],
+                        n_results=args.k,
+                        include=[],
+                    )
+                    found[i] = {positions[doc_id] for doc_id in result["ids"][0]}
+
+                latency = latency_summary(time_calls(search, len(queries)))
+                recall = statistics.fmean(
+                    len(f & t) / len(t) for f, t in zip(found, truth)
+                )
+                points.append(
+                    {
+                        "quantization": kind,
+                        "rescore": rescore,
+                        "bytes_per_vector": bytes_per_vector,
+                        "compression": float_bytes / bytes_per_vector,
+                        "build_seconds": build_seconds,
+                        "recall": recall,
+                        "latency": latency,
+                    }
+                )
+
+    exact_recall = points[0]["recall"]
+    print(
+        f"\n   {'type':<5} {'rescore':>7} | {'octets':>6} | {'p50 (ms)':>8} | "
+        f"rappel@k | perte"
+    )
+    for point in points:
+        print(
+            f"   {point['quantization']:<5} {point['rescore'] or '-':>7} | "
+            f"{point['bytes_per_vector']:6.0f} | {point['latency']['p50_ms']:8.2f} | "
+            f"{point['recall']:8.3f} | {exact_recall - point['recall']:+.3f}"
+        )
+    path = save_results(
+        "quantization",
+        {
+            "parameters": {
+                "documents": len(corpus),
+                "queries": len(queries),
+                "k": args.k,
+                "dimension": int(corpus_vectors.shape[1]),
+            },
+            "results": points,
+        },
+        args.output,
+    )
+    print(f"\nRésultats enregistrés dans {path}")
+
+
+class LoreSite:
+    """
+    Site local qui imite la liste des champions du wiki et les pages de
+    universe.leagueoflegends.com, à utiliser comme contexte :
+
+        with LoreSite(pages) as site:
+            data_scrapper.scrape_knowledge_base(site.champion_list_url, site.universe_url)
+
+    `pages` associe un slug au lore de la page ; un slug inconnu (région) reçoit un texte
+    synthétique. Chaque page porte un ETag et un Last-Modified, et une requête
+    conditionnelle sur une page inchangée reçoit 304. `latency` retarde chaque réponse et
+    `error_rate` est la proportion de réponses 503.
+    """
+
+    LAST_MODIFIED = "Mon, 02 Jun 2025 10:00:00 GMT"
+    PAGE_PADDING = "<script>" + "var lore = {};" * 4000 + "</script>"
+
+    def __init__(
+        self,
+        pages: Dict[str, str],
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.pages = pages
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.statuses: collections.Counter = collections.Counter()
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+
+    def champion_list(self) -> bytes:
+        cells = "".join(
+            f'<tr><td data-sort-value="{html.escape(slug)}">'
+            f'<a href="/wiki/{slug}/LoL">{html.escape(slug)}</a></td></tr>'
+            for slug in sorted(self.pages)
+        )
+        return (
+            '<html><body><h2><span id="List_of_Available_Champions">Champions</span></h2>'
+            f'<table class="article-table">{cells}</table></body></html>'
+        ).encode("utf-8")
+
+    def lore_page(self, slug: str) -> bytes:
+        content = self.pages.get(slug) or " ".join(
+            text for _, text in iter_synthetic_corpus(1, seed=hash(slug) % 1000)
+        )
+        return (
+            f'<html><head><meta name="description" content="{html.escape(content)}">'
+            f"</head><body>{self.PAGE_PADDING}</body></html>"
+        ).encode("utf-8")
+
+    def respond(self, handler: BaseHTTPRequestHandler):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            failing = self.rng.random() < self.error_rate
+        parts = [p for p in handler.path.split("/") if p]
+        if failing:
+            status, body, etag = 503, b"", None
+        elif handler.path.startswith("/wiki/List_of_champions"):
+            status, body, etag = 200, self.champion_list(), None
+        elif len(parts) >= 3 and parts[0] == "fr_FR":
+            body = self.lore_page(parts[-1])
+            etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+            status = 304 if handler.headers.get("If-None-Match") == etag else 200
+        else:
+            status, body, etag = 404, b"", None
+
+        handler.send_response(status)
+        if etag:
+            handler.send_header("ETag", etag)
+            handler.send_header("Last-Modified", self.LAST_MODIFIED)
+        if status == 503:
+            handler.send_header("Retry-After", "0")
+        if status == 304:
+            body = b""
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+        with self._lock:
+            self.statuses[status] += 1
+            self.bytes_sent += len(body)
+
+    def __enter__(self) -> "LoreSite":
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def do_GET(self):
+                site.respond(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    @property
+    def base_url(self) -> str:
+        assert self._server is not None
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    @property
+    def champion_list_url(self) -> str:
+        return f"{self.base_url}/wiki/List_of_champions"
+
+    @property
+    def universe_url(self) -> str:
+        return f"{self.base_url}/fr_FR"
+
+    def reset_counters(self) -> dict:
+        """Retourne puis remet à zéro les compteurs de réponses."""
+        with self._lock:
+            counters = {
+                "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+                "mb_sent": self.bytes_sent / 1024**2,
+            }
+            self.statuses.clear()
+            self.bytes_sent = 0
+        return counters
+
+
+def bench_scraper(args: argparse.Namespace):
+    """
+    Scrape deux fois le site local : un premier passage complet, puis un passage où toutes
+    les pages sont inchangées (requêtes conditionnelles, réponses 304).
+    """
+    pages = {
+        doc_id.lower().replace(" ", ""): content
+        for doc_id, content in load_corpus(args.documents)
+    }
+    original_dir = os.getcwd()
+    runs = {}
+    with (
+        tempfile.TemporaryDirectory() as work_dir,
+        LoreSite(pages, latency=args.latency, error_rate=args.error_rate) as site,
+    ):
+        # data_scrapper écrit dans des chemins relatifs au dossier courant
+        os.chdir(work_dir)
+        try:
+            import data_scrapper
+
+            for label in ("premier passage", "pages inchangées"):
+                start = time.perf_counter()
+                asyncio.run(
+                    data_scrapper.scrape_knowledge_base(
+                        site.champion_list_url,
+                        site.universe_url,
+                        host_concurrency=args.host_concurrency,
+                        host_rate_limit=args.rate_limit,
+                    )
+                )
+                seconds = time.perf_counter() - start
+                runs[label] = {
+                    "seconds": seconds,
+                    "pages_per_second": (len(pages) + len(data_scrapper.REGIONS))
+                    / seconds,
+                    **site.reset_counters(),
+                }
+        finally:
+            os.chdir(original_dir)
+
+    print(
+        f"\nSite local : {len(pages)} champions, latence {args.latency * 1000:.0f} ms."
+    )
+    for label, run in runs.items():
+        print(
+            f"   {label:<18} {run['seconds']:6.2f}s | {run['pages_per_second']:7.1f} pages/s"
+            f" | {run['mb_sent']:6.1f} Mo reçus | réponses {run['statuses']}"
+        )
+    path = save_results(
+        "scraper",
+        {
+            "parameters": {
+                "pages": len(pages),
+                "latency": args.latency,
+                "error_rate": args.error_rate,
+                "host_concurrency": args.host_concurrency,
+                "rate_limit": args.rate_limit,
+            },
+            "runs": runs,
+        },
+        args.output,
+    )
+    print(f"Résultats enregistrés dans {path}")
+
+
+class FirstBatchClock(HashEmbeddings):
+    """Embedding local qui note l'instant où le premier lot a été vectorisé."""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(latency=latency)
+        self.first_batch: float | None = None
+
+    def embed_documents(self, texts):
+        vectors = super().embed_documents(texts)
+        if self.first_batch is None:
+            self.first_batch = time.perf_counter()
+        return vectors
+
+
+def bench_pipeline(args: argparse.Namespace):
+    """
+    Construit la base à partir du site local, d'abord en deux étapes (scraping complet puis
+    create_database.build_database), puis avec le pipeline en flux.
+    """
+    pages = {
+        doc_id.lower().replace(" ", ""): content
+        for doc_id, content in load_corpus(args.documents)
+    }
+    original_dir = os.getcwd()
+    runs = {}
+    with (
+        tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as work_dir,
+        LoreSite(pages, latency=args.latency) as site,
+    ):
+        os.chdir(work_dir)
+        try:
+            import create_database
+            import data_scrapper
+            import pipeline
+            from registry import registry
+
+            def sequential():
+                asyncio.run(
+                    data_scrapper.scrape_knowledge_base(
+                        site.champion_list_url, site.universe_url
+                    )
+                )
+                create_database.build_database(workers=args.workers)
+
+            def streaming():
+                pipeline.run_pipeline(
+                    site.champion_list_url, site.universe_url, workers=args.workers
+                )
+
+            def measure(label: str, build: Callable[[], None]):
+                # Chaque mode part d'une base et d'un dossier source vides
+                create_database.reset_collection(registry.get("vector_store"))
+                for path in (
+                    create_database.MANIFEST_PATH,
+                    create_database.LEXICAL_INDEX_PATH,
+                ):
+                    if os.path.exists(path):
+                        os.remove(path)
+                shutil.rmtree(data_scrapper.OUTPUT_DIR, ignore_errors=True)
+
+                clock = FirstBatchClock(latency=args.fake_latency)
+                with registry.override("embedding_model", clock):
+                    start = time.perf_counter()
+                    build()
+                    seconds = time.perf_counter() - start
+                runs[label] = {
+                    "seconds": seconds,
+                    "first_batch_seconds": (clock.first_batch or start) - start,
+                    "chunks": registry.get("vector_store").count(),
+                }
+
+            with registry.override("embedding_model", HashEmbeddings()):
+                measure("séquentiel", sequential)
+                measure("en flux", streaming)
+        finally:
+            os.chdir(original_dir)
+
+    print(
+        f"\nSite local : {len(pages)} champions, latence {args.latency * 1000:.0f} ms, "
+        f"embedding {args.fake_latency * 1000:.0f} ms par lot."
+    )
+    for label, run in runs.items():
+        print(
+            f"   {label:<12} total {run['seconds']:6.2f}s | premier lot indexé après "
+            f"{run['first_batch_seconds']:6.2f}s | {run['chunks']} passages"
+        )
+    path = save_results(
+        "pipeline",
+        {
+            "parameters": {
+                "pages": len(pages),
+                "latency": args.latency,
+                "fake_latency": args.fake_latency,
+                "workers": args.workers,
+            },
+            "runs": runs,
+        },
+        args.output,
+    )
+    print(f"Résultats enregistrés dans {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks hors ligne du RAG.")
+    subparsers = parser.add_subparsers(dest="scenario", required=True)
+
+    titles_parser = subparsers.add_parser(
+        "titles", help="Coût de l'ancienne seconde requête sur la collection 'titles'."
+    )
+    titles_parser.add_argument("--documents", type=int, default=None)
+    titles_parser.add_argument("--queries", type=int, default=200)
+    titles_parser.add_argument("--k", type=int, default=5)
+    titles_parser.set_defaults(func=bench_titles)
+
+    suite_parser = subparsers.add_parser(
+        "suite",
+        help="Ingestion et recherches de bout en bout sur une base temporaire (résultats JSON).",
+    )
+    suite_parser.add_argument(
+        "--documents",
+        type=int,
+        default=None,
+        help="Taille du corpus (complété par des documents synthétiques, ex : 10000 à 1000000).",
+    )
+    suite_parser.add_argument("--queries", type=int, default=200)
+    suite_parser.add_argument("--k", type=int, default=5)
+    suite_parser.add_argument(
+        "--workers",
+        type=int,
+        default=EMBEDDING_WORKERS,
+        help="Threads de vectorisation.",
+    )
+    suite_parser.add_argument(
+        "--fake-latency",
+        type=float,
+        default=0.0,
+        help="Latence simulée d'un appel d'embedding, en secondes.",
+    )
+    suite_parser.add_argument("--output", default=RESULTS_DIR)
+    suite_parser.set_defaults(func=bench_suite)
+
+    hnsw_parser = subparsers.add_parser(
+        "hnsw",
+        help="Rappel et latence de l'index HNSW selon M, construction_ef et search_ef.",
+    )
+    hnsw_parser.add_argument("--documents", type=int, default=None)
+    hnsw_parser.add_argument("--queries", type=int, default=200)
+    hnsw_parser.add_argument("--k", type=int, default=10)
+    hnsw_parser.add_argument("--m", type=int, nargs="+", default=[8, 16, 32])
+    hnsw_parser.add_argument(
+        "--construction-ef", type=int, nargs="+", default=[64, 128, 256]
+    )
+    hnsw_parser.add_argument(
+        "--search-ef", type=int, nargs="+", default=[10, 20, 50, 100, 200]
+    )
+    hnsw_parser.add_argument("--output", default=RESULTS_DIR)
+    hnsw_parser.set_defaults(func=bench_hnsw)
+
+    quantization_parser = subparsers.add_parser(
+        "quantization",
+        help="Mémoire, rappel et latence du magasin NumPy quantifié (int8, pq).",
+    )
+    quantization_parser.add_argument("--documents", type=int, default=None)
+    quantization_parser.add_argument("--queries", type=int, default=200)
+    quantization_parser.add_argument("--k", type=int, default=10)
+    quantization_parser.add_argument(
+        "--rescore",
+        type=int,
+        nargs="+",
+        default=[1, 2, 5, 10, 20],
+        help="Candidats recalculés exactement par résultat (QUANTIZATION_RESCORE).",
+    )
+    quantization_parser.add_argument("--output", default=RESULTS_DIR)
+    quantization_parser.set_defaults(func=bench_quantization)
+
+    scraper_parser = subparsers.add_parser(
+        "scraper",
+        help="Scraping (premier passage puis pages inchangées) contre un site local.",
+    )
+    scraper_parser.add_argument("--documents", type=int, default=None)
+    scraper_parser.add_argument(
+        "--latency", type=float, default=0.05, help="Latence du site, en secondes."
+    )
+    scraper_parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Proportion de réponses 503."
+    )
+    scraper_parser.add_argument(
+        "--host-concurrency", type=int, default=HOST_CONCURRENCY
+    )
+    scraper_parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=HOST_RATE_LIMIT,
+        help="Requêtes par seconde vers le site (0 : sans limite).",
+    )
+    scraper_parser.add_argument("--output", default=RESULTS_DIR)
+    scraper_parser.set_defaults(func=bench_scraper)
+
+    pipeline_parser = subparsers.add_parser(
+        "pipeline",
+        help="Scraping puis indexation, comparé au pipeline en flux (site local).",
+    )
+    pipeline_parser.add_argument("--documents", type=int, default=None)
+    pipeline_parser.add_argument(
+        "--latency", type=float, default=0.05, help="Latence du site, en secondes."
+    )
+    pipeline_parser.add_argument(
+        "--fake-latency",
+        type=float,
+        default=0.2,
+        help="Latence simulée d'un appel d'embedding, en secondes.",
+    )
+    pipeline_parser.add_argument(
+        "--workers",
+        type=int,
+        default=EMBEDDING_WORKERS,
+        help="Threads de vectorisation.",
+    )
+    pipeline_parser.add_argument("--output", default=RESULTS_DIR)
+    pipeline_parser.set_defaults(func=bench_pipeline)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Découpage des documents en passages (chunks) qui se chevauchent.
+
+Le texte est découpé en phrases, puis les phrases sont regroupées en passages d'au plus
+`chunk_size` caractères. Chaque passage reprend les dernières phrases du précédent, dans
+la limite de `overlap` caractères, pour ne pas couper une information entre deux vecteurs.
+Chaque passage garde l'ID de son document parent et sa position dans le texte, ce qui
+permet de reconstituer le document à partir de ses passages.
+"""
+
+from typing import Iterable, List, Tuple
+import dataclasses
+import re
+
+# --- CONFIGURATION ---
+CHUNK_SIZE = 1000  # caractères (≈ 250 tokens)
+CHUNK_OVERLAP = 200
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?…»])\s+")
+
+
+@dataclasses.dataclass
+class Chunk:
+    id: str
+    parent_id: str
+    index: int
+    content: str
+    start: int  # position du passage dans le texte du parent
+    end: int
+
+
+def chunk_id(parent_id: str, index: int) -> str:
+    return f"{parent_id}#{index}"
+
+
+def split_sentences(text: str, max_length: int) -> List[Tuple[int, int]]:
+    """
+    Retourne les intervalles (début, fin) des phrases du texte.
+    Une phrase plus longue que `max_length` est coupée sur une limite de mot.
+    """
+    spans = []
+    position = 0
+    for match in _SENTENCE_END_RE.finditer(text):
+        spans.append((position, match.start()))
+        position = match.end()
+    if position < len(text):
+        spans.append((position, len(text.rstrip())))
+
+    result = []
+    for start, end in spans:
+        while end - start > max_length:
+            cut = text.rfind(" ", start, start + max_length)
+            if cut <= start:
+                cut = start + max_length
+            result.append((start, cut))
+            start = cut + 1 if text[cut : cut + 1] == " " else cut
+        if end > start:
+            result.append((start, end))
+    return result
+
+
+def chunk_text(
+    parent_id: str,
+    text: str,
+    chunk_size: int = CHUNK_SIZE,
+    overlap: int = CHUNK_OVERLAP,
+) -> List[Chunk]:
+    """Découpe un document en passages de phrases entières qui se chevauchent."""
+    sentences = split_sentences(text, chunk_size)
+    if not sentences:
+        return []
+
+    chunks: List[Chunk] = []
+    first = 0
+    while first < len(sentences):
+        # On ajoute des phrases tant que le passage reste sous la taille maximale
+        last = first
+        while (
+            last + 1 < len(sentences)
+            and sentences[last + 1][1] - sentences[first][0] <= chunk_size
+        ):
+            last += 1
+        start, end = sentences[first][0], sentences[last][1]
+        chunks.append(
+            Chunk(
+                id=chunk_id(parent_id, len(chunks)),
+                parent_id=parent_id,
+                index=len(chunks),
+                content=text[start:end],
+                start=start,
+                end=end,
+            )
+        )
+        if last + 1 >= len(sentences):
+            break
+
+        # Le passage suivant reprend les dernières phrases dans la limite du chevauchement
+        # (et tant que la phrase suivante tient encore dans le passage).
+        next_first = last + 1
+        while (
+            next_first - 1 > first
+            and end - sentences[next_first - 1][0] <= overlap
+            and sentences[last + 1][1] - sentences[next_first - 1][0] <= chunk_size
+        ):
+            next_first -= 1
+        first = next_first
+    return chunks
+
+
+def merge_chunks(chunks: Iterable[Tuple[int, int, str]]) -> str:
+    """
+    Reconstitue le texte d'un document à partir de ses passages (début, fin, contenu),
+    en supprimant les chevauchements.
+    """
+    parts = []
+    covered = None
+    for start, end, content in sorted(chunks):
+        if covered is None or start >= covered:
+            if covered is not None and start > covered:
+                parts.append(" ")
+            parts.append(content)
+        elif end > covered:
+            parts.append(content[covered - start :])
+        else:
+            continue
+        covered = end
+    return "".join(parts)
@@ -0,0 +1,101 @@
+"""
+Sélection des passages envoyés au LLM dans la limite d'un budget de tokens.
+
+Les documents sont pris du plus proche au plus éloigné de la requête. Les phrases déjà
+présentes pour le même document source (chevauchement entre passages voisins, document
+renvoyé par plusieurs requêtes) sont retirées ; un document qui dépasse le budget restant
+est tronqué sur une limite de phrase, ou écarté s'il ne reste presque plus de place.
+"""
+
+from typing import Dict, List, Set, Tuple
+import dataclasses
+
+import metrics
+from chunking import split_sentences
+from ingestion import estimate_tokens
+from rag_core import Document
+
+# --- CONFIGURATION ---
+CONTEXT_TOKEN_BUDGET = 6000
+MIN_PASSAGE_TOKENS = 50  # En dessous, un passage tronqué n'apporte plus rien
+
+
+@dataclasses.dataclass
+class PackedContext:
+    documents: List[Document]  # passages retenus, éventuellement tronqués
+    tokens: int  # tokens estimés (titres compris)
+    budget: int
+    trimmed: int = 0  # documents tronqués
+    dropped: int = 0  # documents écartés (doublons ou hors budget)
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.documents)} documents, {self.tokens}/{self.budget} tokens"
+            f" ({self.trimmed} tronqués, {self.dropped} écartés)"
+        )
+
+
+def normalize(sentence: str) -> str:
+    return " ".join(sentence.split())
+
+
+def join_spans(content: str, spans: List[Tuple[int, int, int]]) -> str:
+    """
+    Recolle des phrases (rang, début, fin) du texte : les phrases consécutives gardent leur
+    séparateur d'origine (sauts de ligne compris), les autres sont séparées par une espace.
+    """
+    parts = []
+    previous = None
+    for i, start, end in spans:
+        if previous is not None:
+            parts.append(content[previous[2] : start] if i == previous[0] + 1 else " ")
+        parts.append(content[start:end])
+        previous = (i, start, end)
+    return "".join(parts)
+
+
+def pack_context(
+    documents: List[Document], budget: int = CONTEXT_TOKEN_BUDGET
+) -> PackedContext:
+    """Retient les meilleurs passages sans dépasser `budget` tokens estimés."""
+    packed = PackedContext(documents=[], tokens=0, budget=budget)
+    seen_sentences: Dict[str, Set[str]] = {}
+    for document in sorted(documents, key=lambda d: d.rating):
+        content = document.content
+        seen = seen_sentences.setdefault(document.parent_id or document.id, set())
+        spans = [
+            (i, start, end)
+            for i, (start, end) in enumerate(
+                split_sentences(content, max(1, len(content)))
+            )
+            if normalize(content[start:end]) not in seen
+        ]
+        if not spans:
+            packed.dropped += 1
+            continue
+
+        remaining = budget - packed.tokens - estimate_tokens(document.title)
+        kept = []
+        tokens = 0
+        for span in spans:
+            span_tokens = estimate_tokens(content[span[1] : span[2]])
+            if tokens + span_tokens > remaining:
+                break
+            kept.append(span)
+            tokens += span_tokens
+        if len(kept) < len(spans):
+            if tokens < MIN_PASSAGE_TOKENS:
+                packed.dropped += 1
+                continue
+            packed.trimmed += 1
+
+        seen.update(normalize(content[start:end]) for _, start, end in kept)
+        packed.documents.append(
+            document.model_copy(update={"content": join_spans(content, kept)})
+        )
+        packed.tokens += tokens + estimate_tokens(document.title)
+
+    metrics.increment("context.packs")
+    metrics.increment("context.tokens", packed.tokens)
+    metrics.increment("context.dropped_documents", packed.dropped)
+    return packed
@@ -1,87 +1,579 @@
 """
 Construit la base de données vectorielle à partir des fichiers de lore
 générés par le scrapper et contenus dans dataset_rag_lol_definitive/knowledge_base.
+
+Par défaut l'indexation est incrémentale : un manifeste des hash de contenu des fichiers
+permet de n'indexer que les fichiers nouveaux ou modifiés et de supprimer les documents
+dont le fichier a disparu. L'option --full force la remise à zéro complète de la base.
+
+Les titres des documents (slug et nom d'affichage) sont stockés dans leurs métadonnées.
+Une base construite avec l'ancienne collection 'titles' est migrée automatiquement.
+
+Chaque document est découpé en passages qui se chevauchent (chunking.py) ; chaque passage
+est un vecteur dont les métadonnées référencent le document parent. Modifier les paramètres
+de découpage (--chunk-size, --chunk-overlap) déclenche une réindexation complète.
+
+Les passages sont vectorisés par lots via le pipeline d'ingestion (ingestion.py) et le
+manifeste est mis à jour après chaque lot écrit : un build interrompu reprend là où il
+s'était arrêté. L'option --dry-run mesure le débit du pipeline avec un embedding local,
+sans appel à l'API ni écriture dans la base.
+
+Après chaque modification, l'index lexical BM25 (lexical_index.py) est reconstruit à partir
+des passages de la base, pour la recherche hybride de rag_core.query.
+
+L'option --rebuild-index reconstruit l'index HNSW de la collection avec les paramètres
+courants (HNSW_SPACE, HNSW_M...) en recopiant les vecteurs existants, sans les recalculer.
+
+Les passages sont écrits dans le magasin de vecteurs choisi par VECTOR_STORE (vector_store.py) :
+la collection Chroma par défaut, ou la matrice NumPy de database/numpy_store.
+
+L'option --snapshot publie ensuite la base dans un snapshot immuable et versionné
+(snapshots.py), servi en lecture seule par les réplicas de l'API (VECTOR_STORE=snapshot).
 """
 
-from typing import List, Tuple
+from typing import Dict, Iterable, Iterator, List, Tuple
+import argparse
+import dataclasses
+import hashlib
+import json
 import os
+import time
 
 import chromadb
 
+import ingestion
 import rag_core as core
+import snapshots
+from chunking import Chunk, CHUNK_SIZE, CHUNK_OVERLAP
+from lexical_index import BM25Index, INDEX_PATH as LEXICAL_INDEX_PATH
+from local_embeddings import HashEmbeddings
+from registry import registry
+from vector_store import NUMPY_STORE_DIR, VECTOR_STORE, VectorStore
 
 # --- CONFIGURATION ---
 DOCUMENTS_SOURCE_DIR = os.path.join(
     os.getcwd(), "dataset_rag_lol_definitive", "knowledge_base"
 )
+TITLES_PATH = os.path.join(os.getcwd(), "dataset_rag_lol_definitive", "titles.json")
+MANIFEST_PATH = os.path.join(os.getcwd(), "database", "index_manifest.json")
 
-documents_collection = core.documents_collection
-titles_collection = core.titles_collection
-
-print("Base de données vectorielle initialisée.")
+# Collection des titres utilisée avant leur stockage en métadonnées des documents
+LEGACY_TITLES_COLLECTION = "titles"
+DOCUMENTS_COLLECTION = "documents"
+REBUILD_COLLECTION = "documents-rebuild"
+REBUILD_BATCH_SIZE = 1000
 
 
 # --- REMISE À ZÉRO DE LA BASE DE DONNÉES ---
-def reset_collection(collection: chromadb.Collection):
-    """Vide une collection de tous ses documents."""
-    count = collection.count()
+def reset_collection(store: VectorStore):
+    """Vide le magasin de vecteurs de tous ses documents."""
+    count = store.count()
     if count > 0:
         # Récupère tous les IDs existants pour les supprimer
-        existing_ids = collection.get(include=[])["ids"]
-        collection.delete(ids=existing_ids)
+        existing_ids = store.get(include=[])["ids"]
+        store.delete(ids=existing_ids)
+        print(f"Collection '{store.name}' remise à zéro ({count} éléments supprimés).")
+
+
+# --- MANIFESTE DES FICHIERS INDEXÉS ---
+
+
+def file_hash(file_path: str) -> str:
+    """Calcule le hash SHA-256 du contenu d'un fichier."""
+    with open(file_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+@dataclasses.dataclass
+class Manifest:
+    """État de la dernière indexation : hash et nombre de passages de chaque document."""
+
+    hashes: Dict[str, str] = dataclasses.field(default_factory=dict)
+    chunk_counts: Dict[str, int] = dataclasses.field(default_factory=dict)
+
+    def record(self, doc_id: str, doc_hash: str, chunk_count: int):
+        self.hashes[doc_id] = doc_hash
+        self.chunk_counts[doc_id] = chunk_count
+
+    def forget(self, doc_id: str):
+        self.hashes.pop(doc_id, None)
+        self.chunk_counts.pop(doc_id, None)
+
+    @property
+    def total_chunks(self) -> int:
+        return sum(self.chunk_counts.values())
+
+
+def chunking_parameters(chunk_size: int, chunk_overlap: int) -> Dict[str, int]:
+    return {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap}
+
+
+def load_manifest(chunk_size: int, chunk_overlap: int) -> Manifest:
+    """
+    Charge le manifeste de la dernière indexation.
+    Un manifeste produit avec d'autres paramètres de découpage est ignoré : tous les
+    documents sont alors redécoupés et revectorisés.
+    """
+    if not os.path.exists(MANIFEST_PATH):
+        return Manifest()
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("chunking") != chunking_parameters(chunk_size, chunk_overlap):
+            print("Paramètres de découpage modifiés : réindexation complète.")
+            return Manifest()
+        return Manifest(hashes=data["documents"], chunk_counts=data["chunks"])
+    except (OSError, KeyError, json.JSONDecodeError) as e:
+        print(f"[AVERTISSEMENT] Manifeste illisible, réindexation complète ({e}).")
+        return Manifest()
+
+
+def save_manifest(manifest: Manifest, chunk_size: int, chunk_overlap: int):
+    """Écrit le manifeste de manière atomique."""
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "chunking": chunking_parameters(chunk_size, chunk_overlap),
+                "documents": manifest.hashes,
+                "chunks": manifest.chunk_counts,
+            },
+            f,
+            indent=1,
+            sort_keys=True,
+        )
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+# --- TITRES DES DOCUMENTS ---
+
+
+def load_titles() -> Dict[str, str]:
+    """Charge les titres d'affichage {slug: nom} enregistrés par le scrapper."""
+    if not os.path.exists(TITLES_PATH):
+        return {}
+    with open(TITLES_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def title_metadata(doc_id: str, titles: Dict[str, str]) -> Dict[str, str | int]:
+    """Métadonnées de titre d'un document : son slug et son nom d'affichage."""
+    return {
+        "title": doc_id,
+        "display_title": titles.get(doc_id) or doc_id.replace("-", " ").title(),
+    }
+
+
+def migrate_titles(
+    store: VectorStore,
+    titles: Dict[str, str],
+    client: chromadb.ClientAPI | None = None,
+):
+    """
+    Migre une base construite avec l'ancienne collection 'titles' : les titres sont
+    ajoutés aux métadonnées des documents (sans nouvelle vectorisation), puis la
+    collection 'titles' est supprimée du `client` Chroma. Sans effet sur une base déjà migrée.
+    """
+    records = store.get(include=["metadatas"])
+    missing_ids = [
+        doc_id
+        for doc_id, metadata in zip(records["ids"], records["metadatas"] or [])
+        if not (metadata and "title" in metadata)
+    ]
+    if missing_ids:
+        store.update(
+            ids=missing_ids,
+            metadatas=[title_metadata(doc_id, titles) for doc_id in missing_ids],  # type: ignore[misc]
+        )
         print(
-            f"Collection '{collection.name}' remise à zéro ({count} éléments supprimés)."
+            f"Migration : titres ajoutés aux métadonnées de {len(missing_ids)} documents."
         )
 
+    if client is None:
+        return
+    collection_names = [getattr(c, "name", c) for c in client.list_collections()]
+    if LEGACY_TITLES_COLLECTION in collection_names:
+        client.delete_collection(LEGACY_TITLES_COLLECTION)
+        print(f"Migration : collection '{LEGACY_TITLES_COLLECTION}' supprimée.")
 
-reset_collection(documents_collection)
-reset_collection(titles_collection)
 
 # --- IMPORT ET INDEXATION DES FICHIERS ---
 
 
-def load_documents_from_source() -> Tuple[List[str], List[str]]:
+def scan_source_files() -> Dict[str, str]:
     """
-    Charge les contenus des documents et génère des IDs à partir des noms de fichiers.
-    Retourne:
-        - Une liste de contenus textuels.
-        - Une liste d'IDs (noms de fichiers sans extension).
+    Parcourt le dossier source et retourne {id du document: hash du fichier}.
+    L'ID est le nom du fichier sans ".txt" (ex: "garen", "jinx").
     """
-    contents = []
-    ids = []
+    # Le scrapper ne crée que des .txt
+    return {
+        os.path.splitext(filename)[0]: file_hash(
+            os.path.join(DOCUMENTS_SOURCE_DIR, filename)
+        )
+        for filename in os.listdir(DOCUMENTS_SOURCE_DIR)
+        if filename.endswith(".txt")
+    }
+
+
+def chunk_metadata(
+    chunk: Chunk, chunk_count: int, titles: Dict[str, str]
+) -> Dict[str, str | int]:
+    """Métadonnées d'un passage : titres du parent et position dans le parent."""
+    return {
+        **title_metadata(chunk.parent_id, titles),
+        "parent_id": chunk.parent_id,
+        "chunk_index": chunk.index,
+        "chunk_count": chunk_count,
+        "start": chunk.start,
+        "end": chunk.end,
+    }
+
+
+def delete_parents(store: VectorStore, parent_ids: List[str]):
+    """Supprime tous les passages des documents donnés (et leurs anciens vecteurs non découpés)."""
+    if parent_ids:
+        store.delete(ids=parent_ids, parent_ids=parent_ids)
+
+
+def indexed_parent_ids(store: VectorStore) -> set[str]:
+    """IDs des documents parents effectivement présents dans la collection."""
+    records = store.get(include=["metadatas"])
+    return {
+        (metadata or {}).get("parent_id", doc_id)  # type: ignore[misc]
+        for doc_id, metadata in zip(records["ids"], records["metadatas"] or [])
+    }
+
+
+def build_lexical_index(store: VectorStore):
+    """Reconstruit l'index BM25 (database/bm25_index.json) à partir des passages indexés."""
+    records = store.get(include=["documents", "metadatas"])
+    index = BM25Index.build(
+        records["ids"],
+        records["documents"] or [],
+        [dict(m or {}) for m in records["metadatas"] or []],
+    )
+    index.save(LEXICAL_INDEX_PATH)
+    print(f"Index lexical BM25 reconstruit ({len(index.ids)} passages).")
+
 
-    if not os.path.exists(DOCUMENTS_SOURCE_DIR):
+def publish_snapshot() -> str | None:
+    """Publie la base (passages et index BM25) dans un nouveau snapshot (snapshots.py)."""
+    store = registry.get("vector_store")
+    if not store.count() or not os.path.exists(LEXICAL_INDEX_PATH):
+        print(
+            "[ERREUR] La base est vide : construisez-la avant de publier un snapshot."
+        )
+        return None
+    print(f"\nPublication d'un snapshot dans '{snapshots.SNAPSHOT_DIR}'...")
+    return snapshots.publish(store, LEXICAL_INDEX_PATH, space=core.HNSW_SPACE)
+
+
+def rebuild_index(
+    client: chromadb.ClientAPI | None, batch_size: int = REBUILD_BATCH_SIZE
+):
+    """
+    Recrée la collection des passages avec les paramètres HNSW courants (rag_core.hnsw_metadata).
+    Les passages et leurs vecteurs sont recopiés par lots dans une nouvelle collection, qui
+    remplace l'ancienne une fois la copie vérifiée. Une reconstruction interrompue pendant la
+    copie est reprise de zéro ; interrompue après la suppression de l'ancienne collection,
+    la nouvelle est simplement renommée.
+    """
+    if VECTOR_STORE != "chroma":
+        print(f"Le magasin '{VECTOR_STORE}' n'a pas d'index HNSW à reconstruire.")
+        return
+    names = {c.name for c in client.list_collections()}
+    embedding_function = registry.get("chroma_embedding_function")
+    if DOCUMENTS_COLLECTION not in names:
+        if REBUILD_COLLECTION in names:
+            client.get_collection(
+                REBUILD_COLLECTION, embedding_function=embedding_function
+            ).modify(name=DOCUMENTS_COLLECTION)
+            print("Reconstruction précédente terminée (collection renommée).")
+        else:
+            print("Aucune collection à reconstruire.")
+        return
+    if REBUILD_COLLECTION in names:
+        client.delete_collection(REBUILD_COLLECTION)
+
+    source = client.get_collection(
+        DOCUMENTS_COLLECTION, embedding_function=embedding_function
+    )
+    target = client.create_collection(
+        REBUILD_COLLECTION,
+        embedding_function=embedding_function,
+        metadata=core.hnsw_metadata(),
+    )
+    print(
+        f"Reconstruction de l'index : {core.hnsw_settings(source)} -> "
+        f"{core.hnsw_settings(target)}"
+    )
+    total = source.count()
+    for offset in range(0, total, batch_size):
+        records = source.get(
+            limit=batch_size,
+            offset=offset,
+            include=["embeddings", "documents", "metadatas"],
+        )
+        target.add(
+            ids=records["ids"],
+            embeddings=records["embeddings"],  # type: ignore[arg-type]
+            documents=records["documents"],
+            metadatas=records["metadatas"],  # type: ignore[arg-type]
+        )
+        print(f"   -> {min(offset + batch_size, total)}/{total} passages recopiés.")
+
+    if target.count() != total:
+        raise RuntimeError(
+            f"Copie incomplète ({target.count()}/{total} passages), base inchangée."
+        )
+    client.delete_collection(DOCUMENTS_COLLECTION)
+    target.modify(name=DOCUMENTS_COLLECTION)
+    registry.reset("documents_collection")
+    print(f"Index HNSW reconstruit ({total} passages).")
+
+
+def build_database(
+    full: bool = False,
+    dry_run: bool = False,
+    workers: int = ingestion.EMBEDDING_WORKERS,
+    fake_latency: float = 0.0,
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+    stream: Iterable[Tuple[str, str]] | None = None,
+):
+    """
+    Synchronise la base vectorielle avec le dossier source.
+    Seuls les fichiers nouveaux ou modifiés sont découpés et vectorisés ; une base à jour
+    ne déclenche aucun appel au modèle d'embedding.
+
+    Avec `stream`, les documents (id, titre d'affichage) sont indexés au fur et à mesure de
+    leur arrivée dans le dossier source (voir pipeline.py) ; les documents disparus ne sont
+    supprimés qu'une fois le flux terminé. Si le flux s'interrompt, les lots déjà écrits
+    restent indexés et l'index BM25 est reconstruit : la base reste cohérente.
+    """
+    start_time = time.time()
+    if VECTOR_STORE == "snapshot" and not dry_run:
+        print(
+            "[ERREUR] VECTOR_STORE=snapshot est en lecture seule : construisez la base avec "
+            "VECTOR_STORE=chroma ou numpy, puis publiez-la avec --snapshot."
+        )
+        return
+    if stream is None and not os.path.exists(DOCUMENTS_SOURCE_DIR):
         print(f"[ERREUR] Le dossier source '{DOCUMENTS_SOURCE_DIR}' n'existe pas.")
         print("Veuillez d'abord exécuter le script du data scrapper.")
-        return [], []
+        return
 
-    # Le scrapper ne crée que des .txt
-    for filename in os.listdir(DOCUMENTS_SOURCE_DIR):
-        if filename.endswith(".txt"):
-            file_path = os.path.join(DOCUMENTS_SOURCE_DIR, filename)
-            with open(file_path, "r", encoding="utf-8") as file:
-                contents.append(file.read())
-                # L'ID est le nom du fichier sans ".txt" (ex: "garen", "jinx")
-                ids.append(os.path.splitext(filename)[0])
+    print("\nAnalyse des documents à indexer...")
+    sources = scan_source_files() if stream is None else {}
+
+    def pipeline(ids: Iterable[str]):
+        return ingestion.batch_by_tokens(
+            ingestion.chunk_documents(
+                ingestion.iter_source_documents(DOCUMENTS_SOURCE_DIR, ids, sources),
+                chunk_size,
+                chunk_overlap,
+            )
+        )
 
-    return contents, ids
+    if dry_run:
+        # Tous les documents passent dans le pipeline, rien n'est écrit
+        stats = ingestion.run_ingestion(
+            pipeline(sorted(sources)),
+            embedder=HashEmbeddings(latency=fake_latency),
+            sink=lambda batch, embeddings: None,
+            workers=workers,
+        )
+        print(f"[DRY RUN] {stats.summary()}")
+        return
 
+    documents_collection = registry.get("vector_store")
+    titles = load_titles()
 
-print("\nChargement des documents à indexer...")
-docs, doc_ids = load_documents_from_source()
+    def checkpoint_manifest():
+        save_manifest(manifest, chunk_size, chunk_overlap)
 
-if docs:
-    print(f"{len(docs)} documents chargés.")
+    if full:
+        reset_collection(documents_collection)
+        manifest = Manifest()
+    else:
+        manifest = load_manifest(chunk_size, chunk_overlap)
+        # Un manifeste qui ne correspond plus à la base (volume recréé, build interrompu,
+        # changement de découpage...) n'est pas fiable : on resynchronise à partir des
+        # documents réellement présents.
+        if documents_collection.count() != manifest.total_chunks:
+            indexed_ids = indexed_parent_ids(documents_collection)
+            for doc_id in list(manifest.hashes):
+                if doc_id not in indexed_ids:
+                    manifest.forget(doc_id)
+            for doc_id in indexed_ids - manifest.hashes.keys():
+                manifest.record(doc_id, "", 0)
+    migrate_titles(
+        documents_collection,
+        titles,
+        client=core.client if VECTOR_STORE == "chroma" else None,
+    )
 
-    print("Indexation des contenus dans la collection 'documents'...")
-    documents_collection.add(documents=docs, ids=doc_ids)
+    def remove_documents(removed_ids: List[str]):
+        if removed_ids:
+            print("Suppression des documents disparus...")
+            delete_parents(documents_collection, removed_ids)
+            for doc_id in removed_ids:
+                manifest.forget(doc_id)
+            checkpoint_manifest()
 
-    print("Indexation des titres (slugs) dans la collection 'titles'...")
-    titles_collection.add(documents=doc_ids, ids=doc_ids)
+    def streamed_changes() -> Iterator[str]:
+        """Documents du flux dont le contenu diffère de la dernière indexation."""
+        for doc_id, title in stream or ():
+            # Un sujet peut être écrit deux fois (lore manuel puis page scrapée) : le
+            # document n'est lu qu'une fois, une modification ultérieure sera vue au
+            # prochain lancement grâce au hash du manifeste.
+            if doc_id in sources:
+                continue
+            sources[doc_id] = file_hash(
+                os.path.join(DOCUMENTS_SOURCE_DIR, f"{doc_id}.txt")
+            )
+            titles[doc_id] = title
+            if manifest.hashes.get(doc_id) != sources[doc_id]:
+                yield doc_id
 
-    print("\nOpération terminée.")
-    print(
-        f"La base de données a été construite avec succès dans : 'database/chroma_db'"
+    if stream is None:
+        changed_ids = sorted(
+            doc_id
+            for doc_id, doc_hash in sources.items()
+            if manifest.hashes.get(doc_id) != doc_hash
+        )
+        removed_ids = sorted(manifest.hashes.keys() - sources.keys())
+        print(
+            f"{len(sources)} documents trouvés : {len(changed_ids)} nouveaux ou modifiés, "
+            f"{len(removed_ids)} supprimés, {len(sources) - len(changed_ids)} inchangés."
+        )
+        remove_documents(removed_ids)
+        modified = bool(changed_ids or removed_ids)
+    else:
+        changed_ids = streamed_changes()
+        modified = False
+
+    def write_batch(
+        batch: List[ingestion.SourceDocument], embeddings: List[List[float]]
+    ):
+        # Les anciens passages d'un document modifié peuvent être plus nombreux
+        delete_parents(documents_collection, [d.id for d in batch])
+        chunks = [c for d in batch for c in d.chunks]
+        counts = {d.id: len(d.chunks) for d in batch}
+        if chunks:
+            documents_collection.add(
+                ids=[c.id for c in chunks],
+                documents=[c.content for c in chunks],
+                embeddings=embeddings,  # type: ignore[arg-type]
+                metadatas=[chunk_metadata(c, counts[c.parent_id], titles) for c in chunks],  # type: ignore[misc]
+            )
+
+    def checkpoint(batch: List[ingestion.SourceDocument]):
+        nonlocal modified
+        modified = True
+        for d in batch:
+            manifest.record(d.id, d.content_hash, len(d.chunks))
+        checkpoint_manifest()
+        print(
+            f"   -> {len(batch)} documents indexés "
+            f"({sum(len(d.chunks) for d in batch)} passages)."
+        )
+
+    try:
+        if stream is not None or changed_ids:
+            print("Découpage et indexation des documents...")
+            stats = ingestion.run_ingestion(
+                pipeline(changed_ids),
+                embedder=core.embedding_model,
+                sink=write_batch,
+                on_batch_done=checkpoint,
+                workers=workers,
+            )
+            print(stats.summary())
+            if stats.failed_documents:
+                print(
+                    "[AVERTISSEMENT] Certains documents n'ont pas été indexés ; "
+                    "ils le seront au prochain lancement."
+                )
+
+        if stream is not None:
+            # Le flux est complet : le dossier source contient tous les documents
+            sources = scan_source_files()
+            removed_ids = sorted(manifest.hashes.keys() - sources.keys())
+            remove_documents(removed_ids)
+            modified = modified or bool(removed_ids)
+    finally:
+        checkpoint_manifest()
+        if modified or not os.path.exists(LEXICAL_INDEX_PATH):
+            build_lexical_index(documents_collection)
+
+    print(f"\nOpération terminée en {time.time() - start_time:.2f} secondes.")
+    database_dir = NUMPY_STORE_DIR if VECTOR_STORE == "numpy" else "database/chroma_db"
+    print(f"La base de données est à jour dans : '{database_dir}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Vide la base et réindexe tous les documents.",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=CHUNK_SIZE,
+        help="Taille maximale d'un passage, en caractères.",
+    )
+    parser.add_argument(
+        "--chunk-overlap",
+        type=int,
+        default=CHUNK_OVERLAP,
+        help="Chevauchement maximal entre deux passages consécutifs, en caractères.",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Mesure le débit du pipeline avec un embedding local, sans écrire dans la base.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=ingestion.EMBEDDING_WORKERS,
+        help="Nombre de threads de vectorisation.",
     )
-else:
-    print("Aucun document n'a été trouvé à indexer.")
+    parser.add_argument(
+        "--fake-latency",
+        type=float,
+        default=0.0,
+        help="(--dry-run) Latence simulée d'un appel d'embedding, en secondes.",
+    )
+    parser.add_argument(
+        "--rebuild-index",
+        action="store_true",
+        help="Reconstruit l'index HNSW avec les paramètres courants (HNSW_*), sans revectoriser.",
+    )
+    parser.add_argument(
+        "--snapshot",
+        action="store_true",
+        help="Publie ensuite la base dans un snapshot en lecture seule (snapshots.py).",
+    )
+    args = parser.parse_args()
+    if args.rebuild_index:
+        rebuild_index(core.client if VECTOR_STORE == "chroma" else None)
+        return
+    build_database(
+        full=args.full,
+        dry_run=args.dry_run,
+        workers=args.workers,
+        fake_latency=args.fake_latency,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+    )
+    if args.snapshot and not args.dry_run:
+        publish_snapshot()
+
+
+if __name__ == "__main__":
+    main()
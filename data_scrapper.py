@@ -1,12 +1,22 @@
 import os
+import asyncio
 import csv
-import requests
+import dataclasses
+import json
 import re
-import concurrent.futures
-from bs4 import BeautifulSoup
+import httpx
+from bs4 import BeautifulSoup, SoupStrainer
 from tqdm import tqdm
 import time
-from typing import List, Tuple, Literal, cast
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Tuple, Literal, cast
+
+from http_fetcher import (
+    AsyncFetcher,
+    RetryableStatus,
+    ValidatorCache,
+    HOST_CONCURRENCY,
+    HOST_RATE_LIMIT,
+)
 
 # ==============================================================================
 # --- CONFIGURATION & DONNÉES ---
@@ -15,6 +25,9 @@ from typing import List, Tuple, Literal, cast
 OUTPUT_DIR = "dataset_rag_lol_definitive"
 KNOWLEDGE_BASE_DIR = os.path.join(OUTPUT_DIR, "knowledge_base")
 EVALUATION_FILENAME = os.path.join(OUTPUT_DIR, "evaluation.csv")
+TITLES_FILENAME = os.path.join(OUTPUT_DIR, "titles.json")
+# Validateurs HTTP (ETag / Last-Modified) des pages déjà scrapées
+HTTP_CACHE_FILENAME = os.path.join(OUTPUT_DIR, "http_cache.json")
 
 CHAMPION_LIST_URL = "https://leagueoflegends.fandom.com/wiki/List_of_champions"
 UNIVERSE_BASE_URL = "https://universe.leagueoflegends.com/fr_FR"
@@ -63,8 +76,11 @@ MANUAL_LORE_DATA = {
     "mel": """Mère, Un soldat m'a offert ton masque aujourd'hui. Sans réfléchir, j'en ai parcouru les fissures, capté chaque bosse, chaque cicatrice des innombrables combats dont tu es sortie victorieuse... et celle du combat dont tu ne t'es pas relevée. Ce n'est que maintenant, alors que notre navire vogue en direction de Noxus, que la réalité s'impose à moi. Tu n'es plus là. Une fois encore. Mais cette fois, je ne peux plus espérer ton retour. Je sais que tu ne voudrais pas que je m'attarde sur ta mort. Tu me dirais d'être fière. Je suis enfin devenue « le loup » que tu désirais si ardemment. Mais je ne peux m'empêcher de me demander si je suis devenue ce que tu espérais... ou simplement ce que tu avais besoin que je sois. Tant de choses ont changé, et pourtant une part de moi est aussi perdue que je l'étais une décennie plus tôt. Quand j'y repense, le visage de cousin Jago à mon arrivée à Piltover était empreint de pitié. Tu m'avais bien fait comprendre que j'étais livrée en offrande et que tu ne reviendrais pas me chercher. Malgré tout, des années durant je m'endormais en désirant te revoir, comme n'importe quelle fille désirerait voir sa mère. Malgré tout ce que tu m'avais fait. Chaque matin, je m'éveillais aux côtés du vide que tu m'avais imposé. J'ai passé ma vie à tenter de remplir ce vide, à devenir digne de l'amour de ma propre mère. J'ai vécu de la seule façon que je connais : en suivant la voie du Renard, aussi rapide que rusée. J'ai gagné la confiance du Conseil et ai failli tenir Piltover dans le creux de ma main. Si seulement tu avais pu me faire confiance, Mère. Je ne me serais pas retrouvée dans cette situation. Je n'aurais pas eu à. Non. Ce n'est pas si simple. Je sais à présent que tu tentais de me protéger, à ta façon. Je n'aurais jamais pu imaginer qu'une telle magie sommeillait en moi. Mais il y a tant de choses de mon passé auxquelles je n'ai jamais pensé avant ton décès. Honnêtement, c'est insoutenable, et c'est une raison de plus pour laquelle j'aurais aimé pouvoir combattre à tes côtés. Je n'ose imaginer ce que tu as pu ressentir, à être pourchassée par la Rose noire pendant toutes ces années. Mais je sais que si tu as ressenti de la peur, ce ne fut jamais pour toi-même. Ce fut pour Kino et pour moi. Et en fin de compte, je t'ai menée à ta perte. Peut-être savais-tu tout du long que j'étais celle qu'il fallait craindre. Je suis désolée, Mère, mais je ne regrette pas d'avoir protégé ma ville. Il faut faire des sacrifices pour devenir plus fort. N'est-ce pas là ce que tu répétais sans cesse ? Ton crédo, ton excuse face à n'importe quelle situation. T'es-tu jamais souciée de ce que ça m'a fait ? De ce que ça nous a fait ? Est-ce que ça en a valu la peine ? C'est désormais à moi de supporter le coût de tout cela. Tu m'as caché tant de choses. La vérité sur mon père. Sur le meurtrier de Kino. Et plus important encore, sur cette vendetta que la Rose noire avait contre toi, et dans laquelle je suis désormais impliquée. Je suppose que cela ne fait qu'effleurer la surface de tes mensonges, et de ceux de cette « Manipulatrice ». Je compte bien découvrir tout ce que tu m'as caché. Je regrette que ces mots ne te parviennent jamais, mais j'espère que tu m'observes depuis Volrachnun. Je vais jeter cette lettre par-dessus bord, afin qu'elle puisse être entraînée jusqu'aux profondeurs et ne faire plus qu'un avec les eaux des côtes de Rokrund, où tu as autrefois vaincu la mort. Je vais bientôt arriver en étrangère dans le pays où je suis née. Nos propres gardes ne me voient pas comme une véritable Medarda, bien qu'ils n'aient encore jamais osé exprimer à haute voix leur méfiance à mon égard. Une nation qui prône la force, mais qui prospère grâce aux effusions de sang n'est pas une nation que je peux fièrement appeler mienne. Et je ne resterai pas les bras croisés alors que ce chaos se poursuit. Tu m'as appris à survivre, Mère. J'ai appris par moi-même à vivre. Et bien que tu m'aies poussée à suivre la voie du Loup, je n'abandonnerai jamais celle du Renard. Ce n'est peut-être pas ainsi que tu l'avais imaginé... mais je rentre à la maison, Mère. Et je vais faire la différence. Jusqu'à ce que mon cœur cesse de battre. Ta fille, Mel""",
 }
 
-# --- PARAMETRES DE PERFORMANCE ---
-MAX_WORKERS = 16
+# Titres d'affichage des documents injectés manuellement.
+MANUAL_LORE_TITLES = {
+    "ambessa": "Ambessa Medarda",
+    "mel": "Mel Medarda",
+}
 
 # ==============================================================================
 # --- FONCTIONS ---
@@ -81,13 +97,17 @@ def generate_slug(name: str, subject_type: Literal["champion", "region"]) -> str
     return re.sub(r"\s+", "" if subject_type == "champion" else "-", slug)
 
 
-def get_champion_names() -> List[str]:
+async def get_champion_names(
+    fetcher: AsyncFetcher, url: str = CHAMPION_LIST_URL
+) -> List[str]:
     """Récupère la liste complète des noms de champions depuis le wiki Fandom."""
     print("1. Récupération de la liste des champions...")
     try:
-        response = requests.get(CHAMPION_LIST_URL, timeout=15)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, "html.parser")
+        # La liste est toujours redemandée : elle sert à découvrir les nouveaux champions
+        result = await fetcher.fetch(url, conditional=False)
+        if result.status_code != 200:
+            raise RuntimeError(f"HTTP {result.status_code}")
+        soup = BeautifulSoup(result.content, "html.parser")
 
         header = soup.find("span", id="List_of_Available_Champions")
         table = header.find_next("table", class_="article-table")
@@ -106,83 +126,198 @@ def get_champion_names() -> List[str]:
         return []
 
 
-def fetch_and_save_lore(
-    subject_info: Tuple[str, Literal["champion", "region"]],
-) -> Tuple[str, bool, str]:
-    """Worker exécuté en parallèle pour scraper et sauvegarder le lore d'un sujet."""
-    subject_name, subject_type = subject_info
-    slug = generate_slug(subject_name, subject_type)
-    url_part = "story/champion" if subject_type == "champion" else "region"
-    url = f"{UNIVERSE_BASE_URL}/{url_part}/{slug}/"
+def parse_description(content: bytes) -> str | None:
+    """Contenu de la balise <meta name="description"> (seules les balises meta sont analysées)."""
+    soup = BeautifulSoup(
+        content,
+        "html.parser",
+        parse_only=SoupStrainer("meta", attrs={"name": "description"}),
+    )
+    meta_tag = soup.find("meta")
+    return meta_tag["content"].strip() if meta_tag and meta_tag.get("content") else None
 
-    try:
-        headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
-        response = requests.get(url, headers=headers, timeout=10)
 
-        if response.status_code == 404:
-            return subject_name, False, f"404 (URL: {url})"
+@dataclasses.dataclass
+class LoreResult:
+    """Résultat du scraping d'un sujet ; `message` est le chemin du fichier en cas de succès."""
 
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, "html.parser")
-        meta_tag = soup.find("meta", attrs={"name": "description"})
+    subject: str
+    slug: str
+    status: Literal["scraped", "unchanged", "failed"]
+    message: str
 
-        if not (meta_tag and meta_tag.get("content")):
-            return subject_name, False, "Meta description vide/manquante"
 
-        file_path = os.path.join(KNOWLEDGE_BASE_DIR, f"{slug}.txt")
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(meta_tag["content"].strip())
-        return subject_name, True, file_path
+async def fetch_and_save_lore(
+    fetcher: AsyncFetcher,
+    subject_info: Tuple[str, Literal["champion", "region"]],
+    base_url: str = UNIVERSE_BASE_URL,
+) -> LoreResult:
+    """
+    Scrape et sauvegarde le lore d'un sujet. Une page déjà scrapée est demandée de manière
+    conditionnelle : si le serveur répond 304, le fichier existant est conservé tel quel.
+    """
+    subject_name, subject_type = subject_info
+    slug = generate_slug(subject_name, subject_type)
+    url_part = "story/champion" if subject_type == "champion" else "region"
+    url = f"{base_url}/{url_part}/{slug}/"
+    file_path = os.path.join(KNOWLEDGE_BASE_DIR, f"{slug}.txt")
 
-    except requests.exceptions.RequestException as e:
-        return subject_name, False, str(e)
+    try:
+        result = await fetcher.fetch(url, conditional=os.path.exists(file_path))
+    except (httpx.HTTPError, RetryableStatus) as e:
+        return LoreResult(subject_name, slug, "failed", str(e) or type(e).__name__)
+
+    if result.not_modified:
+        return LoreResult(subject_name, slug, "unchanged", file_path)
+    if result.status_code == 404:
+        return LoreResult(subject_name, slug, "failed", f"404 (URL: {url})")
+    if result.status_code != 200:
+        return LoreResult(
+            subject_name, slug, "failed", f"HTTP {result.status_code} (URL: {url})"
+        )
+
+    description = parse_description(result.content)
+    if not description:
+        # Sans fichier écrit, la page devra être redemandée en entier la prochaine fois
+        if fetcher.cache is not None:
+            fetcher.cache.forget(url)
+        return LoreResult(
+            subject_name, slug, "failed", "Meta description vide/manquante"
+        )
+
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(description)
+    return LoreResult(subject_name, slug, "scraped", file_path)
+
+
+async def scrape_lore(
+    fetcher: AsyncFetcher,
+    tasks: List[Tuple[str, Literal["champion", "region"]]],
+    base_url: str = UNIVERSE_BASE_URL,
+) -> AsyncIterator[LoreResult]:
+    """Scrape tous les sujets en parallèle et renvoie les résultats au fur et à mesure."""
+    for future in asyncio.as_completed(
+        [fetch_and_save_lore(fetcher, task, base_url) for task in tasks]
+    ):
+        yield await future
+
+
+def save_titles(titles: Dict[str, str]):
+    """
+    Enregistre la correspondance {slug: nom du sujet} utilisée comme titre d'affichage
+    lors de l'indexation. Les titres déjà connus sont conservés.
+    """
+    existing = {}
+    if os.path.exists(TITLES_FILENAME):
+        with open(TITLES_FILENAME, "r", encoding="utf-8") as f:
+            existing = json.load(f)
+    existing.update(titles)
+    with open(TITLES_FILENAME, "w", encoding="utf-8") as f:
+        json.dump(existing, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+
+def subject_tasks(
+    champions: List[str], regions: List[str]
+) -> List[Tuple[str, Literal["champion", "region"]]]:
+    return [
+        (name, cast(Literal["champion", "region"], "champion")) for name in champions
+    ] + [(name, cast(Literal["champion", "region"], "region")) for name in regions]
 
 
-def create_knowledge_base(champions_to_scrape: List[str], regions: List[str]):
-    """Orchestre la création de la base de connaissances."""
-    print("\n2. Création de la base de connaissances...")
-    os.makedirs(KNOWLEDGE_BASE_DIR, exist_ok=True)
-
-    print("   - Injection du lore manuel...")
+def write_manual_lore():
+    """Écrit le lore injecté manuellement et ses titres."""
     for slug, content in MANUAL_LORE_DATA.items():
         with open(
             os.path.join(KNOWLEDGE_BASE_DIR, f"{slug}.txt"), "w", encoding="utf-8"
         ) as f:
             f.write(content)
+    save_titles(MANUAL_LORE_TITLES)
+
+
+async def create_knowledge_base(
+    fetcher: AsyncFetcher,
+    champions_to_scrape: List[str],
+    regions: List[str],
+    base_url: str = UNIVERSE_BASE_URL,
+    on_result: Callable[[LoreResult], Awaitable[None]] | None = None,
+):
+    """
+    Orchestre la création de la base de connaissances.
+    `on_result` reçoit chaque document dès qu'il est écrit (lore manuel compris), par
+    exemple pour l'indexer pendant que le scraping continue (voir pipeline.py).
+    """
+    print("\n2. Création de la base de connaissances...")
+    os.makedirs(KNOWLEDGE_BASE_DIR, exist_ok=True)
+
+    print("   - Injection du lore manuel...")
+    write_manual_lore()
+    if on_result is not None:
+        for slug in MANUAL_LORE_DATA:
+            await on_result(
+                LoreResult(
+                    MANUAL_LORE_TITLES[slug],
+                    slug,
+                    "scraped",
+                    os.path.join(KNOWLEDGE_BASE_DIR, f"{slug}.txt"),
+                )
+            )
 
     print("   - Lancement du scraping parallèle pour le reste des sujets...")
-    tasks: list[tuple[str, Literal["champion", "region"]]] = [
-        (name, cast(Literal["champion", "region"], "champion"))
-        for name in champions_to_scrape
-    ] + [(name, cast(Literal["champion", "region"], "region")) for name in regions]
+    tasks = subject_tasks(champions_to_scrape, regions)
 
     if not tasks:
         print("   -> Aucun sujet à scraper.")
         return
 
-    success_count, fail_count = 0, 0
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        future_to_subject = {
-            executor.submit(fetch_and_save_lore, task): task for task in tasks
-        }
-
-        for future in tqdm(
-            concurrent.futures.as_completed(future_to_subject),
-            total=len(tasks),
-            desc="   Progression",
-        ):
-            subject_name, success, message = future.result()
-            if success:
-                success_count += 1
+    counts = {"scraped": 0, "unchanged": 0, "failed": 0}
+    titles = {}
+    with tqdm(total=len(tasks), desc="   Progression") as progress:
+        async for result in scrape_lore(fetcher, tasks, base_url):
+            progress.update()
+            counts[result.status] += 1
+            if result.status == "failed":
+                tqdm.write(f"     [ECHEC] {result.subject}: {result.message}")
             else:
-                fail_count += 1
-                tqdm.write(f"     [ECHEC] {subject_name}: {message}")
+                titles[result.slug] = result.subject
+            if on_result is not None:
+                await on_result(result)
+    save_titles(titles)
 
     print(
-        f"\n   -> Opération terminée. {success_count} fichiers scrapés, {fail_count} échecs."
+        f"\n   -> Opération terminée. {counts['scraped']} fichiers scrapés, "
+        f"{counts['unchanged']} inchangés (HTTP 304), {counts['failed']} échecs."
     )
 
 
+async def scrape_knowledge_base(
+    champion_list_url: str = CHAMPION_LIST_URL,
+    base_url: str = UNIVERSE_BASE_URL,
+    host_concurrency: int = HOST_CONCURRENCY,
+    host_rate_limit: float = HOST_RATE_LIMIT,
+    on_result: Callable[[LoreResult], Awaitable[None]] | None = None,
+) -> bool:
+    """Récupère la liste des champions puis scrape leur lore et celui des régions."""
+    async with AsyncFetcher(
+        ValidatorCache(HTTP_CACHE_FILENAME),
+        host_concurrency=host_concurrency,
+        host_rate_limit=host_rate_limit,
+    ) as fetcher:
+        all_champions = await get_champion_names(fetcher, champion_list_url)
+        if not all_champions:
+            print("Arrêt : la liste de champions est vide.")
+            return False
+
+        # Exclure les champions gérés manuellement de la liste de scraping
+        champions_to_exclude = ["Ambessa Medarda", "Mel Medarda"]
+        champions_to_scrape = [
+            c for c in all_champions if c not in champions_to_exclude
+        ]
+        await create_knowledge_base(
+            fetcher, champions_to_scrape, REGIONS, base_url, on_result
+        )
+    return True
+
+
 def create_evaluation_file():
     """Génère le fichier CSV d'évaluation."""
     print("\n3. Création du fichier d'évaluation...")
@@ -275,16 +410,8 @@ def main():
     print("--- Générateur de Dataset RAG pour League of Legends (DÉFINITIF) ---")
     print("=" * 60)
 
-    all_champions = get_champion_names()
-    if not all_champions:
-        print("Arrêt : la liste de champions est vide.")
+    if not asyncio.run(scrape_knowledge_base()):
         return
-
-    # Exclure les champions gérés manuellement de la liste de scraping
-    champions_to_exclude = ["Ambessa Medarda", "Mel Medarda"]
-    champions_to_scrape = [c for c in all_champions if c not in champions_to_exclude]
-
-    create_knowledge_base(champions_to_scrape, REGIONS)
     create_evaluation_file()
 
     end_time = time.time()
@@ -0,0 +1,167 @@
+"""
+Stockage compact des textes des passages : un seul blob UTF-8 contigu ("documents.utf8") et
+une table d'offsets uint64 ("documents.offsets", n + 1 entrées : le texte `i` occupe les
+octets offsets[i]:offsets[i + 1]). Les deux fichiers sont mappés en mémoire en lecture seule.
+
+Aucun texte n'est décodé à l'ouverture : `store[i]` décode un seul passage, et `store.ref(i)`
+renvoie une référence légère (`ContentRef`) qui ne le décode qu'au moment où on en a besoin.
+Le magasin NumPy (vector_store.py) et les snapshots (snapshots.py) y rangent les contenus ;
+une recherche ne touche ainsi que les textes des passages finalement affichés.
+
+Les octets déjà écrits ne sont jamais modifiés : `write` crée de nouveaux fichiers et
+`append` ajoute des textes à la suite du blob et de la table d'offsets. Un lecteur qui a
+ouvert les `count` premiers textes (`DocStore.open(..., count)`) les garde donc intacts
+pendant qu'un écrivain en ajoute d'autres.
+"""
+
+from typing import Iterable, Iterator, List, Sequence
+import os
+
+import numpy as np
+
+# --- CONFIGURATION ---
+BLOB_FILENAME = "documents.utf8"
+OFFSETS_FILENAME = "documents.offsets"
+
+
+class ContentRef:
+    """Texte d'un passage, décodé à la demande (`str(ref)`)."""
+
+    __slots__ = ("store", "position")
+
+    def __init__(self, store: "DocStore", position: int):
+        self.store = store
+        self.position = position
+
+    def __str__(self) -> str:
+        return self.store[self.position]
+
+    def __len__(self) -> int:
+        """Taille du texte en octets, sans le décoder."""
+        return self.store.size(self.position)
+
+    def __repr__(self) -> str:
+        return f"ContentRef({self.position}, {len(self)} octets)"
+
+
+class DocStore(Sequence[str]):
+    """Textes des passages, dans l'ordre des positions du magasin de vecteurs."""
+
+    __slots__ = ("blob", "offsets")
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob  # uint8, éventuellement mappé en mémoire
+        self.offsets = offsets  # uint64, n + 1 entrées
+
+    @classmethod
+    def open(
+        cls, directory: str, mmap: bool = True, count: int | None = None
+    ) -> "DocStore":
+        """
+        Ouvre les fichiers de `directory` (un magasin vide s'ils n'existent pas), limités aux
+        `count` premiers textes si `count` est donné (ceux qu'un écrivain a validés).
+        """
+        blob_path = os.path.join(directory, BLOB_FILENAME)
+        offsets_path = os.path.join(directory, OFFSETS_FILENAME)
+        if not os.path.exists(offsets_path) or count == 0:
+            return cls.from_texts([])
+        offsets = np.fromfile(
+            offsets_path, dtype=np.uint64, count=-1 if count is None else count + 1
+        )
+        if not offsets[-1]:
+            blob = np.zeros(0, dtype=np.uint8)
+        elif mmap:
+            blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+        else:
+            blob = np.fromfile(blob_path, dtype=np.uint8, count=int(offsets[-1]))
+        return cls(blob, offsets)
+
+    @classmethod
+    def from_texts(cls, texts: Iterable[str]) -> "DocStore":
+        """Magasin en mémoire (ancien format de records.json, tests de débit)."""
+        return cls.from_pieces(text.encode("utf-8") for text in texts)
+
+    @classmethod
+    def from_pieces(cls, pieces: Iterable[bytes]) -> "DocStore":
+        pieces = list(pieces)
+        offsets = np.zeros(len(pieces) + 1, dtype=np.uint64)
+        offsets[1:] = np.cumsum([len(p) for p in pieces])
+        return cls(np.frombuffer(b"".join(pieces), dtype=np.uint8), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def _span(self, position: int) -> memoryview:
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        return self.blob.data[start:end]  # Vue sur le blob, sans copie
+
+    def raw(self, position: int) -> bytes:
+        """Octets UTF-8 d'un texte, sans le décoder."""
+        return self._span(position).tobytes()
+
+    def __getitem__(self, position: int) -> str:  # type: ignore[override]
+        # Décodé directement depuis le blob mappé : une seule allocation, la chaîne finale
+        return str(self._span(position), "utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[i] for i in range(len(self)))
+
+    def size(self, position: int) -> int:
+        return int(self.offsets[position + 1] - self.offsets[position])
+
+    def ref(self, position: int) -> ContentRef:
+        return ContentRef(self, position)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.offsets[-1])
+
+
+def write(directory: str, pieces: Iterable[bytes | str]) -> None:
+    """
+    Écrit les textes (str, ou octets UTF-8 déjà encodés recopiés d'un autre DocStore) dans de
+    nouveaux fichiers, mis en place par renommage : le blob d'abord, la table d'offsets ensuite.
+    """
+    os.makedirs(directory, exist_ok=True)
+    blob_path = os.path.join(directory, BLOB_FILENAME)
+    offsets_path = os.path.join(directory, OFFSETS_FILENAME)
+    sizes: List[int] = []
+    with open(blob_path + ".tmp", "wb") as f:
+        for piece in pieces:
+            data = piece.encode("utf-8") if isinstance(piece, str) else piece
+            f.write(data)
+            sizes.append(len(data))
+    offsets = np.zeros(len(sizes) + 1, dtype=np.uint64)
+    offsets[1:] = np.cumsum(sizes)
+    offsets.tofile(offsets_path + ".tmp")
+    os.replace(blob_path + ".tmp", blob_path)
+    os.replace(offsets_path + ".tmp", offsets_path)
+
+
+def append(directory: str, pieces: Iterable[bytes | str], count: int):
+    """
+    Ajoute des textes à la suite des `count` premiers, sans réécrire ceux-ci : le blob est
+    complété, puis la table d'offsets. Les octets au-delà des `count` premiers textes
+    (laissés par une écriture interrompue) sont écrasés.
+    """
+    blob_path = os.path.join(directory, BLOB_FILENAME)
+    offsets_path = os.path.join(directory, OFFSETS_FILENAME)
+    if not os.path.exists(offsets_path):
+        write(directory, pieces)
+        return
+    base = int(np.fromfile(offsets_path, dtype=np.uint64, count=count + 1)[-1])
+    sizes: List[int] = []
+    with open(blob_path, "r+b") as f:
+        f.truncate(base)
+        f.seek(base)
+        for piece in pieces:
+            data = piece.encode("utf-8") if isinstance(piece, str) else piece
+            f.write(data)
+            sizes.append(len(data))
+    offsets = np.uint64(base) + np.cumsum(sizes, dtype=np.uint64)
+    with open(offsets_path, "r+b") as f:
+        f.truncate((count + 1) * offsets.itemsize)
+        f.seek(0, os.SEEK_END)
+        f.write(offsets.tobytes())
@@ -0,0 +1,370 @@
+"""
+Cache persistant des embeddings, adressé par contenu.
+
+Chaque vecteur est identifié par le hash du triplet (modèle, type d'appel, texte).
+Les vecteurs sont rangés dans une matrice float32 mappée en mémoire ("vectors.f32") et la
+table "keys.bin" donne, pour chaque ligne, le hash (32 octets) de la clé qui l'occupe (des
+zéros pour une ligne libre) : c'est elle qui fait foi. Lorsque la taille maximale est
+atteinte, l'entrée la moins récemment utilisée est évincée et sa ligne est réutilisée.
+
+Le cache est partagé par plusieurs processus (create_database.py, Streamlit, les workers de
+l'API) : les lectures prennent un verrou de fichier partagé, les écritures un verrou
+exclusif ("cache.lock", fcntl). Chaque écriture incrémente un compteur rangé dans ce
+fichier ; un processus qui voit le compteur changer relit la table des clés avant de
+répondre, et ne lit donc jamais une ligne réattribuée à une autre clé.
+L'ordre LRU ("index.json") n'est qu'une indication pour l'éviction : il est réécrit toutes
+les FLUSH_EVERY nouvelles entrées, toutes les FLUSH_INTERVAL secondes au plus, et à la sortie.
+"""
+
+from typing import Callable, Iterator, List, Literal
+from collections import OrderedDict
+import atexit
+import contextlib
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou entre threads seulement
+    fcntl = None
+
+# --- CONFIGURATION ---
+DEFAULT_CACHE_DIR = os.path.join(os.getcwd(), "database", "embedding_cache")
+DEFAULT_MAX_ENTRIES = 50_000
+INITIAL_CAPACITY = 1_024
+FLUSH_EVERY = 1_000  # Nouvelles entrées avant de réécrire l'ordre LRU
+FLUSH_INTERVAL = 30.0  # Secondes
+
+VECTORS_FILENAME = "vectors.f32"
+KEYS_FILENAME = "keys.bin"
+INDEX_FILENAME = "index.json"
+LOCK_FILENAME = "cache.lock"
+KEY_BYTES = 32  # sha256
+
+
+def cache_key(model_name: str, kind: Literal["query", "document"], text: str) -> str:
+    """Calcule la clé de cache d'un texte pour un modèle et un type d'appel donnés."""
+    h = hashlib.sha256()
+    h.update(model_name.encode("utf-8"))
+    h.update(b"\0")
+    h.update(kind.encode("utf-8"))
+    h.update(b"\0")
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Stockage disque des vecteurs d'un modèle, avec éviction LRU.
+    Toutes les méthodes publiques sont protégées par un verrou entre threads et, entre
+    processus, par un verrou sur "cache.lock" (voir le docstring du module).
+    """
+
+    def __init__(self, directory: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        if max_entries < 1:
+            raise ValueError(
+                f"max_entries doit valoir au moins 1 (reçu : {max_entries})"
+            )
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, int] = OrderedDict()  # clé -> ligne, ordre LRU
+        self._free_rows: List[int] = []
+        self._matrix: np.memmap | None = None
+        self._row_keys: np.memmap | None = None  # (capacité, KEY_BYTES) uint8
+        self._dim = 0
+        self._capacity = 0
+        self._generation = -1  # Compteur d'écritures vu lors de la dernière relecture
+        self._pending = (
+            0  # Nouvelles entrées depuis la dernière écriture de l'ordre LRU
+        )
+        self._flushed_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._lock_fd = os.open(
+            os.path.join(directory, LOCK_FILENAME), os.O_RDWR | os.O_CREAT, 0o644
+        )
+        self._load()
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # --- Verrou et compteur partagés ---
+
+    @contextlib.contextmanager
+    def _file_lock(self, exclusive: bool) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _read_generation(self) -> int:
+        os.lseek(self._lock_fd, 0, os.SEEK_SET)
+        data = os.read(self._lock_fd, 8)
+        return int.from_bytes(data, "little") if len(data) == 8 else 0
+
+    def _bump_generation(self):
+        """Signale une écriture aux autres processus (sous verrou exclusif)."""
+        generation = self._read_generation() + 1
+        os.lseek(self._lock_fd, 0, os.SEEK_SET)
+        os.write(self._lock_fd, generation.to_bytes(8, "little"))
+        self._generation = generation
+
+    # --- Persistance ---
+
+    def _load(self):
+        """Ouvre le cache (en convertissant l'ancien format) et reprend l'ordre LRU enregistré."""
+        order: List[str] = []
+        try:
+            with open(self._path(INDEX_FILENAME), "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            index = None
+        except (OSError, ValueError) as e:
+            print(f"[AVERTISSEMENT] Ordre LRU du cache d'embeddings ignoré ({e}).")
+            index = None
+        with self._lock, self._file_lock(exclusive=True):
+            if index is not None:
+                if not os.path.exists(self._path(KEYS_FILENAME)):
+                    self._convert(index)
+                # Ancien format : [clé, ligne] ; nouveau : clé seule
+                order = [e[0] if isinstance(e, list) else e for e in index["entries"]]
+            self._entries = OrderedDict.fromkeys(order, -1)
+            self._sync()
+            # Une taille maximale réduite entre deux exécutions évince les plus anciennes entrées
+            if len(self._entries) > self.max_entries:
+                while len(self._entries) > self.max_entries:
+                    _, row = self._entries.popitem(last=False)
+                    self._row_keys[row] = 0  # type: ignore[index]
+                    self._free_rows.append(row)
+                self._bump_generation()
+
+    def _convert(self, index: dict):
+        """Construit la table des clés d'un cache écrit avant elle (index.json : clé -> ligne)."""
+        try:
+            dim, capacity = int(index["dim"]), int(index["capacity"])
+            if os.path.getsize(self._path(VECTORS_FILENAME)) < dim * capacity * 4:
+                raise ValueError("matrice tronquée")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[AVERTISSEMENT] Cache d'embeddings ignoré ({e}).")
+            index["entries"] = []
+            return
+        row_keys = np.zeros((capacity, KEY_BYTES), dtype=np.uint8)
+        for key, row in index["entries"]:
+            if row < capacity:
+                row_keys[row] = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+        row_keys.tofile(self._path(KEYS_FILENAME))
+
+    def _map(self, capacity: int):
+        """(Re)mappe la matrice et la table des clés, agrandies par ce processus ou un autre."""
+        self._matrix = self._row_keys = None
+        self._capacity = capacity
+        if not capacity:
+            return
+        self._dim = os.path.getsize(self._path(VECTORS_FILENAME)) // (capacity * 4)
+        self._matrix = np.memmap(
+            self._path(VECTORS_FILENAME),
+            dtype=np.float32,
+            mode="r+",
+            shape=(capacity, self._dim),
+        )
+        self._row_keys = np.memmap(
+            self._path(KEYS_FILENAME),
+            dtype=np.uint8,
+            mode="r+",
+            shape=(capacity, KEY_BYTES),
+        )
+
+    def _sync(self):
+        """Relit la table des clés si un processus a écrit depuis (sous verrou de fichier)."""
+        generation = self._read_generation()
+        if generation == self._generation:
+            return
+        self._generation = generation
+        keys_path = self._path(KEYS_FILENAME)
+        capacity = (
+            os.path.getsize(keys_path) // KEY_BYTES if os.path.exists(keys_path) else 0
+        )
+        if capacity != self._capacity or self._matrix is None:
+            self._map(capacity)
+        on_disk = {}
+        if capacity:
+            used = np.flatnonzero(self._row_keys.any(axis=1))  # type: ignore[union-attr]
+            for row in used.tolist():
+                on_disk[self._row_keys[row].tobytes().hex()] = row  # type: ignore[index]
+        # L'ordre LRU connu est conservé ; les clés ajoutées ailleurs passent en tête (les
+        # plus anciennes), celles évincées ailleurs disparaissent
+        known = [(key, on_disk.pop(key)) for key in self._entries if key in on_disk]
+        self._entries = OrderedDict(list(on_disk.items()) + known)
+        used_rows = set(self._entries.values())
+        self._free_rows = [
+            row for row in range(capacity - 1, -1, -1) if row not in used_rows
+        ]
+
+    def flush(self):
+        """Écrit les pages modifiées puis l'ordre LRU (remplacé de manière atomique)."""
+        with self._lock:
+            # Un processus qui n'a fait que lire n'écrit rien
+            if not self._pending or self._matrix is None:
+                return
+            self._pending = 0
+            self._flushed_at = time.monotonic()
+            self._matrix.flush()
+            self._row_keys.flush()  # type: ignore[union-attr]
+            tmp_path = f"{self._path(INDEX_FILENAME)}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "dim": self._dim,
+                        "capacity": self._capacity,
+                        "entries": list(self._entries),
+                    },
+                    f,
+                )
+            os.replace(tmp_path, self._path(INDEX_FILENAME))
+
+    def _ensure_capacity(self, dim: int, needed: int):
+        """Crée ou agrandit la matrice et la table des clés pour contenir `needed` lignes."""
+        if self._matrix is not None and dim != self._dim:
+            raise ValueError(
+                f"Dimension incohérente pour le cache : {dim} au lieu de {self._dim}."
+            )
+        if needed <= self._capacity:
+            return
+
+        capacity = max(self._capacity, INITIAL_CAPACITY)
+        while capacity < needed:
+            capacity *= 2
+        capacity = max(min(capacity, self.max_entries), self._capacity)
+        if capacity == self._capacity:
+            return
+
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._row_keys.flush()  # type: ignore[union-attr]
+        # Les lignes ajoutées sont des zéros : libres dans la table des clés
+        with open(self._path(VECTORS_FILENAME), "ab") as f:
+            f.truncate(capacity * dim * 4)
+        with open(self._path(KEYS_FILENAME), "ab") as f:
+            f.truncate(capacity * KEY_BYTES)
+        self._free_rows = (
+            list(range(capacity - 1, self._capacity - 1, -1)) + self._free_rows
+        )
+        self._map(capacity)
+
+    # --- Lecture / écriture ---
+
+    def get_many(self, keys: List[str]) -> List[List[float] | None]:
+        """Retourne les vecteurs connus (None pour les clés absentes) et rafraîchit leur ordre LRU."""
+        results: List[List[float] | None] = []
+        with self._lock, self._file_lock(exclusive=False):
+            self._sync()
+            for key in keys:
+                row = self._entries.get(key)
+                if row is None or self._matrix is None:
+                    self.misses += 1
+                    results.append(None)
+                    continue
+                # Ordre LRU en mémoire seulement : une lecture n'écrit rien sur le disque
+                self._entries.move_to_end(key)
+                self.hits += 1
+                results.append(self._matrix[row].tolist())
+        return results
+
+    def put_many(self, keys: List[str], vectors: List[List[float]]):
+        """Ajoute des vecteurs au cache, en évinçant les entrées les plus anciennes si nécessaire."""
+        if not keys:
+            return
+        with self._lock, self._file_lock(exclusive=True):
+            self._sync()
+            dim = len(vectors[0])
+            self._ensure_capacity(
+                dim, min(len(self._entries) + len(keys), self.max_entries)
+            )
+            assert self._matrix is not None and self._row_keys is not None
+            for key, vector in zip(keys, vectors):
+                row = self._entries.get(key)
+                if row is None:
+                    if len(self._entries) >= self.max_entries or not self._free_rows:
+                        _, row = self._entries.popitem(last=False)
+                    else:
+                        row = self._free_rows.pop()
+                self._matrix[row] = np.asarray(vector, dtype=np.float32)
+                self._row_keys[row] = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+                self._entries[key] = row
+                self._entries.move_to_end(key)
+            self._bump_generation()
+            self._pending += len(keys)
+            due = (
+                self._pending >= FLUSH_EVERY
+                or time.monotonic() - self._flushed_at >= FLUSH_INTERVAL
+            )
+        if due:
+            self.flush()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Enveloppe un modèle d'embedding LangChain : les textes déjà vectorisés sont lus
+    dans le cache disque, seuls les textes inconnus sont envoyés au modèle.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.cache = EmbeddingCache(os.path.join(cache_dir, safe_name), max_entries)
+        atexit.register(self.cache.flush)
+
+    def _embed_with_cache(
+        self,
+        texts: List[str],
+        kind: Literal["query", "document"],
+        embed: Callable[[List[str]], List[List[float]]],
+    ) -> List[List[float]]:
+        keys = [cache_key(self.model_name, kind, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        # Les textes manquants (dédupliqués) partent en un seul appel au modèle
+        missing: dict[str, str] = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        if missing:
+            computed = embed(list(missing.values()))
+            self.cache.put_many(list(missing.keys()), computed)
+            by_key = dict(zip(missing.keys(), computed))
+            vectors = [v if v is not None else by_key[k] for k, v in zip(keys, vectors)]
+
+        return vectors  # type: ignore[return-value]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed_with_cache(
+            texts, "document", self.embeddings.embed_documents
+        )
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_with_cache(
+            [text], "query", lambda texts: [self.embeddings.embed_query(texts[0])]
+        )[0]
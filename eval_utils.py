@@ -0,0 +1,61 @@
+"""
+Résultats des benchmarks et des évaluations : résumé des latences et enregistrement en JSON.
+
+Partagé par benchmark.py et retrieval_evaluation.py ; volontairement sans dépendance (ni
+Chroma, ni modèle), pour qu'une évaluation n'importe pas tout le code des benchmarks.
+"""
+
+from typing import Dict, List
+import datetime
+import json
+import os
+import statistics
+import subprocess
+
+# --- CONFIGURATION ---
+RESULTS_DIR = os.path.join(os.getcwd(), "benchmark_results")
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    """Résumé d'une série de durées (secondes) en millisecondes."""
+    ordered = sorted(samples)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+
+    return {
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(scenario: str, results: dict, output_dir: str = RESULTS_DIR) -> str:
+    """Enregistre les résultats d'un scénario en JSON et retourne le chemin du fichier."""
+    commit = git_commit()
+    now = datetime.datetime.now()
+    results = {
+        "scenario": scenario,
+        "commit": commit,
+        "date": now.isoformat(timespec="seconds"),
+        **results,
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{scenario}-{now:%Y%m%d-%H%M%S}-{commit}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    return path
@@ -1,9 +1,24 @@
 """
 Script d'évaluation du RAG en utilisant les métriques de Faithfulness et Correctness.
 Ce script se base sur le fichier 'synthetic_evaluation.csv' généré par 'generate_testset.py'.
+
+Les réponses sont générées en parallèle (nombre de requêtes simultanées borné, relances
+en cas de quota dépassé). Chaque réponse et chaque score sont enregistrés dans
+`evaluation_cache/` dès qu'ils sont calculés, sous une clé qui dépend de la question, de la
+configuration de recherche, du prompt, du modèle et de la version de la base
+(rag_core.collection_version) : une nouvelle exécution, ou la reprise d'une exécution
+interrompue, ne recalcule que ce qui a changé, et une base reconstruite invalide les
+réponses et les contextes obtenus sur l'ancienne. Les scores sont ajoutés à
+'evaluation_results.csv' au fil des lots.
 """
 
+from typing import Dict, List
+import argparse
+import concurrent.futures
+import hashlib
+import json
 import os
+import threading
 import pandas as pd
 from datasets import Dataset
 from ragas import evaluate, RunConfig
@@ -12,59 +27,285 @@ from ragas.metrics import Faithfulness, AnswerCorrectness
 from langchain_core.messages import SystemMessage, HumanMessage
 from tqdm import tqdm
 
-from rag_core import get_llm, get_embedding_model, query
+from context_packing import pack_context, CONTEXT_TOKEN_BUDGET
+from rag_core import Document, collection_version, query, query_many
+from registry import registry
+from retry import call_with_retry
+
+# --- CONFIGURATION ---
+EVALUATION_FILE_PATH = os.path.join(
+    "dataset_rag_lol_definitive", "synthetic_evaluation.csv"
+)
+RESULTS_PATH = "evaluation_results.csv"
+CACHE_DIR = os.path.join(os.getcwd(), "evaluation_cache")
+ANSWERS_CACHE_PATH = os.path.join(CACHE_DIR, "answers.jsonl")
+SCORES_CACHE_PATH = os.path.join(CACHE_DIR, "scores.jsonl")
+
+EVALUATION_WORKERS = 8  # Requêtes simultanées au LLM
+RETRIEVAL_BATCH_SIZE = 64  # Questions cherchées par appel à rag_core.query_many
+SCORING_BATCH_SIZE = 8  # Questions évaluées par Ragas avant écriture des scores
+RETRIES = 5
+
+# Paramètres de rag_core.query utilisés pour l'évaluation
+RETRIEVAL_CONFIG = {"n_results": 5}
+
+GENERATION_PROMPT = (
+    "Tu es un expert du lore de Runeterra. Réponds directement à la question de l'utilisateur."
+    "Ta réponse doit être une **synthèse concise** des informations les plus pertinentes trouvées dans les documents fournis. "
+    "Ne mentionne pas les documents sources. Va droit au but tout en étant précis."
+    "Ta réponse doit être entièrement basée sur les faits présents dans les documents suivants.\n\n"
+    "Documents:\n"
+)
+
+METRIC_COLUMNS = ["faithfulness", "answer_correctness"]
+
+
+# --- Cache des résultats (JSONL, une ligne par résultat) ---
+
+
+def model_name(llm) -> str:
+    return (
+        getattr(llm, "model", None)
+        or getattr(llm, "model_name", None)
+        or type(llm).__name__
+    )
+
+
+def answer_key(question: str, llm, version: float) -> str:
+    """
+    Clé d'une réponse : question, configuration de recherche et de contexte, prompt, modèle
+    et version de la base.
+    """
+    payload = json.dumps(
+        {
+            "question": question,
+            "collection_version": version,
+            "retrieval": RETRIEVAL_CONFIG,
+            "context_budget": CONTEXT_TOKEN_BUDGET,
+            "prompt": GENERATION_PROMPT,
+            "model": model_name(llm),
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_cache(path: str) -> Dict[str, dict]:
+    """Charge les résultats déjà calculés (une ligne tronquée par une interruption est ignorée)."""
+    cache: Dict[str, dict] = {}
+    if not os.path.exists(path):
+        return cache
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            cache[record["key"]] = record
+    return cache
+
+
+class CacheWriter:
+    """Ajoute les résultats au cache au fur et à mesure, depuis plusieurs threads."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+
+    def append(self, record: dict):
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+
+
+# --- Étape 1 : génération des réponses ---
+
+
+def generate_rag_answer(
+    question: str, llm, documents: List[Document] | None = None
+) -> dict:
+    """
+    Recherche les documents puis génère la réponse à une question.
+    `documents` : résultats déjà récupérés (voir generate_rag_answers).
+    """
+    # 1. Retrieval
+    retrieved_contexts_docs = (
+        query(question, **RETRIEVAL_CONFIG) if documents is None else documents
+    )
+    # Même budget de tokens que le chat
+    retrieved_contexts_str = [
+        doc.content for doc in pack_context(retrieved_contexts_docs).documents
+    ]
+
+    # 2. Augmentation & Generation
+    generation_prompt = [
+        SystemMessage(
+            content=GENERATION_PROMPT + "\n\n---\n\n".join(retrieved_contexts_str)
+        ),
+        HumanMessage(content=question),
+    ]
+    generated_response = call_with_retry(
+        lambda: llm.invoke(generation_prompt).content,
+        retries=RETRIES,
+        description="la génération d'une réponse",
+    )
+    return {"answer": generated_response, "contexts": retrieved_contexts_str}
 
 
-def generate_rag_answers(eval_df: pd.DataFrame, llm) -> list:
+def generate_rag_answers(
+    eval_df: pd.DataFrame, llm, workers: int = EVALUATION_WORKERS
+) -> list:
     """
-    Génère les réponses et récupère les contextes pour tout le dataframe.
+    Génère les réponses et récupère les contextes pour tout le dataframe, en parallèle.
+    Les réponses déjà présentes dans le cache ne sont pas régénérées.
     """
-    results_list = []
     print("\n--- Étape 1: Génération des réponses pour le jeu de données ---")
-    for index, row in tqdm(
-        eval_df.iterrows(), total=eval_df.shape[0], desc="Génération des réponses"
-    ):
-        question = row["question"]
-        ground_truth = row["ground_truth"]
-
-        # 1. Retrieval
-        retrieved_contexts_docs = query(question, n_results=5)
-        retrieved_contexts_str = [doc.content for doc in retrieved_contexts_docs]
-
-        # 2. Augmentation & Generation
-        generation_prompt = [
-            SystemMessage(
-                content=(
-                    "Tu es un expert du lore de Runeterra. Réponds directement à la question de l'utilisateur."
-                    "Ta réponse doit être une **synthèse concise** des informations les plus pertinentes trouvées dans les documents fournis. "
-                    "Ne mentionne pas les documents sources. Va droit au but tout en étant précis."
-                    "Ta réponse doit être entièrement basée sur les faits présents dans les documents suivants.\n\n"
-                    "Documents:\n" + "\n\n---\n\n".join(retrieved_contexts_str)
-                )
-            ),
-            HumanMessage(content=question),
+    cache = load_cache(ANSWERS_CACHE_PATH)
+    writer = CacheWriter(ANSWERS_CACHE_PATH)
+    version = collection_version()
+    rows = [
+        {
+            "key": answer_key(row["question"], llm, version),
+            "question": row["question"],
+            "ground_truth": row["ground_truth"],
+        }
+        for _, row in eval_df.iterrows()
+    ]
+    missing = [row for row in rows if row["key"] not in cache]
+    print(
+        f"{len(rows) - len(missing)} réponses en cache, {len(missing)} à générer "
+        f"({workers} en parallèle)."
+    )
+
+    # Recherche groupée : un appel d'embedding et une recherche par lot de questions
+    retrieved: List[List[Document] | None] = []
+    for start in range(0, len(missing), RETRIEVAL_BATCH_SIZE):
+        batch = missing[start : start + RETRIEVAL_BATCH_SIZE]
+        try:
+            retrieved.extend(
+                query_many([row["question"] for row in batch], **RETRIEVAL_CONFIG)
+            )
+        except Exception as e:
+            # Chaque question du lot sera cherchée seule, avec ses propres erreurs
+            print(f"[ATTENTION] Recherche groupée en échec : {e}")
+            retrieved.extend([None] * len(batch))
+
+    def generate(row: dict, documents: List[Document] | None) -> dict:
+        record = {**row, **generate_rag_answer(row["question"], llm, documents)}
+        writer.append(record)
+        return record
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(generate, row, documents)
+            for row, documents in zip(missing, retrieved)
         ]
-        generated_response = llm.invoke(generation_prompt).content
-
-        results_list.append(
-            {
-                "question": question,
-                "answer": generated_response,
-                "contexts": retrieved_contexts_str,
-                "ground_truth": ground_truth,
-            }
+        for future in tqdm(
+            concurrent.futures.as_completed(futures),
+            total=len(futures),
+            desc="Génération des réponses",
+        ):
+            try:
+                record = future.result()
+                cache[record["key"]] = record
+            except Exception as e:
+                print(f"[ERREUR] Réponse non générée : {e}")
+
+    return [cache[row["key"]] for row in rows if row["key"] in cache]
+
+
+# --- Étape 2 : évaluation Ragas ---
+
+
+def write_results(records: List[dict], header: bool):
+    """
+    Ajoute des lignes de résultats au fichier CSV (`header` : le recrée avec l'en-tête).
+    Les colonnes sont celles du résultat de Ragas (user_input, retrieved_contexts, response,
+    reference), comme dans les fichiers produits avant l'écriture par lots.
+    """
+    pd.DataFrame(
+        [
+            [
+                r["question"],
+                r["contexts"],
+                r["answer"],
+                r["ground_truth"],
+                *(r.get(column) for column in METRIC_COLUMNS),
+            ]
+            for r in records
+        ],
+        columns=[
+            "user_input",
+            "retrieved_contexts",
+            "response",
+            "reference",
+            *METRIC_COLUMNS,
+        ],
+    ).to_csv(RESULTS_PATH, mode="w" if header else "a", header=header, index=False)
+
+
+def score_answers(
+    evaluation_data: List[dict], metrics: list, embedding_model, workers: int
+) -> List[dict]:
+    """
+    Évalue les réponses par lots avec Ragas. Les scores en cache sont réutilisés, et les
+    scores de chaque lot sont enregistrés et écrits dans le CSV dès qu'il est terminé.
+    """
+    print("\n--- Étape 2: Évaluation par lots avec Ragas ---")
+    cache = load_cache(SCORES_CACHE_PATH)
+    writer = CacheWriter(SCORES_CACHE_PATH)
+    scored = [{**r, **cache[r["key"]]} for r in evaluation_data if r["key"] in cache]
+    missing = [r for r in evaluation_data if r["key"] not in cache]
+    print(f"{len(scored)} réponses déjà évaluées, {len(missing)} à évaluer.")
+    write_results(scored, header=True)
+
+    for start in tqdm(
+        range(0, len(missing), SCORING_BATCH_SIZE), desc="Évaluation des réponses"
+    ):
+        batch = missing[start : start + SCORING_BATCH_SIZE]
+        # Ragas s'attend à trouver les clés 'question', 'answer', 'contexts', 'ground_truth'
+        dataset = Dataset.from_list(
+            [
+                {k: r[k] for k in ("question", "answer", "contexts", "ground_truth")}
+                for r in batch
+            ]
+        )
+        result = evaluate(
+            dataset=dataset,
+            metrics=metrics,
+            embeddings=embedding_model,
+            run_config=RunConfig(max_workers=workers, max_retries=RETRIES),
+            show_progress=False,
         )
-    return results_list
+        scores = result.to_pandas()[METRIC_COLUMNS].to_dict("records")
+        batch_scored = []
+        for record, record_scores in zip(batch, scores):
+            writer.append({"key": record["key"], **record_scores})
+            batch_scored.append({**record, **record_scores})
+        write_results(batch_scored, header=False)
+        scored += batch_scored
+    return scored
 
 
 def main():
     """
     Script principal pour lancer l'évaluation par lot.
     """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=EVALUATION_WORKERS,
+        help="Nombre de requêtes simultanées au LLM.",
+    )
+    args = parser.parse_args()
+
     # --- Initialisation des modèles dans la fonction main ---
     print("Initialisation des modèles et de l'évaluateur...")
-    llm = get_llm()
-    embedding_model = get_embedding_model()
+    llm = registry.get("llm")
+    embedding_model = registry.get("embedding_model")
 
     ragas_llm = LangchainLLMWrapper(llm)
 
@@ -74,53 +315,34 @@ def main():
     correctness_evaluator = AnswerCorrectness(llm=ragas_llm, weights=[1, 0])
     print("Métrique 'AnswerCorrectness' initialisée.")
 
-    evaluation_file_path = os.path.join(
-        "dataset_rag_lol_definitive", "synthetic_evaluation.csv"
-    )
-    if not os.path.exists(evaluation_file_path):
-        print(f"\n[ERREUR] Le fichier '{evaluation_file_path}' n'a pas été trouvé.")
+    if not os.path.exists(EVALUATION_FILE_PATH):
+        print(f"\n[ERREUR] Le fichier '{EVALUATION_FILE_PATH}' n'a pas été trouvé.")
         print("Veuillez d'abord exécuter 'python generate_testset.py' pour le créer.")
         return
 
-    print(f"Chargement du jeu de données depuis '{evaluation_file_path}'...")
-    eval_df = pd.read_csv(evaluation_file_path)
-
-    # Étape 1: Générer toutes les réponses et contextes en premier
-    evaluation_data = generate_rag_answers(eval_df, llm)
+    print(f"Chargement du jeu de données depuis '{EVALUATION_FILE_PATH}'...")
+    eval_df = pd.read_csv(EVALUATION_FILE_PATH)
 
-    # Étape 2: Convertir la liste en format Dataset pour Ragas
-    # Ragas s'attend à trouver les clés 'question', 'answer', 'contexts', 'ground_truth'
-    evaluation_dataset = Dataset.from_list(evaluation_data)
+    # Étape 1: Générer toutes les réponses et contextes (en parallèle, avec cache)
+    evaluation_data = generate_rag_answers(eval_df, llm, workers=args.workers)
 
-    print("\n--- Étape 2: Évaluation par lot avec Ragas ---")
-
-    # 3. Lancer l'évaluation en une seule fois
-    result = evaluate(
-        dataset=evaluation_dataset,
-        metrics=[
-            faithfulness_evaluator,
-            correctness_evaluator,
-        ],
-        embeddings=embedding_model,
-        run_config=RunConfig(max_workers=1),
+    # Étape 2: Évaluer les réponses par lots avec Ragas
+    scored = score_answers(
+        evaluation_data,
+        [faithfulness_evaluator, correctness_evaluator],
+        embedding_model,
+        workers=args.workers,
     )
 
     print("\n\n--- Fin de l'évaluation ---")
-    results_df = result.to_pandas()
-    print(results_df)
-
+    results_df = pd.DataFrame(scored)
     if not results_df.empty:
         faithfulness_score = results_df["faithfulness"].mean()
         correctness_score = results_df["answer_correctness"].mean()
 
         print(f"\n**Score moyen de Faithfulness : {faithfulness_score:.4f}**")
         print(f"**Score moyen de Correctness  : {correctness_score:.4f}**")
-
-        # Sauvegarder les résultats détaillés dans un fichier CSV
-        results_df.to_csv("evaluation_results.csv", index=False)
-        print(
-            "\nLes résultats détaillés ont été sauvegardés dans 'evaluation_results.csv'"
-        )
+        print(f"\nLes résultats détaillés ont été sauvegardés dans '{RESULTS_PATH}'")
 
 
 if __name__ == "__main__":
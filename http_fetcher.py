@@ -0,0 +1,237 @@
+"""
+Client HTTP asynchrone du scrapper (data_scrapper.py).
+
+- Un seul `httpx.AsyncClient` partagé : les connexions sont gardées ouvertes (keep-alive)
+  et réutilisées d'une page à l'autre.
+- Par hôte, le nombre de requêtes simultanées et le débit (requêtes par seconde) sont bornés.
+- Les erreurs réseau, 429 et 5xx sont relancées avec attente exponentielle et gigue
+  (retry.acall_with_retry), en respectant l'en-tête Retry-After.
+- Les validateurs ETag / Last-Modified de chaque page sont conservés sur disque : la page
+  est redemandée avec If-None-Match / If-Modified-Since, et une réponse 304 indique
+  qu'elle n'a pas changé depuis le dernier scraping.
+"""
+
+from typing import Dict
+from urllib.parse import urlsplit
+import asyncio
+import dataclasses
+import json
+import os
+import threading
+import time
+
+import httpx
+
+from retry import acall_with_retry
+
+# --- CONFIGURATION ---
+HOST_CONCURRENCY = 8  # Requêtes simultanées par hôte
+HOST_RATE_LIMIT = 20.0  # Requêtes par seconde et par hôte
+MAX_CONNECTIONS = 32
+REQUEST_TIMEOUT = 15.0
+RETRIES = 4
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 10.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
+
+
+class RetryableStatus(Exception):
+    """Réponse HTTP temporairement en erreur (429, 5xx), à relancer."""
+
+    def __init__(self, url: str, status_code: int, retry_after: float | None = None):
+        super().__init__(f"HTTP {status_code} (URL: {url})")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Délai de l'en-tête Retry-After, s'il est exprimé en secondes."""
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+class ValidatorCache:
+    """
+    Validateurs HTTP (ETag, Last-Modified) par URL, enregistrés dans un fichier JSON.
+    `save` remplace le fichier de manière atomique.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, str]] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"[AVERTISSEMENT] Cache HTTP ignoré ({e}).")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        entry = self._entries.get(url, {})
+        headers = {}
+        if "etag" in entry:
+            headers["If-None-Match"] = entry["etag"]
+        if "last_modified" in entry:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def record(self, url: str, response: httpx.Response):
+        entry = {}
+        if etag := response.headers.get("ETag"):
+            entry["etag"] = etag
+        if last_modified := response.headers.get("Last-Modified"):
+            entry["last_modified"] = last_modified
+        with self._lock:
+            if entry:
+                self._entries[url] = entry
+            else:
+                self._entries.pop(url, None)
+
+    def forget(self, url: str):
+        with self._lock:
+            self._entries.pop(url, None)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+class HostLimiter:
+    """Borne les requêtes simultanées et espace les débuts de requête vers un même hôte."""
+
+    def __init__(self, concurrency: int, rate: float):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        if self.interval:
+            async with self._lock:
+                now = time.monotonic()
+                wait = self._next_start - now
+                self._next_start = max(now, self._next_start) + self.interval
+            if wait > 0:
+                try:
+                    await asyncio.sleep(wait)
+                except BaseException:
+                    # Tâche annulée pendant l'attente : __aexit__ ne sera pas appelé
+                    self.semaphore.release()
+                    raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.semaphore.release()
+
+
+@dataclasses.dataclass
+class FetchResult:
+    url: str
+    status_code: int
+    content: bytes = b""
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status_code == 304
+
+
+class AsyncFetcher:
+    """
+    Téléchargement concurrent de pages, à utiliser comme contexte asynchrone :
+
+        async with AsyncFetcher(ValidatorCache(path)) as fetcher:
+            result = await fetcher.fetch(url)
+
+    Sans `cache`, les requêtes ne sont pas conditionnelles.
+    """
+
+    def __init__(
+        self,
+        cache: ValidatorCache | None = None,
+        host_concurrency: int = HOST_CONCURRENCY,
+        host_rate_limit: float = HOST_RATE_LIMIT,
+        retries: int = RETRIES,
+        timeout: float = REQUEST_TIMEOUT,
+    ):
+        self.cache = cache
+        self.host_concurrency = host_concurrency
+        self.host_rate_limit = host_rate_limit
+        self.retries = retries
+        self.timeout = timeout
+        self._limiters: Dict[str, HostLimiter] = {}
+        self._client: httpx.AsyncClient | None = None
+
+    async def __aenter__(self) -> "AsyncFetcher":
+        self._client = httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT},
+            timeout=self.timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_CONNECTIONS,
+            ),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self.cache is not None:
+            self.cache.save()
+
+    def _limiter(self, url: str) -> HostLimiter:
+        host = urlsplit(url).netloc
+        if host not in self._limiters:
+            self._limiters[host] = HostLimiter(
+                self.host_concurrency, self.host_rate_limit
+            )
+        return self._limiters[host]
+
+    async def _get(self, url: str, conditional: bool) -> FetchResult:
+        assert (
+            self._client is not None
+        ), "AsyncFetcher doit être utilisé avec `async with`"
+        headers = (
+            self.cache.conditional_headers(url)
+            if conditional and self.cache is not None
+            else {}
+        )
+        async with self._limiter(url):
+            response = await self._client.get(url, headers=headers)
+        if response.status_code in RETRY_STATUSES:
+            raise RetryableStatus(
+                url,
+                response.status_code,
+                parse_retry_after(response.headers.get("Retry-After")),
+            )
+        if response.status_code == 200 and self.cache is not None:
+            self.cache.record(url, response)
+        return FetchResult(url, response.status_code, response.content)
+
+    async def fetch(self, url: str, conditional: bool = True) -> FetchResult:
+        """
+        GET avec relances. Retourne le statut final (200, 304, 404...) et le contenu ;
+        lève une exception si la page reste en erreur après toutes les relances.
+        `conditional=False` ignore les validateurs (page absente du disque).
+        """
+        return await acall_with_retry(
+            lambda: self._get(url, conditional),
+            retries=self.retries,
+            base_delay=RETRY_BASE_DELAY,
+            max_delay=RETRY_MAX_DELAY,
+            retry_on=(RetryableStatus, httpx.TransportError),
+            description=f"la requête {url}",
+        )
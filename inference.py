@@ -2,35 +2,73 @@
 Définit les différentes fonctions d'inférence pour le frontend streamlit.
 """
 
-from typing import List, Literal, Iterator
+from typing import AsyncIterator, Dict, List, Literal, Iterator
+import asyncio
+import contextlib
+import os
+import time
 import pydantic
 from langchain_core.messages import (
     BaseMessage,
+    HumanMessage,
     SystemMessage,
     AIMessageChunk,
 )
 
+import metrics
 import rag_core
+from context_packing import pack_context
+from ingestion import estimate_tokens
+import semantic_cache
+import tracing
+from registry import registry
 
-
-llm = rag_core.get_llm()
 Document = rag_core.Document
 
+# Réponses déjà générées pour une question proche, après un historique proche ; créé au
+# premier usage (sa version interroge le magasin de vecteurs)
+registry.register(
+    "response_cache",
+    lambda: semantic_cache.SemanticCache(version=rag_core.collection_version),
+)
+
+# Nombre de passages de la recherche spéculative sur le dernier message (voir achat)
+SPECULATIVE_RESULTS = 3
+# Reclassement des candidats de chaque recherche du chat (voir reranker.py) : les passages
+# sous le seuil de pertinence ne sont pas envoyés au LLM. CHAT_RERANK=0 pour le désactiver
+RERANK = os.getenv("CHAT_RERANK", "1") == "1"
+
+
+def __getattr__(name: str):
+    # `inference.llm` et `inference.response_cache` restent accessibles ; ils ne sont créés
+    # qu'au premier usage
+    if name in ("llm", "response_cache"):
+        return registry.get(name)
+    raise AttributeError(f"module 'inference' has no attribute '{name}'")
+
 
 # Définition de la fonction d'assistance LLM
 
 
 def llm_summary(q: str, documents: List[Document]) -> Iterator[str]:
-    it = llm.stream(
+    prompt = (
         "Summarize the following documents in a single markdown setup. Use markdown freely. "
         + "Use the language of the user query (usually french), not the language of the documents. "
         + "Only output the summary and nothing else. "
         + f"\nOriginal user query: {q}"
         + "\nDocuments:\n"
-        + "\n".join([f"{doc.title}\n{doc.content}" for doc in documents])
+        + "\n".join(
+            [f"{doc.title}\n{doc.content}" for doc in pack_context(documents).documents]
+        )
     )
-    for tok in it:
-        yield tok.content
+    with tracing.span(
+        "chat.summary", documents=len(documents), prompt_tokens=estimate_tokens(prompt)
+    ) as span:
+        output_tokens = 0
+        for tok in registry.get("llm").stream(prompt):
+            output_tokens += estimate_tokens(str(tok.content))
+            yield tok.content
+        span.set(output_tokens=output_tokens)
 
 
 # Chain of thoughts : production d'une query adaptée à la recherche au RAG
@@ -58,72 +96,291 @@ class SearchQueryResponse(pydantic.BaseModel):
     queries: List[SearchQuery]
 
 
+def planner_messages(conversation: List[BaseMessage]) -> List[BaseMessage]:
+    """Messages envoyés au LLM pour produire les requêtes de recherche."""
+    return [
+        SystemMessage(
+            content="Créez une ou plusieurs requêtes de recherche pour le système RAG en fonction de l'historique de la conversation. "
+            + "Si l'utilisateur n'a pas encore dit ce qu'il recherche, retournez une liste vide. "
+            + "#1. Créez une requête pour chaque type d'information différent que l'utilisateur recherche."
+            + "\nPar exemple, si l'utilisateur demande un document sur un certain sujet, "
+            + "créez une requête qui contient de nombreux mots-clés liés à ce sujet afin que le RAG trouve toutes les correspondances pertinentes. "
+            + '\n#2. Les requêtes ne sont pas destinées à être lues par les utilisateurs ou l\'IA ; elles seront uniquement vectorisées (ou "embeddées") et comparées via la similarité cosinus. '
+            + "Cela signifie qu'elles doivent être courtes et basées sur des mots-clés, comme un tissage de mots suggérant ce qui intéresse l'utilisateur. "
+            + "(ex. \"révolution française napoléon france. manifestations france histoire française\" si l'utilisateur semble s'intéresser à la révolution française). "
+            + "Vous pouvez ajouter des mots-clés personnalisés que l'utilisateur n'a pas mentionnés pour améliorer la requête."
+            + "\n#3. En tant que requête RAG, traduisez les contraintes par l'omission ou la modification de certains mots-clés dans la requête, "
+            + "et/ou ajoutez des mots liés à des sujets perpendiculaires, afin d'influencer les résultats du RAG. "
+            + "(ex. Si l'utilisateur ne veut pas entendre parler des aspects politiques de la révolution française, "
+            + 'vous pouvez modifier la requête pour ne pas inclure "politique" ou "gouvernement", '
+            + 'et y ajouter des mots comme "culture", "art", "philosophie" pour influencer les résultats.)'
+        )
+    ] + conversation
+
+
+def plan_span(messages: List[BaseMessage]):
+    """Span de l'appel au LLM qui planifie les requêtes."""
+    return tracing.span(
+        "chat.plan",
+        prompt_tokens=sum(estimate_tokens(str(m.content)) for m in messages),
+    )
+
+
+def merge_documents(docs: Dict[str, Document], results: List[Document]):
+    """Ajoute des résultats à `docs` ; un document trouvé plusieurs fois garde sa meilleure distance."""
+    for doc in results:
+        if doc.id not in docs or doc.rating < docs[doc.id].rating:
+            docs[doc.id] = doc
+
+
 def query_from_conversation(
     conversation: List[BaseMessage], max_results: int
 ) -> Iterator[str | List[Document]]:
-    queries_response: SearchQueryResponse = llm.with_structured_output(
-        SearchQueryResponse
-    ).invoke(
-        [
-            SystemMessage(
-                content="Créez une ou plusieurs requêtes de recherche pour le système RAG en fonction de l'historique de la conversation. "
-                + "Si l'utilisateur n'a pas encore dit ce qu'il recherche, retournez une liste vide. "
-                + "#1. Créez une requête pour chaque type d'information différent que l'utilisateur recherche."
-                + "\nPar exemple, si l'utilisateur demande un document sur un certain sujet, "
-                + "créez une requête qui contient de nombreux mots-clés liés à ce sujet afin que le RAG trouve toutes les correspondances pertinentes. "
-                + '\n#2. Les requêtes ne sont pas destinées à être lues par les utilisateurs ou l\'IA ; elles seront uniquement vectorisées (ou "embeddées") et comparées via la similarité cosinus. '
-                + "Cela signifie qu'elles doivent être courtes et basées sur des mots-clés, comme un tissage de mots suggérant ce qui intéresse l'utilisateur. "
-                + "(ex. \"révolution française napoléon france. manifestations france histoire française\" si l'utilisateur semble s'intéresser à la révolution française). "
-                + "Vous pouvez ajouter des mots-clés personnalisés que l'utilisateur n'a pas mentionnés pour améliorer la requête."
-                + "\n#3. En tant que requête RAG, traduisez les contraintes par l'omission ou la modification de certains mots-clés dans la requête, "
-                + "et/ou ajoutez des mots liés à des sujets perpendiculaires, afin d'influencer les résultats du RAG. "
-                + "(ex. Si l'utilisateur ne veut pas entendre parler des aspects politiques de la révolution française, "
-                + 'vous pouvez modifier la requête pour ne pas inclure "politique" ou "gouvernement", '
-                + 'et y ajouter des mots comme "culture", "art", "philosophie" pour influencer les résultats.)'
-            )
-        ]
-        + conversation
+    messages = planner_messages(conversation)
+    with plan_span(messages) as span:
+        queries_response: SearchQueryResponse = (
+            registry.get("llm")
+            .with_structured_output(SearchQueryResponse)
+            .invoke(messages)
+        )
+        span.set(queries=len(queries_response.queries))
+    queries = queries_response.queries
+    if not queries:
+        yield []
+        return
+
+    # Un seul appel d'embedding et une seule recherche pour toutes les requêtes ; chaque
+    # requête est signalée quand ses résultats sont disponibles, donc après le lot
+    docs: dict[str, Document] = {}
+    result_lists = rag_core.query_many(
+        [q.query for q in queries],
+        [q.n_results(max_results) for q in queries],  # type: ignore[misc]
+        hybrid=True,
+        rerank=RERANK,
     )
-    docs = set()
-    for q in queries_response.queries:
+    for q, results in zip(queries, result_lists):
         yield q.query
-        docs.update(rag_core.query(q=q.query, n_results=q.n_results(max_results)))
-    yield list(docs)
+        merge_documents(docs, results)
+    yield sorted(docs.values(), key=lambda doc: doc.rating)
+
+
+async def aquery_from_conversation(
+    conversation: List[BaseMessage], max_results: int
+) -> AsyncIterator[str | List[Document]]:
+    """
+    Version asynchrone de query_from_conversation.
+    Pendant que le LLM planifie les requêtes, une recherche spéculative est lancée sur le
+    dernier message de l'utilisateur ; ses résultats sont fusionnés avec ceux des requêtes
+    planifiées (et ignorés si le LLM estime qu'il n'y a rien à rechercher).
+    """
+    speculative = None
+    if conversation and isinstance(conversation[-1], HumanMessage):
+        speculative = asyncio.create_task(
+            asyncio.to_thread(
+                rag_core.query,
+                q=str(conversation[-1].content),
+                n_results=SPECULATIVE_RESULTS,
+                hybrid=True,
+                rerank=RERANK,
+            )
+        )
+
+    try:
+        messages = planner_messages(conversation)
+        with plan_span(messages) as span:
+            queries_response: SearchQueryResponse = (
+                await registry.get("llm")
+                .with_structured_output(SearchQueryResponse)
+                .ainvoke(messages)
+            )
+            span.set(queries=len(queries_response.queries))
+        queries = queries_response.queries
+        if not queries:
+            yield []
+            return
+
+        docs: Dict[str, Document] = {}
+        result_lists = await asyncio.to_thread(
+            rag_core.query_many,
+            [q.query for q in queries],
+            [q.n_results(max_results) for q in queries],  # type: ignore[arg-type]
+            hybrid=True,
+            rerank=RERANK,
+        )
+        for q, results in zip(queries, result_lists):
+            yield q.query
+            merge_documents(docs, results)
+
+        if speculative is not None:
+            try:
+                merge_documents(docs, await speculative)
+                metrics.increment("chat.speculative_retrievals")
+            except Exception as e:
+                print(f"[ATTENTION] Recherche spéculative en échec : {e}")
+            speculative = None
+        yield sorted(docs.values(), key=lambda doc: doc.rating)
+    finally:
+        if speculative is not None:
+            speculative.cancel()
 
 
 # Définition de la fonction de chat via LLM
 
+ANSWER_PROMPT = (
+    "Salutations, voyageur ! Je suis un chroniqueur de Runeterra, gardien des récits de champions et des légendes des régions. Mon savoir provient des écrits que le système m'a fournis. "
+    + "Pose-moi tes questions sur les héros, les terres lointaines ou les rivalités qui façonnent ce monde. "
+    + "Ma mission est de te répondre en me basant fidèlement sur ces chroniques. "
+    + "Si ta question est précise, je te donnerai une réponse directe, puisant dans les textes. "
+    + "Si elle est plus vague, je te présenterai les parchemins qui me semblent les plus pertinents pour ta quête de connaissance. "
+    + "Dans tous les cas, je te répondrais uniquement à l'aide des documents fournis par le système, pas de mes connaissances personnelles. "
+    + "Je réponds toujours en français. N'hésite pas à citer des passages des documents pour appuyer tes réponses, si cela éclaire ton propos."
+)
+
+
+def answer_messages(
+    documents: List[Document], conversation: List[BaseMessage]
+) -> List[BaseMessage]:
+    """
+    Messages envoyés au LLM pour rédiger la réponse à partir des documents trouvés
+    (sélectionnés dans la limite du budget de tokens, voir context_packing).
+    """
+    return [
+        SystemMessage(
+            content=ANSWER_PROMPT
+            + "\nQuery Results:\n"
+            + "\n".join(
+                [
+                    f"{doc.title}\n{doc.content}"
+                    for doc in pack_context(documents).documents
+                ]
+            )
+        ),
+    ] + conversation
+
+
+def answer_cache_key(conversation: List[BaseMessage]) -> semantic_cache.ConversationKey:
+    """
+    Clé de la conversation dans le cache de réponses (avec le prompt et le modèle). Les
+    vecteurs passent par le cache d'embedding : une question déjà posée ne coûte aucun appel.
+    """
+    model = str(getattr(registry.get("llm"), "model", ""))
+    return semantic_cache.conversation_key(
+        conversation, rag_core.embed_queries, ANSWER_PROMPT, model
+    )
+
+
+def generation_span(messages: List[BaseMessage], cached: bool):
+    """Span de la rédaction de la réponse (`cached` : réponse rejouée depuis le cache)."""
+    return tracing.span(
+        "chat.generate",
+        cached=cached,
+        prompt_tokens=sum(estimate_tokens(str(m.content)) for m in messages),
+    )
+
 
 def chat(
     conversation: List[BaseMessage],
 ) -> Iterator[str | List[Document] | AIMessageChunk]:
+    with tracing.span("chat", messages=len(conversation)) as chat_span:
+        start = time.perf_counter()
+        queries = []
+        documents = []
+        with tracing.span("chat.retrieval"):
+            for item in query_from_conversation(conversation, max_results=5):
+                if isinstance(item, str):
+                    queries.append(item)
+                    yield item
+                    continue
 
-    documents = []
-    for item in query_from_conversation(conversation, max_results=5):
-        if isinstance(item, str):
-            yield item
-            continue
-
-        elif isinstance(item, list):
-            documents = item
-            yield documents
-            break
-
-    it: Iterator[AIMessageChunk] = llm.stream(
-        [
-            SystemMessage(
-                content="Salutations, voyageur ! Je suis un chroniqueur de Runeterra, gardien des récits de champions et des légendes des régions. Mon savoir provient des écrits que le système m'a fournis. "
-                + "Pose-moi tes questions sur les héros, les terres lointaines ou les rivalités qui façonnent ce monde. "
-                + "Ma mission est de te répondre en me basant fidèlement sur ces chroniques. "
-                + "Si ta question est précise, je te donnerai une réponse directe, puisant dans les textes. "
-                + "Si elle est plus vague, je te présenterai les parchemins qui me semblent les plus pertinents pour ta quête de connaissance. "
-                + "Dans tous les cas, je te répondrais uniquement à l'aide des documents fournis par le système, pas de mes connaissances personnelles. "
-                + "Je réponds toujours en français. N'hésite pas à citer des passages des documents pour appuyer tes réponses, si cela éclaire ton propos."
-                + "\nQuery Results:\n"
-                + "\n".join([f"{doc.title}\n{doc.content}" for doc in documents])
-            ),
-        ]
-        + conversation
-    )
-    for chunk in it:
-        yield chunk
+                elif isinstance(item, list):
+                    documents = item
+                    yield documents
+                    break
+        metrics.observe("chat.retrieval", time.perf_counter() - start)
+        chat_span.set(queries=len(queries), documents=len(documents))
+
+        conversation_key = answer_cache_key(conversation)
+        answer = registry.get("response_cache").lookup(conversation_key)
+        if answer is not None:
+            messages = []
+            chunks = semantic_cache.replay(answer)
+        else:
+            messages = answer_messages(documents, conversation)
+            chunks = registry.get("llm").stream(messages)
+
+        with generation_span(messages, cached=answer is not None) as span:
+            generation_start = time.perf_counter()
+            first_token = True
+            answer_parts = []
+            for chunk in chunks:
+                if first_token:
+                    metrics.observe("chat.ttft", time.perf_counter() - start)
+                    span.set(ttft_ms=round((time.perf_counter() - start) * 1000, 1))
+                    first_token = False
+                answer_parts.append(str(chunk.content))
+                yield chunk
+            span.set(output_tokens=estimate_tokens("".join(answer_parts)))
+        if answer is None:
+            registry.get("response_cache").store(
+                conversation_key,
+                "".join(answer_parts),
+                time.perf_counter() - generation_start,
+            )
+
+
+async def achat(
+    conversation: List[BaseMessage],
+) -> AsyncIterator[str | List[Document] | AIMessageChunk]:
+    """
+    Version asynchrone de `chat`, avec le même protocole d'événements. Les appels au LLM
+    sont asynchrones et les recherches (bloquantes) tournent dans le pool de threads
+    d'asyncio : un serveur peut servir de nombreuses conversations sans un thread par session.
+    """
+    with tracing.span("chat", messages=len(conversation)) as chat_span:
+        start = time.perf_counter()
+        queries = []
+        documents = []
+        with tracing.span("chat.retrieval"):
+            async with contextlib.aclosing(
+                aquery_from_conversation(conversation, max_results=5)
+            ) as items:
+                async for item in items:
+                    if isinstance(item, str):
+                        queries.append(item)
+                        yield item
+                        continue
+
+                    elif isinstance(item, list):
+                        documents = item
+                        yield documents
+                        break
+        metrics.observe("chat.retrieval", time.perf_counter() - start)
+        chat_span.set(queries=len(queries), documents=len(documents))
+
+        conversation_key = await asyncio.to_thread(answer_cache_key, conversation)
+        answer = registry.get("response_cache").lookup(conversation_key)
+        if answer is not None:
+            messages = []
+            chunks = semantic_cache.areplay(answer)
+        else:
+            messages = answer_messages(documents, conversation)
+            chunks = registry.get("llm").astream(messages)
+
+        with generation_span(messages, cached=answer is not None) as span:
+            generation_start = time.perf_counter()
+            first_token = True
+            answer_parts = []
+            async for chunk in chunks:
+                if first_token:
+                    metrics.observe("chat.ttft", time.perf_counter() - start)
+                    span.set(ttft_ms=round((time.perf_counter() - start) * 1000, 1))
+                    first_token = False
+                answer_parts.append(str(chunk.content))
+                yield chunk
+            span.set(output_tokens=estimate_tokens("".join(answer_parts)))
+        if answer is None:
+            registry.get("response_cache").store(
+                conversation_key,
+                "".join(answer_parts),
+                time.perf_counter() - generation_start,
+            )
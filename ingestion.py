@@ -0,0 +1,177 @@
+"""
+Pipeline d'ingestion des documents : lecture paresseuse, découpage en passages,
+lots bornés en tokens, vectorisation concurrente avec relances, écriture et points de reprise.
+
+Les lots produits par le générateur passent par une file bornée ; un pool de threads
+vectorise leurs passages puis les transmet à la fonction d'écriture (`sink`), appelée un lot à la
+fois. Après chaque lot écrit, `on_batch_done` reçoit les documents concernés, ce qui
+permet d'enregistrer un point de reprise : un build interrompu reprend là où il s'était arrêté.
+"""
+
+from typing import Callable, Iterable, Iterator, List, Optional
+import dataclasses
+import os
+import queue
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
+
+from chunking import Chunk, chunk_text, CHUNK_SIZE, CHUNK_OVERLAP
+from retry import call_with_retry
+
+# --- PARAMETRES DE PERFORMANCE ---
+BATCH_MAX_TOKENS = 16_000
+BATCH_MAX_DOCUMENTS = 100  # Passages par appel (limite d'un batch de l'API Google)
+EMBEDDING_WORKERS = 4
+QUEUE_SIZE = 8
+EMBEDDING_RETRIES = 5
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation grossière du nombre de tokens d'un texte (≈ 4 caractères par token)."""
+    return len(text) // 4 + 1
+
+
+@dataclasses.dataclass
+class SourceDocument:
+    id: str
+    content: str
+    content_hash: str
+    chunks: List[Chunk] = dataclasses.field(default_factory=list)
+
+
+@dataclasses.dataclass
+class IngestionStats:
+    documents: int = 0
+    chunks: int = 0
+    batches: int = 0
+    tokens: int = 0
+    failed_documents: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def documents_per_second(self) -> float:
+        return self.documents / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.documents} documents ({self.chunks} passages) en {self.batches} lots "
+            f"({self.tokens} tokens estimés) "
+            f"en {self.elapsed:.2f}s, soit {self.documents_per_second:.1f} documents/s"
+            + (f", {self.failed_documents} en échec" if self.failed_documents else "")
+            + "."
+        )
+
+
+def iter_source_documents(
+    source_dir: str, ids: Iterable[str], hashes: dict[str, str]
+) -> Iterator[SourceDocument]:
+    """Lit les fichiers un par un, uniquement au moment où le lot suivant en a besoin."""
+    for doc_id in ids:
+        with open(
+            os.path.join(source_dir, f"{doc_id}.txt"), "r", encoding="utf-8"
+        ) as f:
+            yield SourceDocument(
+                id=doc_id, content=f.read(), content_hash=hashes[doc_id]
+            )
+
+
+def chunk_documents(
+    documents: Iterable[SourceDocument],
+    chunk_size: int = CHUNK_SIZE,
+    overlap: int = CHUNK_OVERLAP,
+) -> Iterator[SourceDocument]:
+    """Découpe chaque document en passages au fil de la lecture."""
+    for document in documents:
+        document.chunks = chunk_text(document.id, document.content, chunk_size, overlap)
+        yield document
+
+
+def batch_by_tokens(
+    documents: Iterable[SourceDocument],
+    max_tokens: int = BATCH_MAX_TOKENS,
+    max_documents: int = BATCH_MAX_DOCUMENTS,
+) -> Iterator[List[SourceDocument]]:
+    """
+    Regroupe les documents en lots dont le total estimé de tokens reste sous le budget.
+    Les passages d'un même document restent dans le même lot.
+    """
+    batch: List[SourceDocument] = []
+    batch_tokens = 0
+    batch_chunks = 0
+    for document in documents:
+        tokens = sum(estimate_tokens(c.content) for c in document.chunks)
+        if batch and (
+            batch_tokens + tokens > max_tokens
+            or batch_chunks + len(document.chunks) > max_documents
+        ):
+            yield batch
+            batch, batch_tokens, batch_chunks = [], 0, 0
+        batch.append(document)
+        batch_tokens += tokens
+        batch_chunks += len(document.chunks)
+    if batch:
+        yield batch
+
+
+def run_ingestion(
+    batches: Iterable[List[SourceDocument]],
+    embedder: Embeddings,
+    sink: Callable[[List[SourceDocument], List[List[float]]], None],
+    on_batch_done: Optional[Callable[[List[SourceDocument]], None]] = None,
+    workers: int = EMBEDDING_WORKERS,
+    queue_size: int = QUEUE_SIZE,
+    retries: int = EMBEDDING_RETRIES,
+) -> IngestionStats:
+    """
+    Vectorise et écrit les lots en parallèle.
+    `sink` reçoit le lot et les vecteurs de ses passages, dans l'ordre des documents puis des passages.
+    Un lot qui échoue après toutes ses relances est compté en échec sans interrompre les autres :
+    il n'est pas marqué comme terminé et sera retraité au prochain lancement.
+    """
+    stats = IngestionStats()
+    start_time = time.perf_counter()
+    pending: queue.Queue[List[SourceDocument] | None] = queue.Queue(maxsize=queue_size)
+    write_lock = threading.Lock()
+
+    def worker():
+        while (batch := pending.get()) is not None:
+            texts = [c.content for d in batch for c in d.chunks]
+            try:
+                embeddings = (
+                    call_with_retry(
+                        lambda: embedder.embed_documents(texts),
+                        retries=retries,
+                        description=f"la vectorisation d'un lot de {len(texts)} passages",
+                    )
+                    if texts
+                    else []
+                )
+                with write_lock:
+                    sink(batch, embeddings)
+                    if on_batch_done is not None:
+                        on_batch_done(batch)
+                    stats.documents += len(batch)
+                    stats.chunks += len(texts)
+                    stats.batches += 1
+                    stats.tokens += sum(estimate_tokens(t) for t in texts)
+            except Exception as e:
+                with write_lock:
+                    stats.failed_documents += len(batch)
+                print(f"[ERREUR] Lot abandonné ({', '.join(d.id for d in batch)}): {e}")
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        for batch in batches:
+            pending.put(batch)  # Bloquant quand la file est pleine
+    finally:
+        for _ in threads:
+            pending.put(None)
+        for thread in threads:
+            thread.join()
+
+    stats.elapsed = time.perf_counter() - start_time
+    return stats
@@ -0,0 +1,166 @@
+"""
+Index lexical BM25 des passages, en complément de la recherche vectorielle.
+
+L'index est construit par create_database.py à partir des passages de la collection
+'documents' et enregistré à côté de la base Chroma (database/bm25_index.json). Il contient
+aussi le texte et les métadonnées des passages : une requête qui correspond exactement à un
+titre (ex: "Jinx", "K'Sante") est servie sans appel au modèle d'embedding ni à Chroma.
+"""
+
+from typing import Dict, List, Sequence, Tuple
+from collections import Counter
+import heapq
+import json
+import math
+import os
+import re
+import unicodedata
+
+# --- CONFIGURATION ---
+INDEX_PATH = os.path.join(os.getcwd(), "database", "bm25_index.json")
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60  # Constante de lissage de la fusion par rang réciproque
+
+STOPWORDS = set("""
+    a au aux avec ce ces cet cette d dans de des du elle en est et il ils je l la le les
+    leur leurs lui m ma mais me mes n ne nos notre nous on ou par pas pour qu que qui s sa
+    se ses son sont sur t ta te tes toi ton tu un une vos votre vous y à été être
+    the of and to in is
+    """.split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def fold(text: str) -> str:
+    """Minuscules, sans accents."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[str]:
+    """Découpe un texte en termes indexables (sans accents ni mots vides)."""
+    return [t for t in _TOKEN_RE.findall(fold(text)) if t not in STOPWORDS]
+
+
+def title_keys(title: str) -> List[str]:
+    """Formes normalisées d'un titre : "K'Sante" -> "ksante", "Aurelion Sol" -> "aurelion sol" et "aurelionsol"."""
+    words = _TOKEN_RE.findall(re.sub(r"['’.]", "", fold(title)))
+    return list(dict.fromkeys([" ".join(words), "".join(words)])) if words else []
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]], k: int = RRF_K
+) -> List[Tuple[str, float]]:
+    """Fusionne plusieurs classements d'IDs : score = somme des 1 / (k + rang)."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """Index inversé BM25 en mémoire, avec les textes et métadonnées des passages."""
+
+    def __init__(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[dict],
+        postings: Dict[str, List[Tuple[int, int]]],
+        lengths: List[int],
+    ):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.postings = postings
+        self.lengths = lengths
+        self.average_length = sum(lengths) / len(lengths) if lengths else 0.0
+        n = len(ids)
+        self.idf = {
+            term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+            for term, p in postings.items()
+        }
+        # Titre normalisé -> positions des passages du document, dans l'ordre du texte
+        self.titles: Dict[str, List[int]] = {}
+        for position, metadata in enumerate(metadatas):
+            for key in title_keys(metadata.get("display_title", "")) + title_keys(
+                metadata.get("title", "")
+            ):
+                positions = self.titles.setdefault(key, [])
+                if position not in positions:
+                    positions.append(position)
+        for positions in self.titles.values():
+            positions.sort(key=lambda p: self.metadatas[p].get("chunk_index", 0))
+
+    @classmethod
+    def build(
+        cls, ids: List[str], documents: List[str], metadatas: List[dict]
+    ) -> "BM25Index":
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = []
+        for position, text in enumerate(documents):
+            terms = tokenize(text)
+            lengths.append(len(terms))
+            for term, frequency in Counter(terms).items():
+                postings.setdefault(term, []).append((position, frequency))
+        return cls(ids, documents, metadatas, postings, lengths)
+
+    def search(self, q: str, n_results: int) -> List[Tuple[int, float]]:
+        """Retourne les positions des `n_results` meilleurs passages et leur score BM25."""
+        if not self.average_length:
+            # Index vide, ou passages sans aucun terme : rien à trouver
+            return []
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(q)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for position, frequency in self.postings[term]:
+                norm = BM25_K1 * (
+                    1 - BM25_B + BM25_B * self.lengths[position] / self.average_length
+                )
+                scores[position] = scores.get(position, 0.0) + idf * (
+                    frequency * (BM25_K1 + 1) / (frequency + norm)
+                )
+        # Seuls les n meilleurs sont triés (même ordre que sorted, ex aequo compris)
+        return heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+
+    def match_title(self, q: str) -> List[int]:
+        """Positions des passages du document dont le titre correspond exactement à la requête."""
+        for key in title_keys(q):
+            if key in self.titles:
+                return self.titles[key]
+        return []
+
+    # --- Persistance ---
+
+    def save(self, path: str = INDEX_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "ids": self.ids,
+                    "documents": self.documents,
+                    "metadatas": self.metadatas,
+                    "postings": self.postings,
+                    "lengths": self.lengths,
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = INDEX_PATH) -> "BM25Index":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            data["ids"],
+            data["documents"],
+            data["metadatas"],
+            {term: [tuple(p) for p in p_list] for term, p_list in data["postings"].items()},  # type: ignore[misc]
+            data["lengths"],
+        )
@@ -0,0 +1,51 @@
+"""
+Modèle d'embedding local et déterministe, sans appel réseau.
+
+Les mots du texte sont projetés par hachage dans un vecteur de dimension fixe
+(feature hashing), puis le vecteur est normalisé. Deux textes qui partagent du
+vocabulaire obtiennent donc des vecteurs proches, ce qui suffit pour les tests
+de débit et les benchmarks hors ligne.
+"""
+
+from typing import List
+import hashlib
+import re
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_DIMENSION = 768
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Embedding déterministe par hachage des mots.
+    `latency` simule la durée (en secondes) d'un appel à l'API par lot.
+    """
+
+    def __init__(self, dimension: int = DEFAULT_DIMENSION, latency: float = 0.0):
+        self.dimension = dimension
+        self.latency = latency
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in _WORD_RE.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dimension] += 1.0 if value & (1 << 63) else -1.0
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._embed(text)
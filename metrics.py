@@ -0,0 +1,93 @@
+"""
+Métriques de performance en mémoire, partagées par tout le processus.
+
+Les compteurs (`increment`) et les durées (`observe`) sont protégés par un verrou : ils
+peuvent être alimentés depuis plusieurs threads ou coroutines. Seules les dernières
+`MAX_SAMPLES` durées de chaque métrique sont conservées pour le calcul des percentiles.
+"""
+
+from typing import Dict, Iterator
+import collections
+import contextlib
+import threading
+import time
+
+# --- CONFIGURATION ---
+MAX_SAMPLES = 1000
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = collections.defaultdict(float)
+_samples: Dict[str, collections.deque] = {}
+
+
+def increment(name: str, value: float = 1.0):
+    """Incrémente un compteur."""
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name: str, seconds: float):
+    """Enregistre une durée (en secondes)."""
+    with _lock:
+        if name not in _samples:
+            _samples[name] = collections.deque(maxlen=MAX_SAMPLES)
+        _samples[name].append(seconds)
+
+
+@contextlib.contextmanager
+def timer(name: str) -> Iterator[None]:
+    """Mesure la durée du bloc et l'enregistre sous `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def _percentile(ordered: list, p: float) -> float:
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def snapshot() -> Dict[str, dict]:
+    """
+    Retourne l'état courant : la valeur de chaque compteur, et pour chaque durée le nombre
+    d'observations, la moyenne, le p50, le p95 et le p99 (en millisecondes).
+    """
+    with _lock:
+        counters = dict(_counters)
+        samples = {name: sorted(values) for name, values in _samples.items()}
+    result: Dict[str, dict] = {
+        name: {"value": value} for name, value in counters.items()
+    }
+    for name, ordered in samples.items():
+        if not ordered:
+            continue
+        result[name] = {
+            "count": len(ordered),
+            "mean_ms": sum(ordered) / len(ordered) * 1000,
+            "p50_ms": _percentile(ordered, 50) * 1000,
+            "p95_ms": _percentile(ordered, 95) * 1000,
+            "p99_ms": _percentile(ordered, 99) * 1000,
+        }
+    return result
+
+
+def report() -> str:
+    """Résumé lisible de toutes les métriques, une par ligne."""
+    lines = []
+    for name, values in sorted(snapshot().items()):
+        if "value" in values:
+            lines.append(f"{name}: {values['value']:g}")
+        else:
+            lines.append(
+                f"{name}: {values['count']} mesures, moyenne {values['mean_ms']:.1f} ms, "
+                f"p50 {values['p50_ms']:.1f} ms, p95 {values['p95_ms']:.1f} ms"
+            )
+    return "\n".join(lines)
+
+
+def reset():
+    """Efface toutes les métriques."""
+    with _lock:
+        _counters.clear()
+        _samples.clear()
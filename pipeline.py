@@ -0,0 +1,147 @@
+"""
+Scraping et indexation en flux : chaque document écrit par le scrapper (data_scrapper.py)
+passe par une file bornée et est découpé, vectorisé et écrit dans la base par lots
+(create_database.build_database) pendant que le scraping continue.
+
+Le scraping tourne dans sa propre boucle asyncio, sur un thread dédié ; quand la file est
+pleine (vectorisation plus lente que le téléchargement), il attend. Le manifeste est mis à
+jour après chaque lot écrit : si le pipeline s'interrompt, les documents déjà indexés le
+restent, l'index BM25 est reconstruit, et la relance ne traite que ce qui manque.
+
+Avec --snapshot, la base est ensuite publiée dans un snapshot en lecture seule (snapshots.py).
+
+Usage :
+    python pipeline.py [--workers 4] [--queue-size 32] [--snapshot]
+"""
+
+from typing import Iterator, Tuple
+import argparse
+import asyncio
+import queue
+import threading
+import time
+
+import create_database
+import data_scrapper
+import ingestion
+
+# --- CONFIGURATION ---
+SCRAPE_QUEUE_SIZE = 32  # Documents scrapés en attente d'indexation
+
+_DONE = object()
+
+
+class PipelineStopped(Exception):
+    """L'indexation s'est arrêtée : le scraping n'a plus de destinataire."""
+
+
+def stream_scraped_documents(
+    champion_list_url: str = data_scrapper.CHAMPION_LIST_URL,
+    base_url: str = data_scrapper.UNIVERSE_BASE_URL,
+    queue_size: int = SCRAPE_QUEUE_SIZE,
+    **scraper_options,
+) -> Iterator[Tuple[str, str]]:
+    """
+    Lance le scraping en arrière-plan et renvoie les documents (slug, titre) au fur et à
+    mesure de leur écriture, pages inchangées (HTTP 304) comprises. Une erreur du scraping
+    est relancée à la fin du flux ; arrêter la lecture du flux arrête le scraping.
+    """
+    pending: queue.Queue = queue.Queue(maxsize=queue_size)
+    stopped = threading.Event()
+    errors: list = []
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise PipelineStopped()
+
+    async def on_result(result: data_scrapper.LoreResult):
+        if result.status != "failed":
+            await asyncio.to_thread(put, (result.slug, result.subject))
+
+    def scrape():
+        try:
+            if not asyncio.run(
+                data_scrapper.scrape_knowledge_base(
+                    champion_list_url,
+                    base_url,
+                    on_result=on_result,
+                    **scraper_options,
+                )
+            ):
+                errors.append(RuntimeError("La liste de champions est vide."))
+        except PipelineStopped:
+            pass
+        except Exception as e:
+            errors.append(e)
+        finally:
+            try:
+                put(_DONE)
+            except PipelineStopped:
+                pass
+
+    thread = threading.Thread(target=scrape, name="scraper", daemon=True)
+    thread.start()
+    try:
+        while (item := pending.get()) is not _DONE:
+            yield item
+    finally:
+        stopped.set()
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def run_pipeline(
+    champion_list_url: str = data_scrapper.CHAMPION_LIST_URL,
+    base_url: str = data_scrapper.UNIVERSE_BASE_URL,
+    workers: int = ingestion.EMBEDDING_WORKERS,
+    queue_size: int = SCRAPE_QUEUE_SIZE,
+    snapshot: bool = False,
+    **scraper_options,
+):
+    """Scrape et indexe en flux, puis écrit le fichier d'évaluation (et publie un snapshot)."""
+    start_time = time.time()
+    create_database.build_database(
+        workers=workers,
+        stream=stream_scraped_documents(
+            champion_list_url, base_url, queue_size, **scraper_options
+        ),
+    )
+    data_scrapper.create_evaluation_file()
+    if snapshot:
+        create_database.publish_snapshot()
+    print(f"\nPipeline terminé en {time.time() - start_time:.2f} secondes.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=ingestion.EMBEDDING_WORKERS,
+        help="Nombre de threads de vectorisation.",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=SCRAPE_QUEUE_SIZE,
+        help="Documents scrapés en attente d'indexation avant que le scraping ne s'interrompe.",
+    )
+    parser.add_argument(
+        "--snapshot",
+        action="store_true",
+        help="Publie ensuite la base dans un snapshot en lecture seule (snapshots.py).",
+    )
+    args = parser.parse_args()
+    run_pipeline(
+        workers=args.workers, queue_size=args.queue_size, snapshot=args.snapshot
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""
+Quantification des vecteurs du magasin NumPy (vector_store.py), pour réduire la mémoire
+parcourue à chaque recherche (VECTOR_QUANTIZATION) :
+- "int8" : quantification scalaire, 1 octet par dimension au lieu de 4 ; chaque dimension a
+  son propre décalage et son propre pas (minimum et maximum sur le corpus) ;
+- "pq" : quantification par produit ; le vecteur est découpé en PQ_SUBVECTORS sous-vecteurs,
+  chacun remplacé par le numéro (1 octet) du plus proche des 256 centroïdes de son
+  sous-espace, appris par k-means : 96 octets pour un vecteur de 768 dimensions.
+
+Les codes ne servent qu'à estimer les produits scalaires requête·passage sur tout le
+corpus ; vector_store.py recalcule ensuite la distance exacte des meilleurs candidats à
+partir des vecteurs float32, mappés en mémoire, dont seules les lignes des candidats sont lues.
+
+Les codes et les normes exactes des vecteurs sont écrits à côté de la matrice
+("vectors.codes", "vectors.norms"), et les nouveaux vecteurs y sont ajoutés à la suite
+(`append`) ; les paramètres du quantificateur ("quantizer.npz") ne changent pas. Un
+quantificateur est réutilisé tant que le corpus n'a pas doublé depuis son apprentissage :
+seuls les nouveaux vecteurs sont encodés, et le k-means n'est relancé qu'un nombre
+logarithmique de fois pendant un build.
+"""
+
+from typing import Dict, Type
+import abc
+import dataclasses
+import os
+
+import numpy as np
+
+# --- CONFIGURATION ---
+PQ_SUBVECTORS = int(os.getenv("PQ_SUBVECTORS", "96"))  # Octets par vecteur (au plus)
+PQ_CENTROIDS = 256  # Un code tient sur un octet
+PQ_TRAIN_SAMPLE = 20000  # Vecteurs utilisés pour apprendre les centroïdes
+PQ_ITERATIONS = 12
+SCAN_BLOCK_SIZE = 16384  # Vecteurs décodés ou encodés à la fois
+
+CODES_FILENAME = "vectors.codes"
+NORMS_FILENAME = "vectors.norms"
+QUANTIZER_FILENAME = "quantizer.npz"
+FILENAMES = (CODES_FILENAME, NORMS_FILENAME, QUANTIZER_FILENAME)
+
+
+class Quantizer(abc.ABC):
+    """Encode des vecteurs float32 en codes uint8 et estime leurs produits scalaires."""
+
+    kind = "none"
+
+    def __init__(self, trained_on: int):
+        self.trained_on = trained_on  # Taille du corpus lors de l'apprentissage
+
+    @property
+    @abc.abstractmethod
+    def dimension(self) -> int:
+        """Dimension des vecteurs encodés."""
+
+    @abc.abstractmethod
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Codes (n, taille du code) des vecteurs."""
+
+    @abc.abstractmethod
+    def products(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Produits scalaires estimés (b, n) entre les requêtes et les vecteurs encodés."""
+
+    @abc.abstractmethod
+    def params(self) -> Dict[str, np.ndarray]:
+        """Paramètres appris, enregistrés dans quantizer.npz."""
+
+
+class ScalarQuantizer(Quantizer):
+    """x ≈ offset + scale * code, dimension par dimension (code de 0 à 255)."""
+
+    kind = "int8"
+
+    def __init__(self, offset: np.ndarray, scale: np.ndarray, trained_on: int):
+        super().__init__(trained_on)
+        self.offset = offset.astype(np.float32)
+        self.scale = scale.astype(np.float32)
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray) -> "ScalarQuantizer":
+        low = np.asarray(vectors.min(axis=0), dtype=np.float32)
+        high = np.asarray(vectors.max(axis=0), dtype=np.float32)
+        scale = np.where(high > low, (high - low) / 255, 1.0)
+        return cls(low, scale, len(vectors))
+
+    @property
+    def dimension(self) -> int:
+        return len(self.offset)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty(vectors.shape, dtype=np.uint8)
+        for start in range(0, len(vectors), SCAN_BLOCK_SIZE):
+            block = np.asarray(vectors[start : start + SCAN_BLOCK_SIZE], np.float32)
+            codes[start : start + SCAN_BLOCK_SIZE] = np.clip(
+                np.rint((block - self.offset) / self.scale), 0, 255
+            )
+        return codes
+
+    def products(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        # q·x ≈ q·offset + (q * scale)·code : une multiplication matricielle par bloc
+        weighted = queries * self.scale
+        products = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), SCAN_BLOCK_SIZE):
+            block = codes[start : start + SCAN_BLOCK_SIZE].astype(np.float32)
+            products[:, start : start + SCAN_BLOCK_SIZE] = weighted @ block.T
+        products += (queries @ self.offset)[:, None]
+        return products
+
+    def params(self) -> Dict[str, np.ndarray]:
+        return {"offset": self.offset, "scale": self.scale}
+
+
+def nearest_centroids(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Indice du centroïde le plus proche (L2) de chaque point."""
+    centroid_norms = (centroids**2).sum(axis=1)
+    nearest = np.empty(len(points), dtype=np.int64)
+    for start in range(0, len(points), SCAN_BLOCK_SIZE):
+        block = points[start : start + SCAN_BLOCK_SIZE]
+        nearest[start : start + SCAN_BLOCK_SIZE] = np.argmin(
+            centroid_norms[None, :] - 2 * block @ centroids.T, axis=1
+        )
+    return nearest
+
+
+def kmeans(
+    points: np.ndarray,
+    k: int,
+    rng: np.random.Generator,
+    iterations: int = PQ_ITERATIONS,
+) -> np.ndarray:
+    """Centroïdes (k, dim) par l'algorithme de Lloyd, initialisés sur des points tirés au hasard."""
+    centroids = points[rng.choice(len(points), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = nearest_centroids(points, centroids)
+        counts = np.bincount(assignment, minlength=k)
+        sums = np.stack(
+            [
+                np.bincount(assignment, weights=points[:, d], minlength=k)
+                for d in range(points.shape[1])
+            ],
+            axis=1,
+        )
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Un centroïde sans point repart d'un point tiré au hasard
+        if (~filled).any():
+            centroids[~filled] = points[rng.choice(len(points), int((~filled).sum()))]
+    return centroids.astype(np.float32)
+
+
+class ProductQuantizer(Quantizer):
+    """Un octet par sous-vecteur : le numéro du centroïde le plus proche de son sous-espace."""
+
+    kind = "pq"
+
+    def __init__(self, centroids: np.ndarray, trained_on: int):
+        super().__init__(trained_on)
+        # (sous-vecteurs, 256 centroïdes, dimension / sous-vecteurs)
+        self.centroids = centroids.astype(np.float32)
+
+    @classmethod
+    def fit(
+        cls, vectors: np.ndarray, subvectors: int = PQ_SUBVECTORS, seed: int = 0
+    ) -> "ProductQuantizer":
+        dimension = vectors.shape[1]
+        # Le plus grand nombre de sous-vecteurs (au plus `subvectors`) qui divise la dimension
+        subvectors = max(
+            s for s in range(1, min(subvectors, dimension) + 1) if dimension % s == 0
+        )
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(vectors), PQ_TRAIN_SAMPLE)
+        rows = np.sort(rng.choice(len(vectors), sample_size, replace=False))
+        sample = np.asarray(vectors[rows], dtype=np.float32)
+        width = dimension // subvectors
+        k = min(PQ_CENTROIDS, sample_size)
+        centroids = np.stack(
+            [
+                kmeans(sample[:, j * width : (j + 1) * width], k, rng)
+                for j in range(subvectors)
+            ]
+        )
+        return cls(centroids, len(vectors))
+
+    @property
+    def dimension(self) -> int:
+        return self.centroids.shape[0] * self.centroids.shape[2]
+
+    def _subvectors(self, vectors: np.ndarray):
+        width = self.centroids.shape[2]
+        for j in range(self.centroids.shape[0]):
+            yield j, vectors[:, j * width : (j + 1) * width]
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(vectors), self.centroids.shape[0]), dtype=np.uint8)
+        for start in range(0, len(vectors), SCAN_BLOCK_SIZE):
+            block = np.asarray(vectors[start : start + SCAN_BLOCK_SIZE], np.float32)
+            for j, part in self._subvectors(block):
+                codes[start : start + SCAN_BLOCK_SIZE, j] = nearest_centroids(
+                    part, self.centroids[j]
+                )
+        return codes
+
+    def products(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        # Table des produits requête·centroïde de chaque sous-espace, puis une somme de
+        # lectures dans la table par sous-vecteur (aucun vecteur n'est reconstitué)
+        products = np.zeros((len(queries), len(codes)), dtype=np.float32)
+        for j, part in self._subvectors(queries):
+            table = part @ self.centroids[j].T  # (b, 256)
+            products += table[:, codes[:, j]]
+        return products
+
+    def params(self) -> Dict[str, np.ndarray]:
+        return {"centroids": self.centroids}
+
+
+QUANTIZERS: Dict[str, Type[Quantizer]] = {
+    ScalarQuantizer.kind: ScalarQuantizer,
+    ProductQuantizer.kind: ProductQuantizer,
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class QuantizedVectors:
+    """Codes de tous les vecteurs du magasin, avec leurs normes exactes."""
+
+    quantizer: Quantizer
+    codes: np.ndarray  # (n, taille du code) uint8, éventuellement mappé en mémoire
+    norms: np.ndarray  # (n,) float32
+
+    @property
+    def kind(self) -> str:
+        return self.quantizer.kind
+
+    @property
+    def bytes_per_vector(self) -> float:
+        """Octets lus par vecteur lors du parcours du corpus (code et norme)."""
+        return self.codes.shape[1] + self.norms.itemsize if len(self.codes) else 0.0
+
+    def products(self, queries: np.ndarray) -> np.ndarray:
+        return self.quantizer.products(queries, self.codes)
+
+
+def reusable(
+    previous: QuantizedVectors | None, kind: str, dimension: int, count: int
+) -> bool:
+    """Vrai si le quantificateur de `previous` peut encoder un corpus de `count` vecteurs."""
+    return (
+        previous is not None
+        and previous.kind == kind
+        and previous.quantizer.dimension == dimension
+        and previous.quantizer.trained_on * 2 >= count
+    )
+
+
+def build(
+    kind: str,
+    vectors: np.ndarray,
+    previous: QuantizedVectors | None = None,
+    kept: np.ndarray | None = None,
+) -> QuantizedVectors:
+    """
+    Quantifie `vectors`. Si `previous` est du même type et que le corpus n'a pas doublé
+    depuis son apprentissage, son quantificateur est réutilisé ; les `len(kept)` premiers
+    vecteurs sont alors les lignes `kept` de `previous`, dont les codes sont recopiés.
+    """
+    if kind not in QUANTIZERS:
+        raise ValueError(f"Quantification inconnue : {kind}")
+    if not reusable(previous, kind, vectors.shape[1], len(vectors)):
+        quantizer = QUANTIZERS[kind].fit(vectors)  # type: ignore[attr-defined]
+        kept = None
+    else:
+        quantizer = previous.quantizer  # type: ignore[union-attr]
+    reused = 0 if kept is None else len(kept)
+    fresh = np.asarray(vectors[reused:], dtype=np.float32)
+    codes = quantizer.encode(fresh)
+    norms = np.linalg.norm(fresh, axis=1).astype(np.float32)
+    if reused:
+        codes = np.concatenate([previous.codes[kept], codes])  # type: ignore[union-attr]
+        norms = np.concatenate([previous.norms[kept], norms])  # type: ignore[union-attr]
+    return QuantizedVectors(quantizer, codes, norms)
+
+
+def save(directory: str, quantized: QuantizedVectors):
+    """Écrit les paramètres, les codes et les normes dans un dossier neuf."""
+    with open(os.path.join(directory, QUANTIZER_FILENAME), "wb") as f:
+        np.savez(
+            f,
+            kind=np.array(quantized.kind),
+            trained_on=np.array(quantized.quantizer.trained_on),
+            **quantized.quantizer.params(),
+        )
+    np.ascontiguousarray(quantized.codes).tofile(
+        os.path.join(directory, CODES_FILENAME)
+    )
+    np.asarray(quantized.norms, dtype=np.float32).tofile(
+        os.path.join(directory, NORMS_FILENAME)
+    )
+
+
+def append(directory: str, quantizer: Quantizer, vectors: np.ndarray, count: int):
+    """
+    Encode `vectors` avec le quantificateur enregistré et ajoute leurs codes et leurs normes
+    à la suite des `count` premiers (les octets au-delà, laissés par une écriture
+    interrompue, sont écrasés).
+    """
+    if not len(vectors):
+        return
+    vectors = np.asarray(vectors, dtype=np.float32)
+    for name, data in (
+        (CODES_FILENAME, quantizer.encode(vectors)),
+        (NORMS_FILENAME, np.linalg.norm(vectors, axis=1).astype(np.float32)),
+    ):
+        with open(os.path.join(directory, name), "r+b") as f:
+            f.truncate(count * (data.nbytes // len(data)))
+            f.seek(0, os.SEEK_END)
+            f.write(np.ascontiguousarray(data).tobytes())
+
+
+def load(directory: str, count: int, mmap: bool = True) -> QuantizedVectors | None:
+    """Les `count` premiers codes écrits par `save` et `append`, None s'ils sont absents."""
+    params_path = os.path.join(directory, QUANTIZER_FILENAME)
+    if not count or not os.path.exists(params_path):
+        return None
+    with np.load(params_path) as params:
+        kind = str(params["kind"])
+        trained_on = int(params["trained_on"])
+        if kind == ScalarQuantizer.kind:
+            quantizer: Quantizer = ScalarQuantizer(
+                params["offset"], params["scale"], trained_on
+            )
+            code_size = len(params["offset"])
+        else:
+            quantizer = ProductQuantizer(params["centroids"], trained_on)
+            code_size = params["centroids"].shape[0]
+    codes_path = os.path.join(directory, CODES_FILENAME)
+    norms_path = os.path.join(directory, NORMS_FILENAME)
+    # Codes écrits avant le fichier des normes : recalculés par l'appelant
+    if not os.path.exists(norms_path) or os.path.getsize(norms_path) < count * 4:
+        return None
+    shape = (count, code_size)
+    if mmap:
+        codes = np.memmap(codes_path, dtype=np.uint8, mode="r", shape=shape)
+        norms = np.memmap(norms_path, dtype=np.float32, mode="r", shape=(count,))
+    else:
+        codes = np.fromfile(codes_path, dtype=np.uint8, count=count * code_size)
+        codes = codes.reshape(shape)
+        norms = np.fromfile(norms_path, dtype=np.float32, count=count)
+    return QuantizedVectors(quantizer, codes, norms)
@@ -1,30 +1,64 @@
 # rag_core.py
 
-from typing import List
+from typing import Dict, List, Literal, Tuple
 import pydantic
 import os
+import threading
 import dotenv
-import chromadb.utils.embedding_functions
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+import metrics
+import tracing
+from chunking import merge_chunks
+from embedding_cache import CachedEmbeddings
+from ingestion import estimate_tokens
+from lexical_index import (
+    BM25Index,
+    reciprocal_rank_fusion,
+    INDEX_PATH as LEXICAL_INDEX_PATH,
+)
+from registry import registry
+from reranker import RERANK_OVERFETCH, get_reranker
+from snapshots import SNAPSHOT_DIR, SnapshotVectorStore
+from vector_store import (
+    NUMPY_STORE_DIR,
+    NUMPY_STORE_MMAP,
+    VECTOR_STORE,
+    ChromaVectorStore,
+    NumpyVectorStore,
+)
 
 dotenv.load_dotenv()
 
-# --- Initialisation unique des modèles et clients ---
+EMBEDDING_MODEL_NAME = "models/text-embedding-004"
+
+# --- Fabriques des modèles et clients ---
+# Les bibliothèques lourdes (chromadb, langchain_*) ne sont importées qu'à la création :
+# importer rag_core ne nécessite ni clé d'API ni base de données.
 
 
 def get_embedding_model():
     """Crée et retourne une instance du modèle d'embedding LangChain."""
-    return GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    return GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL_NAME)
+
+
+def get_cached_embedding_model():
+    """Retourne le modèle d'embedding enveloppé par le cache disque (database/embedding_cache)."""
+    return CachedEmbeddings(get_embedding_model(), model_name=EMBEDDING_MODEL_NAME)
 
 
 def get_embedding_model_openai():
     """Crée et retourne une instance du modèle d'embedding OpenAI."""
+    from langchain_openai import OpenAIEmbeddings
+
     return OpenAIEmbeddings(model="text-embedding-3-small")
 
 
 def get_chroma_client():
     """Crée et retourne une instance du client ChromaDB."""
+    import chromadb
+
     return chromadb.PersistentClient(
         path=os.path.join(os.getcwd(), "database", "chroma_db")
     )
@@ -32,6 +66,8 @@ def get_chroma_client():
 
 def get_llm():
     """Crée et retourne une instance du LLM."""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
     return ChatGoogleGenerativeAI(
         model="gemini-2.5-flash-preview-05-20",
         temperature=0.7,
@@ -40,25 +76,143 @@ def get_llm():
 
 def get_llm_openai():
     """Crée et retourne une instance du LLM OpenAI."""
+    from langchain_openai import ChatOpenAI
+
     return ChatOpenAI(
         model="gpt-4.1",
         temperature=0.7,
     )
 
 
-client = get_chroma_client()
-chroma_embedding_function = (
-    chromadb.utils.embedding_functions.ChromaLangchainEmbeddingFunction(
-        embedding_function=get_embedding_model()
+def get_chroma_embedding_function():
+    """Adapte le modèle d'embedding partagé au format attendu par Chroma."""
+    import chromadb.utils.embedding_functions
+
+    return chromadb.utils.embedding_functions.ChromaLangchainEmbeddingFunction(
+        embedding_function=registry.get("embedding_model")
     )
-)
 
-documents_collection = client.get_or_create_collection(
-    name="documents", embedding_function=chroma_embedding_function
-)
-titles_collection = client.get_or_create_collection(
-    name="titles", embedding_function=chroma_embedding_function
-)
+
+# --- Paramètres de l'index HNSW de Chroma (variables d'environnement) ---
+# L'espace de distance, `construction_ef` et `M` sont fixés à la création de la collection :
+# pour les changer sur une base existante, lancer `python create_database.py --rebuild-index`.
+# `search_ef` (compromis rappel / latence des requêtes) est appliqué à l'ouverture.
+HNSW_SPACE = os.getenv("HNSW_SPACE", "l2")  # "l2", "cosine" ou "ip"
+HNSW_CONSTRUCTION_EF = int(os.getenv("HNSW_CONSTRUCTION_EF", "100"))
+HNSW_SEARCH_EF = int(os.getenv("HNSW_SEARCH_EF", "100"))
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+
+
+def hnsw_metadata(
+    space: str = HNSW_SPACE,
+    construction_ef: int = HNSW_CONSTRUCTION_EF,
+    search_ef: int = HNSW_SEARCH_EF,
+    m: int = HNSW_M,
+) -> dict:
+    """Métadonnées de création d'une collection Chroma avec ces paramètres HNSW."""
+    return {
+        "hnsw:space": space,
+        "hnsw:construction_ef": construction_ef,
+        "hnsw:search_ef": search_ef,
+        "hnsw:M": m,
+    }
+
+
+def hnsw_settings(collection) -> dict:
+    """Paramètres HNSW effectifs d'une collection, au format de hnsw_metadata."""
+    hnsw = (getattr(collection, "configuration_json", None) or {}).get("hnsw") or {}
+    metadata = collection.metadata or {}
+    return {
+        "hnsw:space": hnsw.get("space", metadata.get("hnsw:space", "l2")),
+        "hnsw:construction_ef": hnsw.get(
+            "ef_construction", metadata.get("hnsw:construction_ef", 100)
+        ),
+        "hnsw:search_ef": hnsw.get("ef_search", metadata.get("hnsw:search_ef", 100)),
+        "hnsw:M": hnsw.get("max_neighbors", metadata.get("hnsw:M", 16)),
+    }
+
+
+def set_search_ef(collection, search_ef: int):
+    """
+    Modifie `search_ef` d'une collection existante, sans reconstruire l'index. Chroma ne
+    l'applique qu'au chargement de l'index : à appeler avant la première requête.
+    """
+    collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+
+
+def get_documents_collection():
+    # Chaque enregistrement est un passage d'un document (voir create_database.py). Ses métadonnées
+    # portent les titres du document ("title" : slug, "display_title" : nom affiché), renvoyés par
+    # la même requête que les contenus, et sa position dans le parent ("parent_id", "start", "end").
+    collection = registry.get("client").get_or_create_collection(
+        name="documents",
+        embedding_function=registry.get("chroma_embedding_function"),
+        metadata=hnsw_metadata(),
+    )
+    settings, expected = hnsw_settings(collection), hnsw_metadata()
+    if settings["hnsw:search_ef"] != expected["hnsw:search_ef"]:
+        set_search_ef(collection, expected["hnsw:search_ef"])
+    fixed = ("hnsw:space", "hnsw:construction_ef", "hnsw:M")
+    if any(settings[key] != expected[key] for key in fixed):
+        print(
+            "[ATTENTION] L'index HNSW de la base a été construit avec d'autres paramètres "
+            f"({', '.join(f'{k}={settings[k]}' for k in fixed)}). "
+            "Lancez `python create_database.py --rebuild-index` pour les appliquer."
+        )
+    return collection
+
+
+def get_vector_store():
+    """
+    Crée le magasin de vecteurs choisi par la variable d'environnement VECTOR_STORE :
+    la collection Chroma (par défaut), la matrice NumPy en recherche exacte, ou le dernier
+    snapshot publié, en lecture seule (snapshots.py).
+    """
+    if VECTOR_STORE == "snapshot":
+        return SnapshotVectorStore(SNAPSHOT_DIR, mmap=NUMPY_STORE_MMAP)
+    if VECTOR_STORE == "numpy":
+        return NumpyVectorStore(
+            NUMPY_STORE_DIR, space=HNSW_SPACE, mmap=NUMPY_STORE_MMAP
+        )
+    return ChromaVectorStore(lambda: registry.get("documents_collection"))
+
+
+# --- Ressources partagées, créées au premier usage (une instance par processus) ---
+
+registry.register("client", get_chroma_client)
+registry.register("embedding_model", get_cached_embedding_model)
+registry.register("chroma_embedding_function", get_chroma_embedding_function)
+registry.register("documents_collection", get_documents_collection)
+registry.register("vector_store", get_vector_store)
+registry.register("llm", get_llm)
+registry.register("reranker", lambda: get_reranker(idf=_lexical_idf))
+
+
+def __getattr__(name: str):
+    # Compatibilité : `rag_core.client`, `rag_core.documents_collection`... restent accessibles
+    if name in (
+        "client",
+        "embedding_model",
+        "chroma_embedding_function",
+        "documents_collection",
+        "vector_store",
+    ):
+        return registry.get(name)
+    raise AttributeError(f"module 'rag_core' has no attribute '{name}'")
+
+
+def warm_up(background: bool = False):
+    """Initialise à l'avance la base, les modèles et l'index lexical (au démarrage d'un serveur)."""
+
+    def run():
+        registry.warm_up(["vector_store", "llm"])
+        registry.get("vector_store").count()  # Ouvre la collection ou charge la matrice
+        get_lexical_index()
+
+    if background:
+        threading.Thread(target=run, name="warm-up", daemon=True).start()
+    else:
+        run()
 
 
 # Modèle de document
@@ -67,46 +221,488 @@ class Document(pydantic.BaseModel):
     rating: float
     title: str
     content: str
+    parent_id: str = (
+        ""  # Document source d'un passage (égal à `id` pour un document entier)
+    )
 
     def __hash__(self):
         return hash(self.id)
 
 
-# Fonction de retrieval
-def query(q: str, n_results: int) -> List[Document]:
-    document_results = documents_collection.query(
-        query_texts=[q],
-        n_results=n_results,
+def document_title(doc_id: str, metadata: dict | None) -> str:
+    """Titre d'affichage d'un document, à défaut son slug (qui était son titre historique)."""
+    metadata = metadata or {}
+    return metadata.get("display_title") or metadata.get("title") or doc_id
+
+
+class Hit:
+    """
+    Passage trouvé par une recherche, avant sa mise en forme en Document : identifiant, note
+    et métadonnées. Son texte (chaîne, référence paresseuse du magasin NumPy, ou None s'il
+    n'a pas été demandé) n'est décodé qu'au premier accès à `content` : seuls les passages
+    reclassés ou renvoyés sont lus, et un Document n'est créé que pour les résultats finaux.
+    """
+
+    __slots__ = ("id", "rating", "metadata", "_content")
+
+    def __init__(self, doc_id: str, rating: float, metadata: dict | None, content=None):
+        self.id = doc_id
+        self.rating = rating
+        self.metadata = metadata or {}
+        self._content = content
+
+    @property
+    def parent_id(self) -> str:
+        return self.metadata.get("parent_id", self.id)
+
+    @property
+    def title(self) -> str:
+        return document_title(self.id, self.metadata)
+
+    @property
+    def content(self) -> str:
+        if not isinstance(self._content, str):
+            self._content = "" if self._content is None else str(self._content)
+        return self._content
+
+    def rated(self, rating: float) -> "Hit":
+        return Hit(self.id, rating, self.metadata, self._content)
+
+    def document(self, content: bool = True) -> Document:
+        return Document(
+            id=self.id,
+            rating=self.rating,
+            title=self.title,
+            content=self.content if content else "",
+            parent_id=self.parent_id,
+        )
+
+
+# Nombre de passages demandés par document attendu en mode "parents"
+PARENT_OVERFETCH = 3
+
+# --- Index lexical (BM25), chargé au premier usage ---
+
+_lexical_index: BM25Index | None = None
+_lexical_index_key: Tuple[str, float] = ("", 0.0)
+_lexical_index_lock = threading.Lock()
+
+
+def lexical_index_path() -> str | None:
+    """Fichier de l'index BM25 : celui du snapshot servi en mode VECTOR_STORE=snapshot."""
+    if VECTOR_STORE == "snapshot":
+        return registry.get("vector_store").lexical_index_path()
+    return LEXICAL_INDEX_PATH
+
+
+def get_lexical_index() -> BM25Index | None:
+    """
+    Retourne l'index BM25 construit par create_database.py (None s'il n'existe pas).
+    Il est chargé au premier appel puis rechargé si le fichier a été reconstruit
+    (ou si un nouveau snapshot est servi).
+    """
+    global _lexical_index, _lexical_index_key
+    path = lexical_index_path()
+    try:
+        key = (path, os.path.getmtime(path))
+    except (OSError, TypeError):
+        return None
+    with _lexical_index_lock:
+        if _lexical_index is None or key != _lexical_index_key:
+            _lexical_index = BM25Index.load(path)
+            _lexical_index_key = key
+        return _lexical_index
+
+
+def _lexical_idf() -> Dict[str, float] | None:
+    index = get_lexical_index()
+    return index.idf if index is not None else None
+
+
+def collection_version() -> float:
+    """
+    Version de la base : date de la dernière reconstruction de l'index BM25, réécrit par
+    create_database.py dès qu'un document est ajouté, modifié ou supprimé (en mode snapshot,
+    celui de la version servie : elle change à chaque publication).
+    """
+    try:
+        return os.path.getmtime(lexical_index_path())
+    except (OSError, TypeError):
+        return 0.0
+
+
+def _lexical_hit(index: BM25Index, position: int, rating: float) -> Hit:
+    return Hit(
+        index.ids[position],
+        rating,
+        index.metadatas[position],
+        index.documents[position],
     )
-    if (
-        not document_results
-        or not document_results["ids"]
-        or not document_results["ids"][0]
+
+
+# --- Recherche ---
+
+
+def fetch_parents(parent_ids: List[str]) -> Dict[str, str]:
+    """Reconstitue le texte complet des documents parents à partir de leurs passages."""
+    with tracing.span("rag.fetch_parents", parents=len(parent_ids)) as span:
+        records = registry.get("vector_store").get(
+            parent_ids=parent_ids, include=["documents", "metadatas"]
+        )
+        span.set(passages=len(records["ids"]))
+    pieces: Dict[str, list] = {}
+    for content, metadata in zip(
+        records["documents"] or [], records["metadatas"] or []
+    ):
+        pieces.setdefault(metadata["parent_id"], []).append(  # type: ignore[arg-type]
+            (metadata["start"], metadata["end"], content)
+        )
+    return {parent_id: merge_chunks(chunks) for parent_id, chunks in pieces.items()}
+
+
+def embed_queries(queries: List[str], hybrid: bool = False) -> List[List[float] | None]:
+    """
+    Vectorise plusieurs requêtes en un seul appel au modèle d'embedding.
+    En mode hybride, les requêtes servies par l'index lexical (titre exact) ne sont pas
+    vectorisées et leur vecteur vaut None.
+    """
+    index = get_lexical_index() if hybrid else None
+    to_embed = [q for q in queries if index is None or not index.match_title(q)]
+    if not to_embed:
+        return [None] * len(queries)
+    with tracing.span(
+        "rag.embed",
+        queries=len(to_embed),
+        tokens=sum(estimate_tokens(q) for q in to_embed),
     ):
+        vectors = dict(
+            zip(to_embed, registry.get("embedding_model").embed_documents(to_embed))
+        )
+    return [vectors.get(q) for q in queries]
+
+
+def _result_hits(results: dict, i: int) -> List[Hit]:
+    """Passages de la `i`-ème requête d'un résultat de VectorStore.query."""
+    if not results or not results["ids"] or len(results["ids"]) <= i:
         return []
+    contents = results.get("documents")
+    return [
+        Hit(doc_id, round(distance, 2), metadata, contents[i][j] if contents else None)
+        for j, (doc_id, distance, metadata) in enumerate(
+            zip(results["ids"][i], results["distances"][i], results["metadatas"][i])
+        )
+    ]
+
+
+def vector_search_many(
+    query_embeddings: List[List[float]], n_results: int, content: bool = True
+) -> List[List[Hit]]:
+    """
+    Recherche vectorielle de plusieurs requêtes en un seul appel au magasin de vecteurs.
+    Sans `content`, le texte des passages n'est pas demandé au magasin.
+    """
+    include = ["distances", "metadatas"] + (["documents"] if content else [])
+    with tracing.span(
+        "rag.vector_search", queries=len(query_embeddings), n_results=n_results
+    ) as span:
+        results = registry.get("vector_store").query(
+            query_embeddings=query_embeddings, n_results=n_results, include=include
+        )
+        hits = [_result_hits(results, i) for i in range(len(query_embeddings))]
+        span.set(documents=sum(len(h) for h in hits))
+    return hits
+
+
+def vector_search(
+    q: str,
+    n_results: int,
+    query_embedding: List[float] | None = None,
+    content: bool = True,
+) -> List[Hit]:
+    """
+    Recherche vectorielle des passages les plus proches de la requête.
+    `query_embedding` évite de revectoriser une requête déjà vectorisée (voir embed_queries).
+    """
+    if query_embedding is None:
+        query_embedding = embed_queries([q])[0]
+    return vector_search_many([query_embedding], n_results, content)[0]  # type: ignore[list-item]
+
+
+def fuse_lexical(
+    index: BM25Index, q: str, vector_hits: List[Hit], n_results: int
+) -> List[Hit]:
+    """
+    Fusionne les classements vectoriel et BM25 par rang réciproque (RRF).
+    Un passage trouvé uniquement par BM25 reçoit la plus grande distance des résultats vectoriels.
+    """
+    with tracing.span("rag.lexical_search", n_results=n_results) as span:
+        lexical_hits = index.search(q, n_results)
+        span.set(documents=len(lexical_hits))
+    by_id = {hit.id: hit for hit in vector_hits}
+    positions = {index.ids[position]: position for position, _ in lexical_hits}
+    fallback_rating = max((h.rating for h in vector_hits), default=1.0)
+
+    fused = reciprocal_rank_fusion([list(by_id), list(positions)])
+    return [
+        by_id.get(doc_id) or _lexical_hit(index, positions[doc_id], fallback_rating)
+        for doc_id, _ in fused[:n_results]
+    ]
+
+
+def hybrid_search(
+    index: BM25Index,
+    q: str,
+    n_results: int,
+    query_embedding: List[float] | None = None,
+    content: bool = True,
+) -> List[Hit]:
+    """Recherche vectorielle fusionnée avec l'index BM25 (voir fuse_lexical)."""
+    return fuse_lexical(
+        index, q, vector_search(q, n_results, query_embedding, content), n_results
+    )
+
+
+def rerank_documents(q: str, hits: List[Hit], n_results: int) -> List[Hit]:
+    """
+    Reclasse les candidats et retire ceux dont le score est sous le seuil du modèle (voir
+    Reranker.select : au plus `n_results`, au moins RERANK_MIN_RESULTS). La note devient
+    1 - score : comme une distance, plus elle est basse, plus le passage est pertinent.
+    """
+    if not hits:
+        return hits
+    model = registry.get("reranker")
+    with (
+        metrics.timer("query.rerank"),
+        tracing.span("rag.rerank", candidates=len(hits)) as span,
+    ):
+        selected = model.select(q, [h.content for h in hits], n_results)
+        span.set(kept=len(selected))
+    return [hits[i].rated(round(1 - score, 2)) for i, score in selected]
 
-    doc_ids_ordered = document_results["ids"][0]
-    doc_distances_ordered = document_results["distances"][0]
-    doc_contents_ordered = document_results["documents"][0]
-
-    titles_data = titles_collection.get(ids=doc_ids_ordered)
-
-    title_map = {}
-    if titles_data and titles_data["ids"] and titles_data["documents"]:
-        for i in range(len(titles_data["ids"])):
-            title_map[titles_data["ids"][i]] = titles_data["documents"][i]
-
-    final_documents = []
-    for i in range(len(doc_ids_ordered)):
-        current_id = doc_ids_ordered[i]
-        current_title = title_map.get(current_id, "Titre non disponible")
-        final_documents.append(
-            Document(
-                id=current_id,
-                rating=round(doc_distances_ordered[i], 2),
-                title=current_title,
-                content=doc_contents_ordered[i],
+
+def best_parents(hits: List[Hit], n_results: int) -> List[Hit]:
+    """Le meilleur passage de chacun des `n_results` premiers documents parents."""
+    best_hits: Dict[str, Hit] = {}
+    for hit in hits:
+        best_hits.setdefault(hit.parent_id, hit)
+    return list(best_hits.values())[:n_results]
+
+
+def parent_documents(
+    parents: List[Hit], contents: Dict[str, str], content: bool = True
+) -> List[Document]:
+    return [
+        Document(
+            id=p.parent_id,
+            rating=p.rating,
+            title=p.title,
+            content=(contents.get(p.parent_id) or p.content) if content else "",
+            parent_id=p.parent_id,
+        )
+        for p in parents
+    ]
+
+
+def group_by_parent(
+    hits: List[Hit], n_results: int, content: bool = True
+) -> List[Document]:
+    """Un document entier par parent, au rang de son meilleur passage."""
+    parents = best_parents(hits, n_results)
+    contents = (
+        fetch_parents([p.parent_id for p in parents]) if parents and content else {}
+    )
+    return parent_documents(parents, contents, content)
+
+
+def candidate_counts(
+    n_results: int, mode: Literal["chunks", "parents"], rerank: bool
+) -> Tuple[int, int]:
+    """Candidats à récupérer, et à garder après reclassement, pour `n_results` résultats."""
+    kept = n_results * PARENT_OVERFETCH if mode == "parents" else n_results
+    return (kept * RERANK_OVERFETCH if rerank else kept), kept
+
+
+def needs_chunk_content(
+    mode: Literal["chunks", "parents"], rerank: bool, content: bool
+) -> bool:
+    """
+    Le texte des passages candidats n'est utile qu'au reclassement et aux passages renvoyés
+    en mode "chunks" : en mode "parents", le texte des documents est reconstitué à part.
+    """
+    return rerank or (content and mode == "chunks")
+
+
+def title_match_documents(
+    index: BM25Index,
+    positions: List[int],
+    n_results: int,
+    mode: Literal["chunks", "parents"],
+    content: bool = True,
+) -> List[Document]:
+    """Résultats d'une requête égale au titre d'un document, servie par l'index BM25."""
+    hits = [_lexical_hit(index, position, 0.0) for position in positions]
+    if mode == "chunks":
+        return [hit.document(content) for hit in hits[:n_results]]
+    parent = hits[0]
+    parent_content = (
+        merge_chunks(
+            (
+                index.metadatas[p].get("start", 0),
+                index.metadatas[p].get("end", 0),
+                h.content,
             )
+            for p, h in zip(positions, hits)
+        )
+        if content
+        else ""
+    )
+    return [
+        Document(
+            id=parent.parent_id,
+            rating=0.0,
+            title=parent.title,
+            content=parent_content,
+            parent_id=parent.parent_id,
         )
+    ]
+
+
+# Fonction de retrieval
+def query(
+    q: str,
+    n_results: int,
+    mode: Literal["chunks", "parents"] = "chunks",
+    hybrid: bool = False,
+    query_embedding: List[float] | None = None,
+    rerank: bool = False,
+    content: bool = True,
+) -> List[Document]:
+    """
+    Recherche les passages les plus proches de la requête.
+    `query_embedding` est le vecteur de la requête s'il a déjà été calculé (voir embed_queries).
+    En mode "parents", les passages sont regroupés par document source (dédupliqués,
+    classés par meilleur passage) et chaque document est renvoyé en entier.
+    En mode hybride, la recherche vectorielle est fusionnée avec l'index BM25 ; une requête
+    égale au titre d'un document est servie par l'index seul, sans appel d'embedding.
+    Avec `rerank`, davantage de candidats sont récupérés puis reclassés (voir reranker.py) :
+    ceux qui n'atteignent pas le seuil de pertinence sont retirés, si bien que moins de
+    `n_results` documents peuvent être renvoyés (au moins RERANK_MIN_RESULTS).
+    Sans `content`, les documents sont renvoyés avec un contenu vide et aucun texte n'est lu
+    ni décodé (évaluation de la recherche, qui ne compare que les identifiants).
+    """
+    with tracing.span(
+        "rag.query", n_results=n_results, mode=mode, hybrid=hybrid, rerank=rerank
+    ) as span:
+        documents = _query(q, n_results, mode, hybrid, query_embedding, rerank, content)
+        span.set(documents=len(documents))
+    return documents
+
+
+def _query(
+    q: str,
+    n_results: int,
+    mode: Literal["chunks", "parents"],
+    hybrid: bool,
+    query_embedding: List[float] | None,
+    rerank: bool,
+    content: bool,
+) -> List[Document]:
+    candidates, kept_candidates = candidate_counts(n_results, mode, rerank)
+    index = get_lexical_index() if hybrid else None
+
+    if index is not None and (positions := index.match_title(q)):
+        tracing.current().set(title_match=True)
+        return title_match_documents(index, positions, n_results, mode, content)
+
+    chunk_content = needs_chunk_content(mode, rerank, content)
+    if index is not None:
+        hits = hybrid_search(index, q, candidates, query_embedding, chunk_content)
+    else:
+        hits = vector_search(q, candidates, query_embedding, chunk_content)
+    if rerank:
+        hits = rerank_documents(q, hits, kept_candidates)
+
+    if mode == "chunks":
+        return [hit.document(content) for hit in hits]
+    return group_by_parent(hits, n_results, content)
+
+
+def query_many(
+    queries: List[str],
+    n_results: int | List[int],
+    mode: Literal["chunks", "parents"] = "chunks",
+    hybrid: bool = False,
+    query_embeddings: List[List[float] | None] | None = None,
+    rerank: bool = False,
+    content: bool = True,
+) -> List[List[Document]]:
+    """
+    Comme `query`, pour plusieurs requêtes à la fois : les résultats sont renvoyés dans
+    l'ordre des requêtes. `n_results` est commun ou donné pour chaque requête.
+    Les requêtes sont vectorisées en un seul appel au modèle d'embedding et cherchées en
+    un seul appel au magasin de vecteurs ; en mode "parents", le texte des documents est
+    reconstitué en une seule lecture pour l'union des documents trouvés.
+    """
+    counts = n_results if isinstance(n_results, list) else [n_results] * len(queries)
+    results: List[List[Document]] = [[] for _ in queries]
+    with tracing.span(
+        "rag.query_many", queries=len(queries), mode=mode, hybrid=hybrid, rerank=rerank
+    ) as span:
+        index = get_lexical_index() if hybrid else None
+        searched = []
+        for i, q in enumerate(queries):
+            if index is not None and (positions := index.match_title(q)):
+                results[i] = title_match_documents(
+                    index, positions, counts[i], mode, content
+                )
+            else:
+                searched.append(i)
+        span.set(title_matches=len(queries) - len(searched))
+        if not searched:
+            return results
+
+        embeddings = [
+            query_embeddings[i] if query_embeddings else None for i in searched
+        ]
+        # Seules les requêtes sans vecteur précalculé sont vectorisées
+        missing = [j for j, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            vectors = embed_queries([queries[searched[j]] for j in missing])
+            for j, vector in zip(missing, vectors):
+                embeddings[j] = vector
+        candidates = [candidate_counts(counts[i], mode, rerank) for i in searched]
+        # Les k plus proches sont les premiers des max(k) plus proches
+        vector_lists = vector_search_many(
+            embeddings,  # type: ignore[arg-type]
+            max(c for c, _ in candidates),
+            needs_chunk_content(mode, rerank, content),
+        )
+
+        hit_lists = []
+        for i, (wanted, kept), hits in zip(searched, candidates, vector_lists):
+            hits = hits[:wanted]
+            if index is not None:
+                hits = fuse_lexical(index, queries[i], hits, wanted)
+            if rerank:
+                hits = rerank_documents(queries[i], hits, kept)
+            hit_lists.append(hits)
+
+        if mode == "parents":
+            parent_lists = [
+                best_parents(hits, counts[i]) for i, hits in zip(searched, hit_lists)
+            ]
+            parent_ids = {p.parent_id for parents in parent_lists for p in parents}
+            contents = (
+                fetch_parents(sorted(parent_ids)) if parent_ids and content else {}
+            )
+            document_lists = [
+                parent_documents(p, contents, content) for p in parent_lists
+            ]
+        else:
+            document_lists = [
+                [hit.document(content) for hit in hits] for hits in hit_lists
+            ]
 
-    return final_documents
+        for i, documents in zip(searched, document_lists):
+            results[i] = documents
+    return results
@@ -0,0 +1,109 @@
+"""
+Registre des ressources partagées du processus (client Chroma, modèles, collections...).
+
+Chaque ressource est déclarée par une fabrique et n'est créée qu'au premier `get`, une seule
+fois par processus, même si plusieurs threads la demandent en même temps. Les reruns
+Streamlit, les threads de l'API et les modules d'un même processus partagent donc les mêmes
+instances, et importer un module ne crée aucune connexion. Chaque point d'entrée (app.py,
+api.py, evaluation.py, create_database.py) est un processus distinct, avec son propre
+registre : seuls les fichiers sur disque (base, cache d'embeddings) sont partagés entre eux.
+
+`override` remplace une ressource par une autre instance (ex : un embedding local pour
+les benchmarks ou les tests), sans toucher aux fabriques. Les ressources déjà créées qui en
+dépendent (ex : la collection et son embedding) ne sont pas recréées : le remplacement doit
+donc être fait avant leur premier usage.
+"""
+
+from typing import Any, Callable, Dict, Iterable, Iterator
+import contextlib
+import threading
+import time
+
+
+class ResourceRegistry:
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        """Déclare la fabrique d'une ressource (appelée au premier `get`)."""
+        with self._lock:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str) -> Any:
+        """Retourne l'instance de la ressource, créée au premier appel."""
+        try:
+            return self._instances[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._factories:
+                raise KeyError(f"Ressource inconnue : '{name}'")
+            lock = self._locks[name]
+        # Un verrou par ressource : une fabrique lente ne bloque pas les autres
+        with lock:
+            if name not in self._instances:
+                self._instances[name] = self._factories[name]()
+            return self._instances[name]
+
+    def is_ready(self, name: str) -> bool:
+        return name in self._instances
+
+    @contextlib.contextmanager
+    def override(self, name: str, instance: Any) -> Iterator[Any]:
+        """Remplace temporairement une ressource par `instance`."""
+        with self._lock:
+            missing = object()
+            previous = self._instances.get(name, missing)
+            self._instances[name] = instance
+        try:
+            yield instance
+        finally:
+            with self._lock:
+                if previous is missing:
+                    self._instances.pop(name, None)
+                else:
+                    self._instances[name] = previous
+
+    def reset(self, name: str | None = None):
+        """Oublie une instance (ou toutes) : elle sera recréée au prochain `get`."""
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+            else:
+                self._instances.pop(name, None)
+
+    def warm_up(
+        self, names: Iterable[str] | None = None, background: bool = False
+    ) -> threading.Thread | None:
+        """
+        Crée les ressources à l'avance (toutes par défaut), pour ne pas faire payer leur
+        initialisation à la première requête. En arrière-plan, retourne le thread lancé.
+        """
+        names = list(self._factories if names is None else names)
+
+        def run():
+            for name in names:
+                if self.is_ready(name):
+                    continue
+                start = time.perf_counter()
+                try:
+                    self.get(name)
+                except Exception as e:
+                    print(f"[ATTENTION] Initialisation de '{name}' impossible : {e}")
+                    continue
+                print(f"'{name}' prêt en {time.perf_counter() - start:.2f}s.")
+
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, name="warm-up", daemon=True)
+        thread.start()
+        return thread
+
+
+# Registre unique du processus
+registry = ResourceRegistry()
@@ -0,0 +1,143 @@
+"""
+Reclassement (rerank) des passages candidats après la recherche.
+
+La recherche renvoie plus de candidats que demandé ; chaque candidat reçoit ici un score
+de pertinence entre 0 et 1 pour la requête. Seuls les candidats au-dessus du seuil du
+modèle sont gardés, classés par score : le prompt reçoit moins de passages, et moins de
+bruit. Les RERANK_MIN_RESULTS mieux notés sont gardés même sous le seuil, pour qu'une
+question mal couverte par le corpus reçoive encore un contexte (voir
+rag_core.query(..., rerank=True)).
+
+Deux modèles sont disponibles :
+- `LexicalReranker` (par défaut) : part des termes de la requête présents dans le passage,
+  pondérés par leur rareté dans le corpus quand l'index BM25 est disponible ;
+- `CrossEncoderReranker` : un petit cross-encoder exécuté sur CPU, si
+  sentence-transformers est installé (`RERANKER=cross-encoder`).
+
+Les candidats sont notés par lots, en parallèle dans un pool de threads partagé (créé au
+premier usage, voir registry.py).
+"""
+
+from typing import Callable, Dict, List, Tuple
+import abc
+import concurrent.futures
+import math
+import os
+
+from lexical_index import tokenize
+from registry import registry
+
+# --- CONFIGURATION ---
+RERANK_OVERFETCH = 3  # Candidats récupérés par résultat demandé
+RERANK_BATCH_SIZE = 16
+RERANK_WORKERS = 4
+RERANK_MIN_RESULTS = 2  # Candidats gardés même sous le seuil (les mieux notés)
+LEXICAL_CUTOFF = 0.25
+CROSS_ENCODER_CUTOFF = 0.1
+CROSS_ENCODER_MODEL = os.getenv(
+    "RERANKER_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+)
+
+registry.register(
+    "rerank_executor",
+    lambda: concurrent.futures.ThreadPoolExecutor(
+        max_workers=RERANK_WORKERS, thread_name_prefix="rerank"
+    ),
+)
+
+
+class Reranker(abc.ABC):
+    cutoff = 0.0
+
+    @abc.abstractmethod
+    def score_batch(self, q: str, texts: List[str]) -> List[float]:
+        """Scores d'un lot de passages (entre 0 et 1)."""
+
+    def score(self, q: str, texts: List[str]) -> List[float]:
+        """Scores des passages (entre 0 et 1), calculés par lots dans le pool de threads."""
+        batches = [
+            texts[start : start + RERANK_BATCH_SIZE]
+            for start in range(0, len(texts), RERANK_BATCH_SIZE)
+        ]
+        if len(batches) <= 1:
+            return self.score_batch(q, texts) if texts else []
+        scores: List[float] = []
+        executor = registry.get("rerank_executor")
+        for batch_scores in executor.map(lambda b: self.score_batch(q, b), batches):
+            scores.extend(batch_scores)
+        return scores
+
+    def select(
+        self,
+        q: str,
+        texts: List[str],
+        n_results: int,
+        min_results: int = RERANK_MIN_RESULTS,
+    ) -> List[Tuple[int, float]]:
+        """
+        Positions et scores des passages gardés, par score décroissant (ordre de la recherche
+        entre ex aequo) : ceux qui atteignent le seuil, au plus `n_results`, et au moins les
+        `min_results` mieux notés.
+        """
+        ranked = sorted(
+            enumerate(self.score(q, texts)), key=lambda item: item[1], reverse=True
+        )
+        confident = sum(1 for _, score in ranked if score >= self.cutoff)
+        return ranked[: min(n_results, max(confident, min_results))]
+
+
+class LexicalReranker(Reranker):
+    """Couverture des termes de la requête, pondérée par l'IDF de l'index BM25."""
+
+    cutoff = LEXICAL_CUTOFF
+
+    def __init__(self, idf: Callable[[], Dict[str, float] | None] = lambda: None):
+        self.idf = idf
+
+    def score_batch(self, q: str, texts: List[str]) -> List[float]:
+        terms = set(tokenize(q))
+        if not terms:
+            return [0.0] * len(texts)
+        idf = self.idf() or {}
+        # Un terme absent du corpus est aussi rare que possible
+        default_weight = max(idf.values(), default=1.0)
+        weights = {term: idf.get(term, default_weight) for term in terms}
+        total = sum(weights.values())
+        scores = []
+        for text in texts:
+            present = terms & set(tokenize(text))
+            scores.append(sum(weights[t] for t in present) / total)
+        return scores
+
+
+class CrossEncoderReranker(Reranker):
+    """Cross-encoder (requête, passage) de sentence-transformers, exécuté sur CPU."""
+
+    cutoff = CROSS_ENCODER_CUTOFF
+
+    def __init__(self, model_name: str = CROSS_ENCODER_MODEL):
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name, device="cpu", max_length=512)
+
+    def score_batch(self, q: str, texts: List[str]) -> List[float]:
+        logits = self.model.predict(
+            [(q, text) for text in texts], batch_size=RERANK_BATCH_SIZE
+        )
+        return [1 / (1 + math.exp(-float(logit))) for logit in logits]
+
+
+def get_reranker(idf: Callable[[], Dict[str, float] | None] = lambda: None) -> Reranker:
+    """
+    Crée le reranker choisi par la variable d'environnement RERANKER ("lexical" par défaut,
+    ou "cross-encoder"). Sans sentence-transformers, le reranker lexical est utilisé.
+    """
+    if os.getenv("RERANKER", "lexical") == "cross-encoder":
+        try:
+            return CrossEncoderReranker()
+        except ImportError:
+            print(
+                "[ATTENTION] sentence-transformers n'est pas installé : "
+                "utilisation du reranker lexical."
+            )
+    return LexicalReranker(idf)
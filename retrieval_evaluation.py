@@ -0,0 +1,162 @@
+"""
+Évaluation de la recherche seule (sans LLM) : recall@k, MRR, nDCG@k et latence.
+
+Chaque question de 'evaluation.csv' (écrit par data_scrapper.py) est envoyée à
+rag_core.query pour chaque valeur de k, et les documents renvoyés sont comparés aux
+fichiers attendus de la colonne `source_ideale` ("vi.txt;jinx.txt"). Les vecteurs des
+questions sont conservés par le cache d'embedding : après une première exécution, on peut
+comparer des réglages de recherche (hybride, mode, découpage...) en quelques secondes,
+sans appel à l'API.
+
+Les métriques portent sur les documents sources : chaque résultat compte pour son document
+parent, et les k premiers résultats bruts sont évalués tels quels. En mode "chunks", deux
+passages d'un même document occupent donc deux rangs, le second sans être compté comme
+pertinent : le recall@k, le MRR et le nDCG@k ne sont pas gonflés par la déduplication.
+
+Usage :
+    python retrieval_evaluation.py [--k 1 3 5 10] [--mode parents] [--no-hybrid]
+"""
+
+from typing import Dict, List, Sequence, Set
+import argparse
+import math
+import os
+import time
+
+import pandas as pd
+
+import rag_core
+from eval_utils import latency_summary, save_results
+
+# --- CONFIGURATION ---
+EVALUATION_FILE_PATH = os.path.join("dataset_rag_lol_definitive", "evaluation.csv")
+K_VALUES = [1, 3, 5, 10]
+
+
+def expected_sources(cell: str) -> Set[str]:
+    """IDs des documents attendus : "vi.txt;jinx.txt" -> {"vi", "jinx"}."""
+    return {
+        os.path.splitext(name.strip())[0].lower()
+        for name in str(cell).split(";")
+        if name.strip()
+    }
+
+
+def ranked_sources(documents: List[rag_core.Document]) -> List[str | None]:
+    """
+    ID du document source de chaque résultat, dans l'ordre du classement ; un document déjà
+    vu est remplacé par None (il garde son rang mais n'est pas compté une seconde fois).
+    """
+    seen: Set[str] = set()
+    ranking: List[str | None] = []
+    for document in documents:
+        source = document.parent_id or document.id
+        ranking.append(None if source in seen else source)
+        seen.add(source)
+    return ranking
+
+
+def recall_at_k(ranking: Sequence[str | None], relevant: Set[str], k: int) -> float:
+    return len(set(ranking[:k]) & relevant) / len(relevant) if relevant else 0.0
+
+
+def reciprocal_rank(ranking: Sequence[str | None], relevant: Set[str], k: int) -> float:
+    for rank, doc_id in enumerate(ranking[:k], start=1):
+        if doc_id in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def ndcg_at_k(ranking: Sequence[str | None], relevant: Set[str], k: int) -> float:
+    """nDCG à pertinence binaire."""
+    dcg = sum(
+        1.0 / math.log2(rank + 1)
+        for rank, doc_id in enumerate(ranking[:k], start=1)
+        if doc_id in relevant
+    )
+    ideal = sum(
+        1.0 / math.log2(rank + 1) for rank in range(1, min(len(relevant), k) + 1)
+    )
+    return dcg / ideal if ideal else 0.0
+
+
+def evaluate_retrieval(
+    eval_df: pd.DataFrame, k_values: List[int], mode: str, hybrid: bool
+) -> Dict[int, dict]:
+    """
+    Calcule les métriques moyennes et la latence de rag_core.query pour chaque k.
+    Seuls les identifiants sont comparés : les textes ne sont pas lus (content=False).
+    """
+    results = {}
+    for k in k_values:
+        recalls, reciprocal_ranks, ndcgs, latencies = [], [], [], []
+        for _, row in eval_df.iterrows():
+            relevant = expected_sources(row["source_ideale"])
+            start = time.perf_counter()
+            documents = rag_core.query(
+                row["question"], k, mode=mode, hybrid=hybrid, content=False  # type: ignore[arg-type]
+            )
+            latencies.append(time.perf_counter() - start)
+            ranking = ranked_sources(documents)
+            recalls.append(recall_at_k(ranking, relevant, k))
+            reciprocal_ranks.append(reciprocal_rank(ranking, relevant, k))
+            ndcgs.append(ndcg_at_k(ranking, relevant, k))
+        results[k] = {
+            "recall": sum(recalls) / len(recalls),
+            "mrr": sum(reciprocal_ranks) / len(reciprocal_ranks),
+            "ndcg": sum(ndcgs) / len(ndcgs),
+            "latency": latency_summary(latencies),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--k", type=int, nargs="+", default=K_VALUES)
+    parser.add_argument("--mode", choices=["parents", "chunks"], default="parents")
+    parser.add_argument(
+        "--no-hybrid",
+        dest="hybrid",
+        action="store_false",
+        help="Recherche vectorielle seule (sans fusion BM25).",
+    )
+    parser.add_argument("--file", default=EVALUATION_FILE_PATH)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        print(f"[ERREUR] Le fichier '{args.file}' n'a pas été trouvé.")
+        print("Veuillez d'abord exécuter 'python data_scrapper.py' pour le créer.")
+        return
+    eval_df = pd.read_csv(args.file)
+    print(
+        f"{len(eval_df)} questions, mode '{args.mode}', "
+        f"recherche {'hybride' if args.hybrid else 'vectorielle'}."
+    )
+
+    results = evaluate_retrieval(eval_df, sorted(args.k), args.mode, args.hybrid)
+    print(
+        f"\n{'k':>4} | {'recall':>7} | {'MRR':>7} | {'nDCG':>7} | p50 (ms) | p95 (ms)"
+    )
+    for k, r in results.items():
+        print(
+            f"{k:>4} | {r['recall']:7.3f} | {r['mrr']:7.3f} | {r['ndcg']:7.3f} | "
+            f"{r['latency']['p50_ms']:8.1f} | {r['latency']['p95_ms']:8.1f}"
+        )
+
+    path = save_results(
+        "retrieval",
+        {
+            "parameters": {
+                "file": args.file,
+                "questions": len(eval_df),
+                "mode": args.mode,
+                "hybrid": args.hybrid,
+            },
+            "results": {str(k): r for k, r in results.items()},
+        },
+    )
+    print(f"\nRésultats enregistrés dans {path}")
+
+
+if __name__ == "__main__":
+    main()
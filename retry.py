@@ -0,0 +1,111 @@
+"""
+Relance des appels réseau avec attente exponentielle et gigue aléatoire.
+"""
+
+from typing import Awaitable, Callable, Tuple, Type, TypeVar
+import asyncio
+import random
+import time
+
+T = TypeVar("T")
+
+# --- PARAMETRES PAR DÉFAUT ---
+DEFAULT_RETRIES = 5
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 30.0
+# Un quota dépassé se résorbe plus lentement qu'une erreur réseau
+RATE_LIMIT_BASE_DELAY = 10.0
+RATE_LIMIT_MAX_DELAY = 60.0
+
+_RATE_LIMIT_MARKERS = ("429", "rate limit", "ratelimit", "quota", "resourceexhausted")
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Indique si l'erreur signale un dépassement de quota de l'API (HTTP 429)."""
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status == 429:
+        return True
+    text = f"{type(error).__name__} {error}".lower().replace("_", " ")
+    return any(marker in text for marker in _RATE_LIMIT_MARKERS)
+
+
+def backoff_delay(
+    attempt: int,
+    base_delay: float = DEFAULT_BASE_DELAY,
+    max_delay: float = DEFAULT_MAX_DELAY,
+) -> float:
+    """Délai avant la tentative suivante : exponentiel, plafonné, avec gigue complète."""
+    return random.uniform(0, min(max_delay, base_delay * (2**attempt)))
+
+
+def retry_delay(
+    error: BaseException, attempt: int, base_delay: float, max_delay: float
+) -> Tuple[float, bool]:
+    """
+    Délai avant la relance qui suit `error`, et si l'erreur est un dépassement de quota.
+    Un délai imposé par le serveur (attribut `retry_after`, en-tête Retry-After) est respecté.
+    """
+    rate_limited = is_rate_limited(error)
+    if rate_limited:
+        delay = backoff_delay(
+            attempt,
+            max(base_delay, RATE_LIMIT_BASE_DELAY),
+            max(max_delay, RATE_LIMIT_MAX_DELAY),
+        )
+    else:
+        delay = backoff_delay(attempt, base_delay, max_delay)
+    return max(delay, getattr(error, "retry_after", None) or 0.0), rate_limited
+
+
+def call_with_retry(
+    fn: Callable[[], T],
+    retries: int = DEFAULT_RETRIES,
+    base_delay: float = DEFAULT_BASE_DELAY,
+    max_delay: float = DEFAULT_MAX_DELAY,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+    description: str = "appel",
+) -> T:
+    """
+    Exécute `fn` et le relance en cas d'exception (au plus `retries` relances).
+    Après un dépassement de quota (HTTP 429), les attentes sont plus longues (RATE_LIMIT_*).
+    La dernière exception est propagée si toutes les tentatives échouent.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except retry_on as e:
+            if attempt == retries:
+                raise
+            delay, rate_limited = retry_delay(e, attempt, base_delay, max_delay)
+            print(
+                f"[AVERTISSEMENT] Échec de {description} "
+                f"({'quota dépassé' if rate_limited else e}), "
+                f"nouvelle tentative dans {delay:.1f}s ({attempt + 1}/{retries})."
+            )
+            time.sleep(delay)
+    raise AssertionError("unreachable")
+
+
+async def acall_with_retry(
+    fn: Callable[[], Awaitable[T]],
+    retries: int = DEFAULT_RETRIES,
+    base_delay: float = DEFAULT_BASE_DELAY,
+    max_delay: float = DEFAULT_MAX_DELAY,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+    description: str = "appel",
+) -> T:
+    """Version asynchrone de call_with_retry : `fn` retourne une coroutine, l'attente ne bloque pas."""
+    for attempt in range(retries + 1):
+        try:
+            return await fn()
+        except retry_on as e:
+            if attempt == retries:
+                raise
+            delay, rate_limited = retry_delay(e, attempt, base_delay, max_delay)
+            print(
+                f"[AVERTISSEMENT] Échec de {description} "
+                f"({'quota dépassé' if rate_limited else e}), "
+                f"nouvelle tentative dans {delay:.1f}s ({attempt + 1}/{retries})."
+            )
+            await asyncio.sleep(delay)
+    raise AssertionError("unreachable")
@@ -0,0 +1,192 @@
+"""
+Cache sémantique des réponses du chat.
+
+Une réponse est associée à la question qui l'a demandée : le vecteur de la dernière
+question de l'utilisateur, et celui des HISTORY_TURNS messages qui la précèdent. Une
+question assez proche (similarité cosinus >= `threshold`), posée après un historique
+assez proche (>= `history_threshold`), reçoit la réponse en cache, rejouée token par
+token : une reformulation de la même question évite la génération. Le vecteur de
+l'historique empêche une relance (« Et sa sœur ? ») de recevoir la réponse donnée dans
+une autre conversation ; seuls les derniers tours comptent, pas la conversation entière.
+
+Seuls le prompt et le modèle (`context`) doivent être identiques, et le cache est vidé
+lorsque la base est reconstruite (voir rag_core.collection_version).
+"""
+
+from typing import AsyncIterator, Callable, Iterator, List, Sequence
+import collections
+import dataclasses
+import hashlib
+import re
+import threading
+import time
+
+import numpy as np
+from langchain_core.messages import AIMessageChunk, BaseMessage
+
+import metrics
+
+# --- CONFIGURATION ---
+SIMILARITY_THRESHOLD = 0.9  # Dernière question
+HISTORY_THRESHOLD = 0.85  # Messages qui la précèdent
+HISTORY_TURNS = 4  # Messages précédant la question pris en compte
+TTL_SECONDS = 3600
+CAPACITY = 1000
+
+_REPLAY_TOKEN_RE = re.compile(r"\s*\S+\s*")
+
+
+@dataclasses.dataclass
+class ConversationKey:
+    context: str  # hash du prompt et du modèle, comparé exactement
+    question: np.ndarray  # vecteur normalisé de la dernière question
+    # Vecteur normalisé des messages qui précèdent la question, None sans historique
+    history: np.ndarray | None
+
+
+@dataclasses.dataclass
+class CachedAnswer:
+    key: ConversationKey
+    answer: str
+    generation_seconds: float  # durée de la génération évitée à chaque hit
+    created_at: float
+
+
+def _normalize(vector: Sequence[float]) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def conversation_key(
+    conversation: Sequence[BaseMessage],
+    embed: Callable[[List[str]], Sequence[Sequence[float]]],
+    *context: str,
+    turns: int = HISTORY_TURNS,
+) -> ConversationKey:
+    """
+    Clé d'une conversation : hash du contexte de la génération (prompt, nom du modèle...),
+    vecteurs de la dernière question de l'utilisateur et des `turns` messages qui la
+    précèdent, obtenus en un seul appel à `embed`.
+    """
+    h = hashlib.sha256()
+    for part in context:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    last = max(
+        (i for i, m in enumerate(conversation) if m.type == "human"),
+        default=len(conversation) - 1,
+    )
+    texts = [str(conversation[last].content)]
+    history = conversation[max(0, last - turns) : last]
+    if history:
+        texts.append("\n".join(f"{m.type}: {m.content}" for m in history))
+    vectors = embed(texts)
+    return ConversationKey(
+        context=h.hexdigest(),
+        question=_normalize(vectors[0]),
+        history=_normalize(vectors[1]) if history else None,
+    )
+
+
+def replay(answer: str) -> Iterator[AIMessageChunk]:
+    """Rejoue une réponse en cache sous forme de flux de tokens (un mot par morceau)."""
+    for token in _REPLAY_TOKEN_RE.findall(answer):
+        yield AIMessageChunk(content=token)
+
+
+async def areplay(answer: str) -> AsyncIterator[AIMessageChunk]:
+    """Version asynchrone de `replay`."""
+    for chunk in replay(answer):
+        yield chunk
+
+
+class SemanticCache:
+    """Cache LRU des réponses, avec seuil de similarité et durée de vie."""
+
+    def __init__(
+        self,
+        threshold: float = SIMILARITY_THRESHOLD,
+        history_threshold: float = HISTORY_THRESHOLD,
+        ttl: float = TTL_SECONDS,
+        capacity: int = CAPACITY,
+        version: Callable[[], object] = lambda: None,
+    ):
+        self.threshold = threshold
+        self.history_threshold = history_threshold
+        self.ttl = ttl
+        self.capacity = capacity
+        self.version = version
+        self._version = version()
+        self._entries: collections.OrderedDict[int, CachedAnswer] = (
+            collections.OrderedDict()
+        )
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _check_version(self):
+        """Vide le cache si la base a changé depuis sa création (verrou déjà pris)."""
+        current = self.version()
+        if current != self._version:
+            self._entries.clear()
+            self._version = current
+
+    def _matches(self, entry: ConversationKey, key: ConversationKey) -> bool:
+        if entry.context != key.context:
+            return False
+        if float(np.dot(entry.question, key.question)) < self.threshold:
+            return False
+        if entry.history is None or key.history is None:
+            return entry.history is None and key.history is None
+        return float(np.dot(entry.history, key.history)) >= self.history_threshold
+
+    def lookup(self, key: ConversationKey) -> str | None:
+        """Retourne la réponse en cache d'une question assez proche, ou None."""
+        now = time.time()
+        with self._lock:
+            self._check_version()
+            for entry_key, entry in list(self._entries.items()):
+                if now - entry.created_at > self.ttl:
+                    del self._entries[entry_key]
+                    continue
+                if self._matches(entry.key, key):
+                    self._entries.move_to_end(entry_key)
+                    self.hits += 1
+                    metrics.increment("semantic_cache.hits")
+                    metrics.increment(
+                        "semantic_cache.saved_seconds", entry.generation_seconds
+                    )
+                    return entry.answer
+            self.misses += 1
+            metrics.increment("semantic_cache.misses")
+            return None
+
+    def store(self, key: ConversationKey, answer: str, generation_seconds: float):
+        """Enregistre une réponse générée ; l'entrée la moins récemment utilisée est évincée."""
+        if not answer:
+            return
+        with self._lock:
+            self._check_version()
+            self._entries[self._next_key] = CachedAnswer(
+                key=key,
+                answer=answer,
+                generation_seconds=generation_seconds,
+                created_at=time.time(),
+            )
+            self._next_key += 1
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
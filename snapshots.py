@@ -0,0 +1,277 @@
+"""
+Snapshots immuables et versionnés de l'index, pour les serveurs en lecture seule.
+
+create_database.py (ou pipeline.py) construit la base comme d'habitude, puis `publish`
+en fige une copie dans SNAPSHOT_DIR/<version>/ :
+- CURRENT et un sous-dossier de version : les passages au format du magasin NumPy
+  (vector_store.py), avec les codes de quantification si VECTOR_QUANTIZATION est activée
+  (quantization.py) ;
+- bm25_index.json : l'index lexical correspondant ;
+- manifest.json : version, nombre de passages, dimension, espace de distance, quantification,
+  sha256 des fichiers (chemins relatifs au dossier de la version).
+Le dossier est écrit sous un nom temporaire puis renommé, et le fichier CURRENT (le nom de
+la version servie) est remplacé en dernier : un lecteur ne voit jamais de snapshot incomplet.
+Les SNAPSHOT_KEEP dernières versions sont conservées.
+
+Les serveurs utilisent `SnapshotVectorStore` (VECTOR_STORE=snapshot) : la version courante
+est mappée en mémoire en lecture seule, sans SQLite ni verrou, et CURRENT est relu toutes les
+POLL_INTERVAL secondes ; une nouvelle version est chargée puis remplace l'ancienne sans
+redémarrage. Plusieurs réplicas peuvent ainsi partager un même volume monté en lecture seule.
+"""
+
+from typing import Dict, List
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from vector_store import VECTOR_QUANTIZATION, NumpyVectorStore, VectorStore
+
+# --- CONFIGURATION ---
+SNAPSHOT_DIR = os.getenv(
+    "SNAPSHOT_DIR", os.path.join(os.getcwd(), "database", "snapshots")
+)
+SNAPSHOT_KEEP = 3  # Versions conservées (la courante comprise)
+POLL_INTERVAL = 2.0  # Secondes entre deux lectures de CURRENT
+EXPORT_BATCH_SIZE = 5000  # Passages lus par appel au magasin source
+
+CURRENT_FILENAME = "CURRENT"
+MANIFEST_FILENAME = "manifest.json"
+LEXICAL_FILENAME = "bm25_index.json"
+
+
+def current_version(root: str = SNAPSHOT_DIR) -> str | None:
+    """Version servie (contenu de CURRENT), None si aucun snapshot n'a été publié."""
+    try:
+        with open(os.path.join(root, CURRENT_FILENAME), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def load_manifest(root: str, version: str) -> dict:
+    with open(
+        os.path.join(root, version, MANIFEST_FILENAME), "r", encoding="utf-8"
+    ) as f:
+        return json.load(f)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def walk_files(directory: str) -> List[str]:
+    """Chemins de tous les fichiers de `directory` et de ses sous-dossiers."""
+    return [
+        os.path.join(parent, name)
+        for parent, _, names in os.walk(directory)
+        for name in names
+    ]
+
+
+def export_records(store: VectorStore, batch_size: int = EXPORT_BATCH_SIZE) -> dict:
+    """Tous les passages du magasin, triés par id (un même contenu donne les mêmes fichiers)."""
+    ids: List[str] = []
+    documents: List[str] = []
+    metadatas: List[dict] = []
+    vectors: List[np.ndarray] = []
+    for offset in range(0, store.count(), batch_size):
+        page = store.get(
+            include=["documents", "metadatas", "embeddings"],
+            limit=batch_size,
+            offset=offset,
+        )
+        ids += page["ids"]
+        documents += page["documents"]
+        metadatas += page["metadatas"]
+        vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+    order = sorted(range(len(ids)), key=ids.__getitem__)
+    matrix = np.concatenate(vectors) if vectors else np.zeros((0, 0), np.float32)
+    return {
+        "ids": [ids[i] for i in order],
+        "documents": [documents[i] for i in order],
+        # Clés triées : Chroma ne rend pas les métadonnées dans un ordre stable
+        "metadatas": [dict(sorted(metadatas[i].items())) for i in order],
+        "embeddings": matrix[order] if len(order) else matrix,
+    }
+
+
+def publish(
+    store: VectorStore,
+    lexical_index_path: str,
+    space: str,
+    root: str = SNAPSHOT_DIR,
+    keep: int = SNAPSHOT_KEEP,
+    quantization: str = VECTOR_QUANTIZATION,
+) -> str:
+    """
+    Fige le contenu de `store` et l'index BM25 dans une nouvelle version et la rend courante.
+    Si le contenu est identique à la version courante, rien n'est publié. Retourne la version.
+    """
+    start_time = time.time()
+    records = export_records(store)
+    if not records["ids"]:
+        raise ValueError("La base est vide : aucun snapshot publié.")
+    os.makedirs(root, exist_ok=True)
+    staging = os.path.join(root, f".staging-{os.getpid()}-{int(start_time)}")
+    shutil.rmtree(staging, ignore_errors=True)
+    NumpyVectorStore(staging, space=space, mmap=False, quantization=quantization).add(
+        **records
+    )
+    shutil.copyfile(lexical_index_path, os.path.join(staging, LEXICAL_FILENAME))
+
+    # Tous les fichiers écrits (vecteurs, textes, codes éventuels, index lexical)
+    files = {
+        os.path.relpath(path, staging): file_sha256(path)
+        for path in sorted(walk_files(staging))
+    }
+    content_hash = hashlib.sha256(
+        json.dumps(files, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    current = current_version(root)
+    if current and load_manifest(root, current).get("content_hash") == content_hash:
+        shutil.rmtree(staging)
+        print(f"Snapshot inchangé : la version '{current}' reste servie.")
+        return current
+
+    version = f"{time.strftime('%Y%m%d-%H%M%S')}-{content_hash[:8]}"
+    manifest = {
+        "version": version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "chunks": len(records["ids"]),
+        "dim": int(records["embeddings"].shape[1]),
+        "space": space,
+        "quantization": quantization,
+        "content_hash": content_hash,
+        "files": files,
+    }
+    with open(os.path.join(staging, MANIFEST_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    for path in walk_files(staging):
+        os.chmod(path, 0o444)
+    os.rename(staging, os.path.join(root, version))
+
+    pointer = os.path.join(root, CURRENT_FILENAME)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(pointer + ".tmp", pointer)
+    print(
+        f"Snapshot '{version}' publié ({manifest['chunks']} passages) "
+        f"en {time.time() - start_time:.2f}s."
+    )
+    prune(root, keep)
+    return version
+
+
+def list_versions(root: str = SNAPSHOT_DIR) -> List[str]:
+    """Versions publiées, de la plus ancienne à la plus récente."""
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name
+        for name in os.listdir(root)
+        if not name.startswith(".")
+        and os.path.isfile(os.path.join(root, name, MANIFEST_FILENAME))
+    )
+
+
+def prune(root: str = SNAPSHOT_DIR, keep: int = SNAPSHOT_KEEP):
+    """Supprime les versions les plus anciennes (jamais la version courante)."""
+    current = current_version(root)
+    for version in list_versions(root)[:-keep] if keep > 0 else []:
+        if version == current:
+            continue
+        path = os.path.join(root, version)
+        # Les fichiers sont en lecture seule : les dossiers, eux, sont modifiables
+        shutil.rmtree(path, ignore_errors=True)
+        print(f"Ancien snapshot supprimé : '{version}'.")
+
+
+class SnapshotVectorStore(VectorStore):
+    """
+    Magasin en lecture seule sur la version courante de SNAPSHOT_DIR (voir le docstring du
+    module). Les écritures lèvent PermissionError : la base se construit avec create_database.py
+    (VECTOR_STORE=chroma ou numpy) puis se publie avec --snapshot.
+    """
+
+    def __init__(
+        self,
+        root: str = SNAPSHOT_DIR,
+        mmap: bool = True,
+        poll_interval: float = POLL_INTERVAL,
+    ):
+        self.root = root
+        self.mmap = mmap
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._version: str | None = None
+        self._store: NumpyVectorStore | None = None
+        self._checked = 0.0
+
+    def _current(self) -> NumpyVectorStore:
+        now = time.monotonic()
+        if self._store is not None and now - self._checked < self.poll_interval:
+            return self._store
+        with self._lock:
+            self._checked = now
+            version = current_version(self.root)
+            if version != self._version or self._store is None:
+                self._store = self._open(version)
+                if self._version is not None:
+                    print(f"Snapshot '{version}' chargé (remplace '{self._version}').")
+                self._version = version
+            return self._store
+
+    def _open(self, version: str | None) -> NumpyVectorStore:
+        """Charge une version en entier avant de la servir : le remplacement est instantané."""
+        if version is None:
+            return NumpyVectorStore(os.path.join(self.root, ".empty"), mmap=self.mmap)
+        manifest = load_manifest(self.root, version)
+        store = NumpyVectorStore(
+            os.path.join(self.root, version),
+            space=manifest["space"],
+            mmap=self.mmap,
+            quantization=manifest.get("quantization", "none"),
+        )
+        store.count()
+        return store
+
+    @property
+    def version(self) -> str | None:
+        self._current()
+        return self._version
+
+    def lexical_index_path(self) -> str | None:
+        """Index BM25 de la version courante."""
+        version = self.version
+        return os.path.join(self.root, version, LEXICAL_FILENAME) if version else None
+
+    def count(self) -> int:
+        return self._current().count()
+
+    def get(self, ids=None, parent_ids=None, include=("documents", "metadatas"), limit=None, offset=0):  # type: ignore[override]
+        return self._current().get(ids, parent_ids, include, limit, offset)
+
+    def query(self, query_embeddings, n_results, include=("documents", "distances", "metadatas")):  # type: ignore[override]
+        return self._current().query(query_embeddings, n_results, include)
+
+    def _read_only(self, *args, **kwargs):
+        raise PermissionError(
+            "Le magasin de snapshots est en lecture seule : construire la base avec "
+            "VECTOR_STORE=chroma ou numpy, puis publier avec --snapshot."
+        )
+
+    add = update = delete = _read_only  # type: ignore[assignment]
+
+
+def snapshot_summary(root: str = SNAPSHOT_DIR) -> Dict[str, dict]:
+    """Manifeste de chaque version publiée."""
+    return {version: load_manifest(root, version) for version in list_versions(root)}
@@ -4,8 +4,28 @@ from langchain_core.messages import AIMessage, HumanMessage, AIMessageChunk
 # Configuration de la page
 st.set_page_config(page_title="Chroniqueur de Runeterra", page_icon="📜", layout="wide")
 
-import inference
-import rag_core as core
+import api_client
+
+# Avec API_URL, l'interface n'est qu'un client de l'API (api.py) : la recherche et le LLM
+# tournent dans le service, qui peut avoir plusieurs réplicas.
+if api_client.API_URL:
+    chat = api_client.chat
+    search = api_client.search
+else:
+    import inference
+    import rag_core as core
+
+    @st.cache_resource
+    def warm_up():
+        """Initialise la base et les modèles une seule fois par processus, en arrière-plan."""
+        core.warm_up(background=True)
+
+    warm_up()
+    chat = inference.chat
+
+    def search(q: str, n_results: int):
+        return core.query(q, n_results, mode="parents", hybrid=True)
+
 
 # Initialisation des états de session
 if "chat_messages" not in st.session_state:
@@ -56,7 +76,7 @@ with tab_chat:
                     for msg in st.session_state.chat_messages
                     if isinstance(msg, (HumanMessage, AIMessage))
                 ]
-                response_generator = inference.chat(conversation_history)
+                response_generator = chat(conversation_history)
                 sources_for_storage = []
 
                 def stream_handler(generator):
@@ -131,7 +151,7 @@ with tab_search:
             st.warning("Veuillez entrer une requête de recherche.")
         else:
             with st.spinner("Recherche en cours..."):
-                results = core.query(search_query, n_results)
+                results = search(search_query, n_results)
 
             if not results:
                 st.info("Aucun document trouvé pour cette requête.")
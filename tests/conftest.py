@@ -0,0 +1,123 @@
+"""
+Fixtures des tests : un site local qui imite la liste des champions du wiki et les pages
+de universe.leagueoflegends.com, pour tester le scrapper sans réseau.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+import collections
+import hashlib
+import html
+import threading
+
+import pytest
+
+LORE_PAGES = {
+    "garen": "Garen est un fier soldat de Demacia.",
+    "jinx": "Jinx sème le chaos entre Piltover et Zaun.",
+}
+
+
+class FakeLoreSite:
+    """
+    Sert la liste des champions de `pages` et une page de lore par slug (un slug inconnu,
+    comme une région, reçoit un texte générique). Chaque page de lore porte un ETag, et une
+    requête conditionnelle sur une page inchangée reçoit 304. `statuses` compte les réponses.
+    """
+
+    def __init__(self, pages: Dict[str, str]):
+        self.pages = pages
+        self.statuses: collections.Counter = collections.Counter()
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+
+    def champion_list(self) -> bytes:
+        cells = "".join(
+            f'<tr><td data-sort-value="{html.escape(slug)}">'
+            f'<a href="/wiki/{slug}/LoL">{html.escape(slug)}</a></td></tr>'
+            for slug in sorted(self.pages)
+        )
+        return (
+            '<html><body><h2><span id="List_of_Available_Champions">Champions</span></h2>'
+            f'<table class="article-table">{cells}</table></body></html>'
+        ).encode("utf-8")
+
+    def lore_page(self, slug: str) -> bytes:
+        content = self.pages.get(slug, f"Histoire de {slug}.")
+        return (
+            f'<html><head><meta name="description" content="{html.escape(content)}">'
+            "</head><body></body></html>"
+        ).encode("utf-8")
+
+    def respond(self, handler: BaseHTTPRequestHandler):
+        parts = [p for p in handler.path.split("/") if p]
+        etag = None
+        if handler.path.startswith("/wiki/List_of_champions"):
+            status, body = 200, self.champion_list()
+        elif len(parts) >= 3 and parts[0] == "fr_FR":
+            body = self.lore_page(parts[-1])
+            etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+            status = 304 if handler.headers.get("If-None-Match") == etag else 200
+        else:
+            status, body = 404, b""
+        if status == 304:
+            body = b""
+
+        handler.send_response(status)
+        if etag:
+            handler.send_header("ETag", etag)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+        with self._lock:
+            self.statuses[str(status)] += 1
+
+    def reset_statuses(self) -> Dict[str, int]:
+        """Retourne puis remet à zéro le nombre de réponses par code HTTP."""
+        with self._lock:
+            statuses = dict(self.statuses)
+            self.statuses.clear()
+        return statuses
+
+    def start(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def do_GET(self):
+                site.respond(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    @property
+    def base_url(self) -> str:
+        assert self._server is not None
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    @property
+    def champion_list_url(self) -> str:
+        return f"{self.base_url}/wiki/List_of_champions"
+
+    @property
+    def universe_url(self) -> str:
+        return f"{self.base_url}/fr_FR"
+
+
+@pytest.fixture
+def lore_site():
+    """Site local de deux champions, démarré pour la durée du test."""
+    site = FakeLoreSite(dict(LORE_PAGES))
+    site.start()
+    yield site
+    site.stop()
@@ -0,0 +1,64 @@
+"""
+Tests du client HTTP du scrapper (http_fetcher.py, data_scrapper.py), contre un site local
+(fixture `lore_site`, voir conftest.py) : aucune requête ne sort de la machine.
+
+    uv run pytest tests
+"""
+
+import asyncio
+import os
+
+import pytest
+
+import data_scrapper
+from http_fetcher import HostLimiter
+
+
+def scrape(site) -> dict:
+    """Un passage complet du scrapper ; retourne les réponses envoyées par le site."""
+    assert asyncio.run(
+        data_scrapper.scrape_knowledge_base(site.champion_list_url, site.universe_url)
+    )
+    return site.reset_statuses()
+
+
+def scraped_files() -> dict:
+    """Date de modification des fichiers scrapés (le lore manuel est réécrit à chaque passage)."""
+    directory = data_scrapper.KNOWLEDGE_BASE_DIR
+    return {
+        name: os.stat(os.path.join(directory, name)).st_mtime_ns
+        for name in os.listdir(directory)
+        if name[: -len(".txt")] not in data_scrapper.MANUAL_LORE_DATA
+    }
+
+
+def test_second_pass_skips_unchanged_pages(lore_site, tmp_path, monkeypatch):
+    # data_scrapper écrit dans des chemins relatifs au dossier courant
+    monkeypatch.chdir(tmp_path)
+    pages = len(lore_site.pages) + len(data_scrapper.REGIONS)
+    assert scrape(lore_site) == {"200": pages + 1}
+    files = scraped_files()
+
+    # Pages demandées avec If-None-Match : seule la liste des champions est renvoyée
+    assert scrape(lore_site) == {"200": 1, "304": pages}
+
+    assert scraped_files() == files
+    path = os.path.join(data_scrapper.KNOWLEDGE_BASE_DIR, "garen.txt")
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == lore_site.pages["garen"]
+
+
+def test_cancelled_rate_limit_wait_releases_slot():
+    async def scenario():
+        limiter = HostLimiter(concurrency=1, rate=1.0)
+        async with limiter:
+            pass
+        # La requête suivante attend sa place dans le débit (1 s) en tenant le sémaphore
+        waiting = asyncio.create_task(limiter.__aenter__())
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        await asyncio.wait_for(limiter.semaphore.acquire(), timeout=0.5)
+
+    asyncio.run(scenario())
@@ -0,0 +1,44 @@
+"""
+Tests de la sélection des candidats par le reranker (reranker.py).
+
+    uv run pytest tests
+"""
+
+from reranker import LexicalReranker
+
+QUESTION = "Quelle est l'arme de Garen ?"
+PASSAGES = [
+    "Jinx est une criminelle de Zaun qui sème le chaos à Piltover.",
+    "Garen, soldat de Demacia, manie une épée immense : son arme ne le quitte jamais.",
+    "Les marchés de Bilgewater vendent du poisson.",
+    "Garen mène l'avant-garde intrépide de Demacia.",
+]
+
+
+def test_low_score_candidates_are_dropped():
+    reranker = LexicalReranker()
+    scores = reranker.score(QUESTION, PASSAGES)
+    assert scores[0] < reranker.cutoff and scores[2] < reranker.cutoff
+
+    selected = reranker.select(QUESTION, PASSAGES, n_results=4, min_results=1)
+
+    assert [i for i, _ in selected] == [1, 3]
+    assert all(score >= reranker.cutoff for _, score in selected)
+
+
+def test_floor_keeps_best_candidates_below_cutoff():
+    reranker = LexicalReranker()
+    question = "Qui gouverne Noxus ?"
+
+    selected = reranker.select(question, PASSAGES, n_results=4, min_results=2)
+
+    assert len(selected) == 2
+    assert all(score < reranker.cutoff for _, score in selected)
+
+
+def test_at_most_n_results():
+    reranker = LexicalReranker()
+
+    selected = reranker.select(QUESTION, PASSAGES, n_results=1, min_results=2)
+
+    assert [i for i, _ in selected] == [1]
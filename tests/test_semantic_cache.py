@@ -0,0 +1,73 @@
+"""
+Tests du cache sémantique des réponses (semantic_cache.py), avec un modèle d'embedding
+factice : chaque mot connu pointe vers l'axe d'un thème, si bien que deux formulations
+d'une même question ont le même vecteur.
+
+    uv run pytest tests
+"""
+
+from typing import List
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from lexical_index import tokenize
+from semantic_cache import SemanticCache, conversation_key
+
+THEMES = {
+    "garen": 0,
+    "arme": 1,
+    "epee": 1,
+    "jinx": 2,
+    "nee": 3,
+    "origine": 3,
+    "frere": 4,
+}
+
+
+def embed(texts: List[str]) -> List[List[float]]:
+    vectors = []
+    for text in texts:
+        vector = [0.0] * (len(THEMES) + 1)
+        vector[-1] = 0.1  # aucun texte n'a un vecteur nul
+        for term in tokenize(text):
+            if term in THEMES:
+                vector[THEMES[term]] += 1.0
+        vectors.append(vector)
+    return vectors
+
+
+def key(*messages: str, context: str = "prompt"):
+    conversation = [
+        (HumanMessage if i % 2 == 0 else AIMessage)(content=text)
+        for i, text in enumerate(messages)
+    ]
+    return conversation_key(conversation, embed, context)
+
+
+def test_paraphrase_hits_and_unrelated_question_misses():
+    cache = SemanticCache()
+    cache.store(key("Quelle est l'arme de Garen ?"), "Une épée.", 1.0)
+
+    assert cache.lookup(key("Avec quelle épée Garen se bat-il ?")) == "Une épée."
+    assert cache.lookup(key("Où est née Jinx ?")) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_context_and_history_must_match():
+    cache = SemanticCache()
+    cache.store(
+        key("Qui est Jinx ?", "Une criminelle.", "Et son frère ?"), "Aucun.", 1.0
+    )
+
+    assert (
+        cache.lookup(key("Qui est Jinx ?", "Une criminelle.", "Et son frère, alors ?"))
+        == "Aucun."
+    )
+    assert cache.lookup(key("Et son frère ?")) is None
+    assert cache.lookup(key("Qui est Garen ?", "Un soldat.", "Et son frère ?")) is None
+    assert (
+        cache.lookup(
+            key("Qui est Jinx ?", "Une criminelle.", "Et son frère ?", context="autre")
+        )
+        is None
+    )
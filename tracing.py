@@ -0,0 +1,393 @@
+"""
+Traces des étapes du système RAG : chaque étape (planification par le LLM, embedding,
+recherche vectorielle, BM25, reclassement, génération de la réponse...) est un « span »
+avec sa durée, son span parent et des attributs (tokens estimés, nombre de documents...).
+
+    with tracing.span("rag.vector_search", n_results=5) as span:
+        ...
+        span.set(documents=len(results))
+
+Les traces sont activées par la variable d'environnement TRACING, une liste séparée par
+des virgules :
+- `jsonl` : un span par ligne dans TRACE_FILE (traces/spans.jsonl par défaut) ;
+- `otel` : export OpenTelemetry (OTLP), si opentelemetry-sdk et
+  opentelemetry-exporter-otlp sont installés ; l'adresse du collecteur se règle avec les
+  variables standard OTEL_EXPORTER_OTLP_*.
+
+Sans TRACING, `span` renvoie un objet partagé qui ne fait rien (ni horloge, ni
+identifiant, ni écriture) : le coût se limite à un appel de fonction par étape.
+
+Le span courant est porté par une variable de contexte : il suit les coroutines et
+`asyncio.to_thread`. Pour un pool de threads, soumettre la tâche avec
+`contextvars.copy_context().run`.
+
+Résumé des étapes les plus coûteuses :
+    python tracing.py [--file traces/spans.jsonl] [--top 20] [--slowest 1]
+"""
+
+from typing import Dict, List
+import abc
+import argparse
+import atexit
+import collections
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+
+# --- CONFIGURATION ---
+TRACING = os.getenv("TRACING", "")
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join("traces", "spans.jsonl"))
+SERVICE_NAME = "lo17-rag"
+
+
+class Exporter(abc.ABC):
+    def start(self, span: "Span"):
+        pass
+
+    @abc.abstractmethod
+    def end(self, span: "Span"):
+        """Reçoit chaque span terminé."""
+
+
+class JsonlExporter(Exporter):
+    """Ajoute chaque span terminé au fichier, une ligne JSON par span."""
+
+    def __init__(self, path: str = TRACE_FILE):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+        atexit.register(self.close)
+
+    def end(self, span: "Span"):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class OpenTelemetryExporter(Exporter):
+    """Recopie les spans vers OpenTelemetry (OTLP par HTTP, envoi par lots)."""
+
+    def __init__(self):
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        self.provider = TracerProvider(
+            resource=Resource.create({"service.name": SERVICE_NAME})
+        )
+        self.provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        self.tracer = self.provider.get_tracer(__name__)
+        self._set_span_in_context = trace.set_span_in_context
+        self._error = trace.Status(trace.StatusCode.ERROR)
+        self._spans: Dict[str, object] = {}
+        atexit.register(self.provider.shutdown)
+
+    def start(self, span: "Span"):
+        parent = self._spans.get(span.parent_id) if span.parent_id else None
+        self._spans[span.span_id] = self.tracer.start_span(
+            span.name,
+            context=self._set_span_in_context(parent) if parent else None,  # type: ignore[arg-type]
+            start_time=int(span.start * 1e9),
+        )
+
+    def end(self, span: "Span"):
+        otel_span = self._spans.pop(span.span_id, None)
+        if otel_span is None:
+            return
+        for key, value in span.attributes.items():
+            otel_span.set_attribute(  # type: ignore[attr-defined]
+                key, value if isinstance(value, (bool, int, float, str)) else str(value)
+            )
+        if span.status == "error":
+            otel_span.set_status(self._error)  # type: ignore[attr-defined]
+        otel_span.end(end_time=int((span.start + span.duration) * 1e9))  # type: ignore[attr-defined]
+
+
+_exporters: List[Exporter] = []
+_current: contextvars.ContextVar["Span | None"] = contextvars.ContextVar(
+    "tracing_span", default=None
+)
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Span:
+    """Étape mesurée ; à utiliser comme contexte (voir `span`)."""
+
+    __slots__ = (
+        "name",
+        "attributes",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "start",
+        "duration",
+        "status",
+        "error",
+        "_perf_start",
+        "_token",
+    )
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self.duration = 0.0
+        self.status = "ok"
+        self.error = None
+
+    def set(self, **attributes):
+        """Ajoute ou remplace des attributs du span."""
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> "Span":
+        parent = _current.get()
+        self.trace_id = parent.trace_id if parent else _new_id(128)
+        self.parent_id = parent.span_id if parent else None
+        self.span_id = _new_id(64)
+        self.start = time.time()
+        self._perf_start = time.perf_counter()
+        self._token = _current.set(self)
+        for exporter in _exporters:
+            exporter.start(self)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.duration = time.perf_counter() - self._perf_start
+        if exc_type is not None:
+            # Générateur fermé ou tâche annulée : l'étape n'est pas en erreur
+            self.status = "error" if issubclass(exc_type, Exception) else "cancelled"
+            self.error = f"{exc_type.__name__}: {exc}"
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Générateur refermé depuis un autre contexte que celui de son ouverture
+            pass
+        for exporter in _exporters:
+            exporter.end(self)
+
+    def to_dict(self) -> dict:
+        record = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration * 1000,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+class _NoopSpan:
+    """Span des traces désactivées : ne mesure rien et n'enregistre rien."""
+
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **attributes) -> Span | _NoopSpan:
+    """Span de l'étape `name`, enfant du span courant (voir le docstring du module)."""
+    if not _exporters:
+        return _NOOP
+    return Span(name, attributes)
+
+
+def current() -> Span | _NoopSpan:
+    """Span courant, pour y ajouter des attributs depuis une fonction appelée."""
+    return (_current.get() or _NOOP) if _exporters else _NOOP
+
+
+def enabled() -> bool:
+    return bool(_exporters)
+
+
+def configure(*exporters: Exporter):
+    """Remplace les exportateurs ; sans argument, désactive les traces."""
+    _exporters[:] = exporters
+
+
+def exporters_from_env(modes: str = TRACING) -> List[Exporter]:
+    """Exportateurs demandés par TRACING ("jsonl", "otel" ou "jsonl,otel")."""
+    exporters: List[Exporter] = []
+    for mode in filter(None, (m.strip().lower() for m in modes.split(","))):
+        if mode == "jsonl":
+            exporters.append(JsonlExporter())
+        elif mode == "otel":
+            try:
+                exporters.append(OpenTelemetryExporter())
+            except ImportError:
+                print(
+                    "[ATTENTION] opentelemetry-sdk ou opentelemetry-exporter-otlp n'est "
+                    "pas installé : export OpenTelemetry désactivé."
+                )
+        else:
+            print(f"[ATTENTION] Mode de trace inconnu ignoré : '{mode}'.")
+    return exporters
+
+
+configure(*exporters_from_env())
+
+
+# --- Résumé des traces (CLI) ---
+
+
+def load_spans(path: str = TRACE_FILE) -> List[dict]:
+    spans = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                spans.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # Ligne tronquée (processus interrompu pendant l'écriture)
+    return spans
+
+
+def self_times(spans: List[dict]) -> Dict[str, float]:
+    """
+    Temps propre de chaque span (ms) : sa durée moins celle de ses enfants. Des enfants
+    exécutés en parallèle peuvent dépasser la durée du parent : le temps propre vaut alors 0.
+    """
+    children_ms: Dict[str, float] = collections.defaultdict(float)
+    for s in spans:
+        if s["parent_id"]:
+            children_ms[s["parent_id"]] += s["duration_ms"]
+    return {
+        s["span_id"]: max(0.0, s["duration_ms"] - children_ms[s["span_id"]])
+        for s in spans
+    }
+
+
+def _percentile(ordered: List[float], p: float) -> float:
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def summarize(spans: List[dict]) -> List[dict]:
+    """Statistiques par nom d'étape, de la plus coûteuse (temps propre total) à la moins coûteuse."""
+    own = self_times(spans)
+    by_name: Dict[str, List[dict]] = collections.defaultdict(list)
+    for s in spans:
+        by_name[s["name"]].append(s)
+    rows = []
+    for name, group in by_name.items():
+        durations = sorted(s["duration_ms"] for s in group)
+        totals: Dict[str, float] = collections.defaultdict(float)
+        for s in group:
+            for key, value in s["attributes"].items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    totals[key] += value
+        rows.append(
+            {
+                "name": name,
+                "count": len(group),
+                "errors": sum(s["status"] == "error" for s in group),
+                "self_ms": sum(own[s["span_id"]] for s in group),
+                "p50_ms": _percentile(durations, 50),
+                "p95_ms": _percentile(durations, 95),
+                "mean_attributes": {
+                    key: total / len(group) for key, total in totals.items()
+                },
+            }
+        )
+    return sorted(rows, key=lambda row: row["self_ms"], reverse=True)
+
+
+def print_summary(spans: List[dict], top: int = 20):
+    roots = [s for s in spans if not s["parent_id"]]
+    total_ms = sum(s["duration_ms"] for s in roots) or 1.0
+    print(
+        f"{len(spans)} spans, {len(roots)} traces, {total_ms / 1000:.2f}s au total.\n"
+        f"{'étape':<26}{'appels':>8}{'erreurs':>9}{'temps propre':>14}{'part':>7}"
+        f"{'p50':>10}{'p95':>10}   attributs (moyenne)"
+    )
+    for row in summarize(spans)[:top]:
+        attributes = ", ".join(
+            f"{key}={value:g}" for key, value in sorted(row["mean_attributes"].items())
+        )
+        print(
+            f"{row['name']:<26}{row['count']:>8}{row['errors']:>9}"
+            f"{row['self_ms'] / 1000:>13.2f}s{row['self_ms'] / total_ms:>7.0%}"
+            f"{row['p50_ms']:>8.1f}ms{row['p95_ms']:>8.1f}ms   {attributes}"
+        )
+
+
+def print_trace(spans: List[dict], trace_id: str):
+    """Arbre des spans d'une trace, avec la durée et les attributs de chaque étape."""
+    trace = [s for s in spans if s["trace_id"] == trace_id]
+    children: Dict[str | None, List[dict]] = collections.defaultdict(list)
+    for s in sorted(trace, key=lambda s: s["start"]):
+        children[s["parent_id"]].append(s)
+    origin = min((s["start"] for s in trace), default=0.0)
+
+    def walk(parent_id: str | None, depth: int):
+        for s in children[parent_id]:
+            attributes = " ".join(f"{k}={v}" for k, v in s["attributes"].items())
+            status = "" if s["status"] == "ok" else f" [{s['status']}]"
+            print(
+                f"{(s['start'] - origin) * 1000:>8.1f}ms {'  ' * depth}{s['name']} "
+                f"{s['duration_ms']:.1f}ms{status}  {attributes}"
+            )
+            walk(s["span_id"], depth + 1)
+
+    walk(None, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Résumé des traces du système RAG.")
+    parser.add_argument("--file", default=TRACE_FILE, help="Fichier JSONL des spans.")
+    parser.add_argument("--top", type=int, default=20, help="Nombre d'étapes listées.")
+    parser.add_argument(
+        "--slowest",
+        type=int,
+        default=1,
+        help="Nombre de traces les plus lentes affichées en détail.",
+    )
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        print(f"[ERREUR] Aucune trace dans '{args.file}' (lancer avec TRACING=jsonl).")
+        return
+    spans = load_spans(args.file)
+    print_summary(spans, args.top)
+    roots = sorted(
+        (s for s in spans if not s["parent_id"]),
+        key=lambda s: s["duration_ms"],
+        reverse=True,
+    )
+    for root in roots[: args.slowest]:
+        print(
+            f"\nTrace {root['trace_id']} ({root['name']}, {root['duration_ms']:.0f} ms) :"
+        )
+        print_trace(spans, root["trace_id"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,787 @@
+"""
+Stockage des passages vectorisés, derrière une interface commune (`VectorStore`).
+
+rag_core.query et create_database.py utilisent le moteur choisi par la variable
+d'environnement VECTOR_STORE :
+- "chroma" (par défaut) : la collection 'documents' de ChromaDB (SQLite + index HNSW) ;
+- "numpy" : une matrice float32 contiguë ("vectors.f32", mappée en mémoire), une ligne
+  JSON d'identifiant et de métadonnées par passage ("records.jsonl") et les textes dans un
+  blob UTF-8 (docstore.py), dans un sous-dossier de version de database/numpy_store désigné
+  par le fichier CURRENT (voir NumpyVectorStore). La recherche est exacte (top-k par
+  `argpartition`) ; pour quelques milliers de passages, elle est plus rapide que l'index
+  HNSW et le démarrage ne charge ni SQLite, ni l'index, ni les textes. Avec
+  VECTOR_QUANTIZATION ("int8" ou "pq", voir quantization.py), la recherche parcourt des
+  codes de 1 octet par dimension (ou par sous-vecteur) au lieu de la matrice float32, puis
+  recalcule la distance exacte des QUANTIZATION_RESCORE × k meilleurs candidats.
+
+Les résultats suivent le format de Chroma ({"ids": [...], "documents": [...], ...}, une
+liste par requête pour `query`) pour que les deux moteurs soient interchangeables. Seule
+différence : les "documents" de `query` peuvent être des références paresseuses
+(docstore.ContentRef) plutôt que des chaînes ; `str(document)` donne le texte dans les deux cas.
+"""
+
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Sequence, Tuple
+import abc
+import contextlib
+import dataclasses
+import json
+import os
+import re
+import shutil
+import threading
+
+import numpy as np
+
+import docstore
+import quantization
+from docstore import DocStore
+from quantization import QUANTIZERS, QuantizedVectors
+
+if TYPE_CHECKING:
+    import chromadb
+
+# --- CONFIGURATION ---
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma")  # "chroma", "numpy" ou "snapshot"
+NUMPY_STORE_DIR = os.path.join(os.getcwd(), "database", "numpy_store")
+NUMPY_STORE_MMAP = os.getenv("VECTOR_STORE_MMAP", "1") != "0"
+QUERY_BATCH_SIZE = 64  # Requêtes comparées au corpus en une multiplication matricielle
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")  # "none", "int8" ou "pq"
+# Candidats recalculés exactement par résultat demandé
+QUANTIZATION_RESCORE = int(os.getenv("QUANTIZATION_RESCORE", "10"))
+
+POINTER_FILENAME = "CURRENT"  # Version courante du magasin NumPy
+GENERATION_FORMAT = "g%06d"  # Sous-dossier d'une version
+KEEP_GENERATIONS = 2  # Versions conservées (la courante et la précédente)
+LOAD_ATTEMPTS = 3  # Lectures de CURRENT si une version disparaît pendant le chargement
+VECTORS_FILENAME = "vectors.f32"
+RECORDS_FILENAME = "records.jsonl"  # Une ligne JSON [id, métadonnées] par passage
+LEGACY_RECORDS_FILENAME = "records.json"
+
+GET_INCLUDE = ("documents", "metadatas")
+QUERY_INCLUDE = ("documents", "distances", "metadatas")
+
+
+class VectorStore(abc.ABC):
+    """Passages (id, vecteur, contenu, métadonnées) ; `parent_ids` filtre sur la métadonnée 'parent_id'."""
+
+    name = "documents"
+
+    @abc.abstractmethod
+    def count(self) -> int: ...
+
+    @abc.abstractmethod
+    def add(
+        self,
+        ids: List[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: List[str],
+        metadatas: List[dict],
+    ): ...
+
+    @abc.abstractmethod
+    def update(self, ids: List[str], metadatas: List[dict]):
+        """Ajoute ou remplace des clés de métadonnées (les autres clés sont conservées)."""
+
+    @abc.abstractmethod
+    def delete(
+        self, ids: List[str] | None = None, parent_ids: List[str] | None = None
+    ): ...
+
+    @abc.abstractmethod
+    def get(
+        self,
+        ids: List[str] | None = None,
+        parent_ids: List[str] | None = None,
+        include: Sequence[str] = GET_INCLUDE,
+        limit: int | None = None,
+        offset: int = 0,
+    ) -> dict: ...
+
+    @abc.abstractmethod
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int,
+        include: Sequence[str] = QUERY_INCLUDE,
+    ) -> dict:
+        """
+        Les `n_results` passages les plus proches de chaque requête (distances croissantes).
+        Les "documents" sont des chaînes ou des références paresseuses (`str(document)`).
+        """
+
+
+class ChromaVectorStore(VectorStore):
+    """Collection ChromaDB, obtenue à chaque appel (elle peut être recréée, voir --rebuild-index)."""
+
+    def __init__(self, collection: Callable[[], "chromadb.Collection"]):
+        self._collection = collection
+
+    @property
+    def collection(self):
+        return self._collection()
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def add(self, ids, embeddings, documents, metadatas):
+        self.collection.add(
+            ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas
+        )
+
+    def update(self, ids, metadatas):
+        self.collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids=None, parent_ids=None):
+        if parent_ids:
+            self.collection.delete(where={"parent_id": {"$in": list(parent_ids)}})
+        if ids:
+            self.collection.delete(ids=list(ids))
+
+    def get(self, ids=None, parent_ids=None, include=GET_INCLUDE, limit=None, offset=0):
+        return self.collection.get(
+            ids=ids,
+            where={"parent_id": {"$in": list(parent_ids)}} if parent_ids else None,
+            include=list(include),
+            limit=limit,
+            offset=offset or None,
+        )
+
+    def query(self, query_embeddings, n_results, include=QUERY_INCLUDE):
+        return self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            include=list(include),
+        )
+
+
+def _generations(directory: str) -> List[str]:
+    """Sous-dossiers de versions du magasin NumPy, du plus ancien au plus récent."""
+    return sorted(
+        name for name in os.listdir(directory) if re.fullmatch(r"g\d{6}", name)
+    )
+
+
+def _read_records(directory: str, start: int, end: int) -> Tuple[List[str], List[dict]]:
+    """Identifiants et métadonnées des lignes de records.jsonl entre les octets `start` et `end`."""
+    ids: List[str] = []
+    metadatas: List[dict] = []
+    if end <= start:
+        return ids, metadatas
+    with open(os.path.join(directory, RECORDS_FILENAME), "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    for line in data.splitlines():
+        doc_id, metadata = json.loads(line)
+        ids.append(doc_id)
+        metadatas.append(metadata)
+    return ids, metadatas
+
+
+def _append_records(directory: str, ids, metadatas, start: int) -> int:
+    """Écrit une ligne par passage à partir de l'octet `start` ; retourne la nouvelle taille."""
+    data = b"".join(
+        json.dumps([doc_id, metadata], ensure_ascii=False).encode("utf-8") + b"\n"
+        for doc_id, metadata in zip(ids, metadatas)
+    )
+    path = os.path.join(directory, RECORDS_FILENAME)
+    with open(path, "r+b" if start else "wb") as f:
+        f.truncate(start)
+        f.seek(start)
+        f.write(data)
+    return start + len(data)
+
+
+@dataclasses.dataclass(frozen=True)
+class _Records:
+    """État complet du magasin NumPy, remplacé d'un bloc à chaque écriture ou rechargement."""
+
+    ids: List[str]
+    documents: DocStore  # Textes décodés à la demande
+    metadatas: List[dict]
+    vectors: np.ndarray  # (n, dim) float32, éventuellement mappée en mémoire
+    norms: np.ndarray  # normes des vecteurs (l2 et cosine)
+    positions: Dict[str, int]
+    parents: Dict[str, List[int]]
+    pointer: dict | None = (
+        None  # Contenu de CURRENT (None : magasin vide ou ancien format)
+    )
+    stamp: tuple | None = None  # Identité du fichier lu (voir NumpyVectorStore._stamp)
+    quantized: QuantizedVectors | None = None
+
+    @classmethod
+    def build(
+        cls, ids, documents, metadatas, vectors, quantized=None, **state
+    ) -> "_Records":
+        parents: Dict[str, List[int]] = {}
+        for position, (doc_id, metadata) in enumerate(zip(ids, metadatas)):
+            parents.setdefault(metadata.get("parent_id", doc_id), []).append(position)
+        return cls(
+            ids=ids,
+            documents=documents,
+            metadatas=metadatas,
+            vectors=vectors,
+            # Normes enregistrées avec les codes : la matrice float32 n'est pas parcourue
+            norms=(
+                quantized.norms
+                if quantized is not None
+                else (
+                    np.linalg.norm(vectors, axis=1)
+                    if len(ids)
+                    else np.zeros(0, dtype=np.float32)
+                )
+            ),
+            positions={doc_id: i for i, doc_id in enumerate(ids)},
+            parents=parents,
+            quantized=quantized,
+            **state,
+        )
+
+    def extend(
+        self, ids, metadatas, documents, vectors, quantized=None, **state
+    ) -> "_Records":
+        """Nouvel état avec des passages ajoutés à la fin ; seuls les nouveaux sont indexés."""
+        start = len(self.ids)
+        positions = dict(self.positions)
+        parents = dict(self.parents)
+        for position, (doc_id, metadata) in enumerate(zip(ids, metadatas), start):
+            positions[doc_id] = position
+            parent = metadata.get("parent_id", doc_id)
+            # Nouvelle liste : l'état précédent reste lisible par les autres threads
+            parents[parent] = parents.get(parent, []) + [position]
+        if quantized is not None:
+            norms = quantized.norms
+        else:
+            norms = np.concatenate(
+                [self.norms, np.linalg.norm(vectors[start:], axis=1)]
+            )
+        return _Records(
+            ids=self.ids + list(ids),
+            documents=documents,
+            metadatas=self.metadatas + list(metadatas),
+            vectors=vectors,
+            norms=norms,
+            positions=positions,
+            parents=parents,
+            quantized=quantized,
+            **state,
+        )
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Recherche exacte sur une matrice float32 en mémoire (ou mappée depuis le disque).
+    Chaque version du magasin est écrite dans un sous-dossier ("g000001", ...) désigné par
+    le fichier CURRENT, seul fichier remplacé en place (de manière atomique) : un lecteur voit
+    l'ancienne ou la nouvelle version, jamais un mélange. `add` ajoute les passages à la fin
+    des fichiers de la version courante puis avance CURRENT ; les suppressions, mises à jour
+    et remplacements écrivent une nouvelle version. Un autre processus (application
+    Streamlit pendant un create_database.py) recharge le magasin dès que CURRENT a changé,
+    en ne lisant que les passages ajoutés si la version est la même.
+    Les écritures sont protégées par un verrou, les lectures travaillent sur un état figé.
+    Distances identiques à Chroma : L2 au carré ("l2"), 1 - cosinus ("cosine"), 1 - produit
+    scalaire ("ip").
+    Avec `quantization` ("int8" ou "pq"), les codes sont écrits avec la matrice et la
+    recherche est approchée puis recalculée exactement sur `rescore` × k candidats.
+    """
+
+    def __init__(
+        self,
+        directory: str = NUMPY_STORE_DIR,
+        space: str = "l2",
+        mmap: bool = True,
+        quantization: str = VECTOR_QUANTIZATION,
+        rescore: int = QUANTIZATION_RESCORE,
+    ):
+        if space not in ("l2", "cosine", "ip"):
+            raise ValueError(f"Espace de distance inconnu : {space}")
+        if quantization != "none" and quantization not in QUANTIZERS:
+            raise ValueError(f"Quantification inconnue : {quantization}")
+        self.directory = directory
+        self.space = space
+        self.mmap = mmap
+        self.quantization = quantization
+        self.rescore = max(1, rescore)
+        self._lock = threading.RLock()
+        self._records: _Records | None = None
+
+    def _path(self, *names: str) -> str:
+        return os.path.join(self.directory, *names)
+
+    # --- Persistance ---
+
+    def _stamp(self) -> tuple | None:
+        """Identité de CURRENT (ou de records.json, ancien format), None si le magasin est vide."""
+        for name in (POINTER_FILENAME, LEGACY_RECORDS_FILENAME):
+            try:
+                stat = os.stat(self._path(name))
+            except OSError:
+                continue
+            return (name, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        return None
+
+    def _current(self) -> _Records:
+        """État courant, rechargé si un autre processus a écrit depuis."""
+        stamp = self._stamp()
+        with self._lock:
+            if self._records is None or self._records.stamp != stamp:
+                self._records = self._load(stamp, self._records)
+            return self._records
+
+    def _load(self, stamp: tuple | None, previous: _Records | None) -> _Records:
+        if stamp is None:
+            return _Records.build(
+                [], DocStore.from_texts([]), [], np.zeros((0, 0), dtype=np.float32)
+            )
+        if stamp[0] == LEGACY_RECORDS_FILENAME:
+            return self._load_legacy(stamp)
+        for _ in range(LOAD_ATTEMPTS - 1):
+            try:
+                return self._load_pointer(stamp, previous)
+            except FileNotFoundError:
+                # Version supprimée par un écrivain entre la lecture de CURRENT et celle
+                # de ses fichiers : CURRENT désigne déjà la suivante
+                stamp = self._stamp()
+        return self._load_pointer(stamp, previous)
+
+    def _load_pointer(self, stamp: tuple | None, previous: _Records | None) -> _Records:
+        with open(self._path(POINTER_FILENAME), "r", encoding="utf-8") as f:
+            pointer = json.load(f)
+        if (
+            previous is not None
+            and previous.pointer is not None
+            and previous.pointer["generation"] == pointer["generation"]
+            and previous.pointer["count"] <= pointer["count"]
+        ):
+            return self._load_appended(previous, pointer, stamp)
+        return self._load_generation(pointer, stamp)
+
+    def _load_generation(self, pointer: dict, stamp: tuple | None) -> _Records:
+        directory = self._path(pointer["generation"])
+        ids, metadatas = _read_records(directory, 0, pointer["records_bytes"])
+        vectors = self._map_vectors(directory, pointer)
+        return _Records.build(
+            ids,
+            DocStore.open(directory, mmap=self.mmap, count=pointer["count"]),
+            metadatas,
+            vectors,
+            self._load_quantized(directory, pointer, vectors),
+            pointer=pointer,
+            stamp=stamp,
+        )
+
+    def _load_appended(
+        self, previous: _Records, pointer: dict, stamp: tuple | None
+    ) -> _Records:
+        """Même version que `previous`, avec les passages ajoutés depuis par `add`."""
+        if pointer == previous.pointer:
+            return dataclasses.replace(previous, stamp=stamp)
+        directory = self._path(pointer["generation"])
+        ids, metadatas = _read_records(
+            directory, previous.pointer["records_bytes"], pointer["records_bytes"]  # type: ignore[index]
+        )
+        vectors = self._map_vectors(directory, pointer, previous.vectors)
+        return previous.extend(
+            ids,
+            metadatas,
+            DocStore.open(directory, mmap=self.mmap, count=pointer["count"]),
+            vectors,
+            self._load_quantized(directory, pointer, vectors, previous),
+            pointer=pointer,
+            stamp=stamp,
+        )
+
+    def _map_vectors(
+        self, directory: str, pointer: dict, previous: np.ndarray | None = None
+    ) -> np.ndarray:
+        """Les `count` premiers vecteurs de la version ; sans mmap, seuls ceux après `previous` sont lus."""
+        count, dim = pointer["count"], pointer["dim"]
+        path = os.path.join(directory, VECTORS_FILENAME)
+        if not count:
+            return np.zeros((0, dim), dtype=np.float32)
+        if self.mmap:
+            return np.memmap(path, dtype=np.float32, mode="r", shape=(count, dim))
+        start = 0 if previous is None else len(previous)
+        added = np.fromfile(
+            path, dtype=np.float32, count=(count - start) * dim, offset=start * dim * 4
+        ).reshape(-1, dim)
+        return added if not start else np.concatenate([previous, added])
+
+    def _load_quantized(
+        self,
+        directory: str,
+        pointer: dict,
+        vectors: np.ndarray,
+        previous: _Records | None = None,
+    ) -> QuantizedVectors | None:
+        if self.quantization == "none" or not len(vectors):
+            return None
+        if pointer.get("quantization") == self.quantization:
+            quantized = quantization.load(directory, len(vectors), mmap=self.mmap)
+            if quantized is not None:
+                return quantized
+        if previous is not None and previous.quantized is not None:
+            # Codes déjà calculés en mémoire : seuls les passages ajoutés sont encodés
+            return quantization.build(
+                self.quantization,
+                vectors,
+                previous.quantized,
+                np.arange(len(previous.ids)),
+            )
+        print(
+            f"[AVERTISSEMENT] Codes '{self.quantization}' absents de "
+            f"'{directory}' : quantification en mémoire (relancez "
+            "create_database.py pour les enregistrer)."
+        )
+        return quantization.build(self.quantization, vectors)
+
+    def _load_legacy(self, stamp: tuple) -> _Records:
+        """Ancien format (records.json et fichiers à la racine), converti à la prochaine écriture."""
+        with open(self._path(LEGACY_RECORDS_FILENAME), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        pointer = {"count": len(data["ids"]), "dim": int(data["dim"])}
+        vectors = self._map_vectors(self.directory, pointer)
+        if "documents" in data:
+            # Format plus ancien encore : les textes dans records.json
+            documents = DocStore.from_texts(data["documents"])
+        else:
+            documents = DocStore.open(self.directory, mmap=self.mmap)
+        return _Records.build(
+            data["ids"],
+            documents,
+            data["metadatas"],
+            vectors,
+            self._load_quantized(self.directory, {}, vectors),
+            stamp=stamp,
+        )
+
+    def _commit(self, pointer: dict):
+        """Remplace CURRENT de manière atomique : la version qu'il désigne devient visible."""
+        path = self._path(POINTER_FILENAME)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(pointer, f)
+        os.replace(path + ".tmp", path)
+
+    def _write(
+        self,
+        ids,
+        documents: Iterable[str | bytes],
+        metadatas,
+        vectors,
+        previous: _Records | None = None,
+        kept: np.ndarray | None = None,
+    ):
+        """
+        Écrit une nouvelle version : la matrice, les enregistrements, les textes (docstore.py)
+        et les codes de quantification dans un sous-dossier neuf, puis CURRENT. `documents`
+        peut contenir les octets bruts d'un autre DocStore. Les `len(kept)` premiers vecteurs
+        sont les lignes `kept` de `previous` : leurs codes sont recopiés plutôt que recalculés.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        generations = _generations(self.directory)
+        generation = GENERATION_FORMAT % (
+            int(generations[-1][1:]) + 1 if generations else 1
+        )
+        directory = self._path(generation)
+        os.makedirs(directory)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        vectors.tofile(os.path.join(directory, VECTORS_FILENAME))
+        records_bytes = _append_records(directory, ids, metadatas, 0)
+        docstore.write(directory, documents)
+        quantized = None
+        if self.quantization != "none" and len(vectors):
+            quantized = quantization.build(
+                self.quantization,
+                vectors,
+                previous.quantized if previous is not None else None,
+                kept,
+            )
+            quantization.save(directory, quantized)
+        pointer = {
+            "generation": generation,
+            "count": len(ids),
+            "dim": vectors.shape[1] if vectors.ndim == 2 else 0,
+            "records_bytes": records_bytes,
+            "quantization": self.quantization if quantized is not None else "none",
+        }
+        self._commit(pointer)
+        # Les fichiers sont relus (et mappés) depuis la nouvelle version
+        self._records = self._load_generation(pointer, self._stamp())
+        self._prune(generation)
+
+    def _prune(self, generation: str):
+        """Supprime les versions antérieures à la précédente et les fichiers de l'ancien format."""
+        for name in (
+            LEGACY_RECORDS_FILENAME,
+            VECTORS_FILENAME,
+            docstore.BLOB_FILENAME,
+            docstore.OFFSETS_FILENAME,
+            *quantization.FILENAMES,
+        ):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._path(name))
+        generations = _generations(self.directory)
+        current = generations.index(generation)
+        for name in generations[: max(0, current + 1 - KEEP_GENERATIONS)]:
+            shutil.rmtree(self._path(name), ignore_errors=True)
+
+    def _appendable(self, records: _Records, ids, vectors: np.ndarray) -> bool:
+        """Vrai si `add` peut écrire à la suite de la version courante."""
+        pointer = records.pointer
+        if (
+            pointer is None
+            or not pointer["count"]
+            or pointer["dim"] != vectors.shape[1]
+        ):
+            return False
+        # Un passage déjà présent est remplacé : nouvelle version
+        if len(set(ids)) != len(ids) or any(i in records.positions for i in ids):
+            return False
+        if self.quantization == "none":
+            return pointer["quantization"] == "none"
+        # Codes enregistrés avec un quantificateur encore valable (sinon réapprentissage)
+        return pointer["quantization"] == self.quantization and quantization.reusable(
+            records.quantized,
+            self.quantization,
+            vectors.shape[1],
+            pointer["count"] + len(ids),
+        )
+
+    def _append(self, records: _Records, ids, documents, metadatas, vectors):
+        """
+        Ajoute les passages à la fin des fichiers de la version courante puis avance CURRENT.
+        Les octets au-delà de `count` (écriture interrompue) sont écrasés ; les lecteurs ne
+        lisent que les `count` passages désignés par CURRENT.
+        """
+        pointer = records.pointer
+        directory = self._path(pointer["generation"])  # type: ignore[index]
+        count = pointer["count"]  # type: ignore[index]
+        with open(os.path.join(directory, VECTORS_FILENAME), "r+b") as f:
+            f.truncate(count * vectors.shape[1] * 4)
+            f.seek(0, os.SEEK_END)
+            f.write(vectors.tobytes())
+        records_bytes = _append_records(
+            directory, ids, metadatas, pointer["records_bytes"]  # type: ignore[index]
+        )
+        docstore.append(directory, documents, count)
+        if records.quantized is not None:
+            quantization.append(directory, records.quantized.quantizer, vectors, count)
+        pointer = {**pointer, "count": count + len(ids), "records_bytes": records_bytes}  # type: ignore[dict-item]
+        self._commit(pointer)
+        if self.mmap:
+            vectors = self._map_vectors(directory, pointer)
+        else:
+            vectors = np.concatenate([records.vectors, vectors])
+        self._records = records.extend(
+            ids,
+            metadatas,
+            DocStore.open(directory, mmap=self.mmap, count=pointer["count"]),
+            vectors,
+            (
+                quantization.load(directory, pointer["count"], mmap=self.mmap)
+                if records.quantized is not None
+                else None
+            ),
+            pointer=pointer,
+            stamp=self._stamp(),
+        )
+
+    def _rewrite(self, keep: np.ndarray, records: _Records, **appended):
+        """Réécrit le magasin avec les lignes `keep` de `records`, suivies de `appended`."""
+        positions = np.flatnonzero(keep)
+        ids = [records.ids[i] for i in positions] + appended.get("ids", [])
+        # Les textes conservés sont recopiés en octets, sans être décodés
+        documents = [records.documents.raw(i) for i in positions] + appended.get(
+            "documents", []
+        )
+        metadatas = [records.metadatas[i] for i in positions] + appended.get(
+            "metadatas", []
+        )
+        vectors = np.asarray(records.vectors[positions], dtype=np.float32)
+        if "embeddings" in appended:
+            new_vectors = np.asarray(appended["embeddings"], dtype=np.float32)
+            vectors = (
+                np.concatenate([vectors, new_vectors]) if len(vectors) else new_vectors
+            )
+        self._write(ids, documents, metadatas, vectors, records, positions)
+
+    # --- Écriture ---
+
+    def count(self) -> int:
+        return len(self._current().ids)
+
+    def add(self, ids, embeddings, documents, metadatas):
+        ids = list(ids)
+        if not ids:
+            return
+        with self._lock:
+            records = self._current()
+            metadatas = [dict(m) for m in metadatas]
+            vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+            if self._appendable(records, ids, vectors):
+                self._append(records, ids, list(documents), metadatas, vectors)
+                return
+            # Comme un upsert : un passage déjà présent est remplacé
+            replaced = set(ids)
+            keep = np.array([doc_id not in replaced for doc_id in records.ids], bool)
+            self._rewrite(
+                keep,
+                records,
+                ids=ids,
+                documents=list(documents),
+                metadatas=metadatas,
+                embeddings=vectors,
+            )
+
+    def update(self, ids, metadatas):
+        with self._lock:
+            records = self._current()
+            merged = list(records.metadatas)
+            for doc_id, metadata in zip(ids, metadatas):
+                if (position := records.positions.get(doc_id)) is not None:
+                    merged[position] = {**merged[position], **metadata}
+            documents = (records.documents.raw(i) for i in range(len(records.ids)))
+            self._write(
+                records.ids,
+                documents,
+                merged,
+                records.vectors,
+                records,
+                np.arange(len(records.ids)),
+            )
+
+    def delete(self, ids=None, parent_ids=None):
+        with self._lock:
+            records = self._current()
+            removed = self._select(records, ids, parent_ids)
+            if not removed:
+                return
+            keep = np.ones(len(records.ids), dtype=bool)
+            keep[removed] = False
+            self._rewrite(keep, records)
+
+    # --- Lecture ---
+
+    @staticmethod
+    def _select(records: _Records, ids=None, parent_ids=None) -> List[int]:
+        positions: List[int] = []
+        if ids:
+            positions += [records.positions[i] for i in ids if i in records.positions]
+        if parent_ids:
+            for parent_id in parent_ids:
+                positions += records.parents.get(parent_id, [])
+        return sorted(set(positions))
+
+    def get(self, ids=None, parent_ids=None, include=GET_INCLUDE, limit=None, offset=0):
+        records = self._current()
+        if ids or parent_ids:
+            positions = self._select(records, ids, parent_ids)
+        else:
+            positions = list(range(len(records.ids)))
+        positions = positions[offset : None if limit is None else offset + limit]
+        return {
+            "ids": [records.ids[i] for i in positions],
+            "documents": (
+                [records.documents[i] for i in positions]
+                if "documents" in include
+                else None
+            ),
+            "metadatas": (
+                [records.metadatas[i] for i in positions]
+                if "metadatas" in include
+                else None
+            ),
+            "embeddings": (
+                np.asarray(records.vectors[positions])
+                if "embeddings" in include
+                else None
+            ),
+        }
+
+    def _distances(
+        self, queries: np.ndarray, products: np.ndarray, norms: np.ndarray
+    ) -> np.ndarray:
+        """
+        Distances (b, n) à partir des produits scalaires requêtes·passages et des normes.
+        Calculées dans `products` (un tableau temporaire) : pas de copie (b, n) par opération.
+        """
+        if self.space == "ip":
+            return np.subtract(1.0, products, out=products)
+        query_norms = np.linalg.norm(queries, axis=1)
+        if self.space == "cosine":
+            denominators = np.multiply(query_norms[:, None], norms[None, :])
+            np.maximum(denominators, 1e-12, out=denominators)
+            np.divide(products, denominators, out=products)
+            return np.subtract(1.0, products, out=products)
+        # Même ordre d'opérations que |q|² - 2 q·x + |x|² : résultats identiques
+        distances = np.multiply(products, -2, out=products)
+        distances += (query_norms**2)[:, None]
+        distances += norms[None, :] ** 2
+        return np.maximum(distances, 0.0, out=distances)
+
+    @staticmethod
+    def _smallest(distances: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Colonnes et valeurs des k plus petites distances de chaque ligne, triées."""
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        top_distances = np.take_along_axis(distances, top, axis=1)
+        order = np.argsort(top_distances, axis=1)
+        return (
+            np.take_along_axis(top, order, axis=1),
+            np.take_along_axis(top_distances, order, axis=1),
+        )
+
+    def _top_k(
+        self, records: _Records, queries: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions et distances des k plus proches passages de chaque requête."""
+        if records.quantized is None:
+            products = queries @ records.vectors.T
+            return self._smallest(self._distances(queries, products, records.norms), k)
+        # Distances estimées sur les codes, puis distances exactes des meilleurs candidats
+        n = len(records.ids)
+        estimated = self._distances(
+            queries, records.quantized.products(queries), records.norms
+        )
+        candidates = min(n, k * self.rescore)
+        if candidates < n:
+            rows = np.argpartition(estimated, candidates - 1, axis=1)[:, :candidates]
+        else:
+            rows = np.broadcast_to(np.arange(n), estimated.shape)
+        unique, inverse = np.unique(rows.ravel(), return_inverse=True)
+        # Seules les lignes des candidats sont lues dans la matrice float32
+        vectors = np.asarray(records.vectors[unique], dtype=np.float32)
+        exact = self._distances(queries, queries @ vectors.T, records.norms[unique])
+        exact = np.take_along_axis(exact, inverse.reshape(rows.shape), axis=1)
+        top, top_distances = self._smallest(exact, k)
+        return np.take_along_axis(rows, top, axis=1), top_distances
+
+    def query(self, query_embeddings, n_results, include=QUERY_INCLUDE):
+        records = self._current()
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(
+            len(query_embeddings), -1
+        )
+        k = min(n_results, len(records.ids))
+        results: Dict[str, list] = {
+            "ids": [],
+            "distances": [],
+            "documents": [],
+            "metadatas": [],
+        }
+        for start in range(0, len(queries), QUERY_BATCH_SIZE):
+            batch = queries[start : start + QUERY_BATCH_SIZE]
+            if k == 0:
+                for key in results:
+                    results[key].extend([] for _ in batch)
+                continue
+            top, top_distances = self._top_k(records, batch, k)
+            for positions, row_distances in zip(top.tolist(), top_distances.tolist()):
+                results["ids"].append([records.ids[i] for i in positions])
+                results["distances"].append(row_distances)
+                results["documents"].append(
+                    [records.documents.ref(i) for i in positions]
+                )
+                results["metadatas"].append([records.metadatas[i] for i in positions])
+        return {
+            key: value
+            for key, value in results.items()
+            if key == "ids" or key in include
+        }